@@ -2,7 +2,7 @@
 
 import os
 from flask import Flask
-from .models import db, User 
+from .models import db
 from flask_login import LoginManager
 from dotenv import load_dotenv
 import logging
@@ -17,6 +17,17 @@ TAREFAS_RECORRENTES = [
     "Área de baixo + Corredor máquina", "Limpeza da dispensa", "Folga", "Folga"
 ]
 
+# Ordem padrão dos moradores na rotação da escala (ver app/rotacao.py).
+# Gravada em User.ordem_original / User.ordem_invertido pelo 'flask init-db'.
+ROTACAO_ORIGINAL = [
+    "parabrisa", "falamansa", "jubileu", "duposto",
+    "peçarrara", "vigarista", "macale", "karcaça", "6bomba", "serrote"
+]
+ROTACAO_INVERTIDA = [
+    "falamansa", "parabrisa", "duposto", "jubileu",
+    "vigarista", "peçarrara", "karcaça", "macale", "serrote", "6bomba"
+]
+
 # <--- 2. INICIALIZE O OBJETO MIGRATE AQUI (FORA DA FUNÇÃO)
 #    (Se você já tem db = SQLAlchemy() no models.py, 
 #     o ideal é ter migrate = Migrate() lá também e importar aqui,
@@ -39,16 +50,49 @@ def create_app():
         SQLALCHEMY_DATABASE_URI=db_uri,
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
         SECRET_KEY=os.getenv('SECRET_KEY', 'uma-chave-secreta-padrao-provisoria'), 
+        # Cache local dos painéis financeiros (ver app/financas/cache.py). TTL 0 desliga.
+        PAINEL_CACHE_TAMANHO=int(os.getenv('PAINEL_CACHE_TAMANHO', '256')),
+        PAINEL_CACHE_TTL=int(os.getenv('PAINEL_CACHE_TTL', '300')),
+        # Cache local dos usuários logados (ver app/cache_usuarios.py). O TTL é quanto
+        # outro worker pode demorar a ver um usuário alterado; 0 desliga.
+        USUARIO_CACHE_TAMANHO=int(os.getenv('USUARIO_CACHE_TAMANHO', '512')),
+        USUARIO_CACHE_TTL=int(os.getenv('USUARIO_CACHE_TTL', '60')),
+        # Hash de senha (sintaxe do Werkzeug) e hashes simultâneos por processo (ver app/senhas.py)
+        SENHA_HASH_METODO=os.getenv('SENHA_HASH_METODO', 'scrypt:32768:8:1'),
+        SENHA_POOL_TAMANHO=int(os.getenv('SENHA_POOL_TAMANHO', str(min(4, os.cpu_count() or 1)))),
+        SENHA_POOL_ESPERA_MS=int(os.getenv('SENHA_POOL_ESPERA_MS', '250')),
+        # Métricas por requisição (ver app/metricas.py). Limite 0 desliga o log de lentas.
+        METRICAS_ATIVAS=os.getenv('METRICAS_ATIVAS', '1') not in ('0', 'false', 'False'),
+        METRICAS_LENTA_MS=int(os.getenv('METRICAS_LENTA_MS', '500')),
+        # Perfil de produção do SQLite: WAL, pragmas e motor de leitura separado (ver app/banco.py)
+        SQLITE_PRODUCAO=os.getenv('SQLITE_PRODUCAO', '0') in ('1', 'true', 'True'),
+        SQLITE_BUSY_TIMEOUT_MS=int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        SQLITE_MMAP_SIZE=int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        SQLITE_CACHE_SIZE=int(os.getenv('SQLITE_CACHE_SIZE', '-65536')),  # negativo = KiB (64 MiB)
+        # Pool de conexões do Postgres (por worker)
+        DB_POOL_SIZE=int(os.getenv('DB_POOL_SIZE', '5')),
+        DB_MAX_OVERFLOW=int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        DB_POOL_TIMEOUT=int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        DB_POOL_RECYCLE=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        DB_POOL_PRE_PING=os.getenv('DB_POOL_PRE_PING', '1') not in ('0', 'false', 'False'),
+        # Processamentos em segundo plano (ver app/processamentos.py). SINCRONO roda na própria requisição.
+        PROCESSAMENTO_WORKERS=int(os.getenv('PROCESSAMENTO_WORKERS', '2')),
+        PROCESSAMENTO_TIMEOUT=int(os.getenv('PROCESSAMENTO_TIMEOUT', '600')),
+        PROCESSAMENTO_SINCRONO=os.getenv('PROCESSAMENTO_SINCRONO', '0') in ('1', 'true', 'True'),
     )
+    from . import banco
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = banco.opcoes_do_motor(app.config)
 
     # Inicializa DB
     db.init_app(app)
 
     # <--- 3. ADICIONE ESTA LINHA PARA CONECTAR O MIGRATE
     migrate.init_app(app, db)
+    banco.init_app(app, db)  # Perfil de produção do SQLite (SQLITE_PRODUCAO)
     # ----------------------------------------------------
 
     # Configura LoginManager
+    from . import cache_usuarios
     login_manager = LoginManager()
     login_manager.login_view = 'routes.login' 
     login_manager.init_app(app)
@@ -56,7 +100,7 @@ def create_app():
     @login_manager.user_loader
     def load_user(user_id):
         try:
-            return User.query.get(int(user_id))
+            return cache_usuarios.carregar_usuario(int(user_id))
         except Exception as e:
             app.logger.error(f"Erro ao carregar usuário ID {user_id}: {e}")
             return None
@@ -72,6 +116,12 @@ def create_app():
     app.register_blueprint(tarefas.tarefas_bp)
     from . import financas
     app.register_blueprint(financas.financas_bp)
+    from . import api
+    app.register_blueprint(api.api_bp)
+    from . import pwa
+    pwa.init_app(app)  # Registra o /sw.js e o fingerprint dos estáticos
+    from . import metricas
+    metricas.init_app(app)  # Latência, SQL e templates por requisição (/admin/metrics)
 
     # Registra comandos CLI
     from . import commands
@@ -1,14 +1,18 @@
 # app/admin.py (CORRIGIDO E ATUALIZADO)
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for, abort
+from flask import Blueprint, render_template, request, flash, redirect, url_for, abort, jsonify, Response
 from flask_login import login_required, current_user
 # --- REMOVIDO: ValorAluguel ---
 from .models import db, User
+from .senhas import SistemaOcupado, MENSAGEM_OCUPADO
 from functools import wraps
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
-from .models import CaixinhaMovimentacao # Adicione esta importação no topo do arquivo se ainda não tiver
+from .financas.caixinha import registrar_movimentacao # Mantém o saldo corrente do caixinha
+from .financas import cache as cache_paineis
+from . import cache_usuarios
+from . import metricas
 # --- DECORATORS PARA SEGURANÇA (Mantidos) ---
 def admin_required(f):
     @wraps(f)
@@ -26,6 +30,17 @@ def manager_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# --- HELPER: posição na rotação da escala (campo opcional) ---
+def _ler_ordem(valor):
+    """Converte o campo do formulário em int, ou None se vazio. Lança ValueError se inválido."""
+    valor = (valor or '').strip()
+    if not valor:
+        return None
+    ordem = int(valor)
+    if ordem < 0:
+        raise ValueError('posição negativa')
+    return ordem
+
 # --- ROTAS DE GESTÃO DE UTILIZADORES ---
 
 @admin_bp.route('/usuarios')
@@ -74,14 +89,27 @@ def criar_usuario():
               flash(f'Tipo de quarto inválido. Use um dos: {", ".join(tipos_quarto_disponiveis)}', 'danger')
               return render_template('criar_usuario.html', tipos_quarto=tipos_quarto_disponiveis, username=username, cargo=cargo, tipo_quarto=tipo_quarto)
 
+        try:
+            ordem_original = _ler_ordem(request.form.get('ordem_original'))
+            ordem_invertido = _ler_ordem(request.form.get('ordem_invertido'))
+        except ValueError:
+            flash('A posição na escala deve ser um número inteiro não negativo.', 'danger')
+            return render_template('criar_usuario.html', tipos_quarto=tipos_quarto_disponiveis, username=username, cargo=cargo, tipo_quarto=tipo_quarto)
+
         try: 
-            novo_usuario = User(username=username, cargo=cargo, tipo_quarto=tipo_quarto)
+            novo_usuario = User(username=username, cargo=cargo, tipo_quarto=tipo_quarto,
+                                ordem_original=ordem_original, ordem_invertido=ordem_invertido)
             novo_usuario.set_password(password)
             db.session.add(novo_usuario)
             db.session.commit()
 
             flash(f'Utilizador "{username}" criado com sucesso!', 'success')
             return redirect(url_for('admin.lista_usuarios'))
+        except SistemaOcupado:
+            # Fila do hash de senhas cheia: nada foi gravado, basta reenviar
+            db.session.rollback()
+            flash(MENSAGEM_OCUPADO, 'warning')
+            return render_template('criar_usuario.html', tipos_quarto=tipos_quarto_disponiveis, username=username, cargo=cargo, tipo_quarto=tipo_quarto), 503
         except Exception as e: 
             db.session.rollback()
             flash(f'Erro ao criar usuário: {e}', 'danger')
@@ -126,16 +154,29 @@ def edit_usuario(user_id):
               flash(f'Tipo de quarto inválido. Use um dos: {", ".join(tipos_quarto_disponiveis)}', 'danger')
               return render_template('criar_usuario.html', user_alvo=user_alvo, tipos_quarto=tipos_quarto_disponiveis)
 
+        try:
+            ordem_original = _ler_ordem(request.form.get('ordem_original'))
+            ordem_invertido = _ler_ordem(request.form.get('ordem_invertido'))
+        except ValueError:
+            flash('A posição na escala deve ser um número inteiro não negativo.', 'danger')
+            return render_template('criar_usuario.html', user_alvo=user_alvo, tipos_quarto=tipos_quarto_disponiveis)
+
         try: 
             user_alvo.username = novo_username
             user_alvo.cargo = cargo
             user_alvo.tipo_quarto = tipo_quarto
+            user_alvo.ordem_original = ordem_original
+            user_alvo.ordem_invertido = ordem_invertido
             if password:
                 user_alvo.set_password(password)
 
             db.session.commit()
             flash(f'Utilizador "{user_alvo.username}" atualizado com sucesso!', 'success')
             return redirect(url_for('admin.lista_usuarios'))
+        except SistemaOcupado:
+            db.session.rollback()
+            flash(MENSAGEM_OCUPADO, 'warning')
+            return render_template('criar_usuario.html', user_alvo=user_alvo, tipos_quarto=tipos_quarto_disponiveis), 503
         except Exception as e: 
             db.session.rollback()
             flash(f'Erro ao atualizar usuário: {e}', 'danger')
@@ -206,12 +247,11 @@ def adicionar_saldo_caixinha_manual():
 
         # Cria a movimentação
         try:
-            nova_entrada = CaixinhaMovimentacao(
+            registrar_movimentacao(
                 descricao=f"Ajuste manual ADM: {descricao}", # Adiciona prefixo para clareza
                 valor=valor, # Valor positivo é entrada
                 user_id=current_user.id # Registra qual admin fez
             )
-            db.session.add(nova_entrada)
             db.session.commit()
             flash(f'Valor R$ {valor:.2f} adicionado ao caixinha com sucesso!', 'success')
             # Redireciona de volta para o form ou para o dashboard do tesoureiro para ver o resultado
@@ -221,4 +261,22 @@ def adicionar_saldo_caixinha_manual():
             flash(f'Erro ao adicionar saldo: {e}', 'danger')
 
     # Método GET: Apenas mostra o formulário
-    return render_template('admin/adicionar_saldo_caixinha.html')
\ No newline at end of file
+    return render_template('admin/adicionar_saldo_caixinha.html')
+
+
+# --- DIAGNÓSTICO: Caches dos painéis e dos usuários (contadores deste processo) ---
+@admin_bp.route('/cache')
+@login_required
+@admin_required
+def estatisticas_cache():
+    return jsonify({'paineis': cache_paineis.estatisticas(), 'usuarios': cache_usuarios.estatisticas()})
+
+
+# --- DIAGNÓSTICO: Métricas por requisição, no formato do Prometheus ---
+@admin_bp.route('/metrics')
+@login_required
+@admin_required
+def metricas_prometheus():
+    texto = metricas.exportar_prometheus({'paineis': cache_paineis.estatisticas(),
+                                          'usuarios': cache_usuarios.estatisticas()})
+    return Response(texto, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,167 @@
+# app/api.py
+# API JSON versionada (/api/v1) para o PWA.
+#
+# O painel composto junta numa resposta o que a tela inicial precisa (totais
+# do mês, caixinha, escala da semana, tarefas pendentes do usuário e as
+# próximas que a rotação lhe reserva), usando
+# as mesmas funções de consulta das páginas HTML. Assim a tela carrega com
+# uma requisição, sem a cadeia de redirecionamentos do /financas/dashboard.
+
+from datetime import datetime
+from functools import wraps
+
+from flask import Blueprint, jsonify, url_for
+from flask_login import current_user
+
+from . import rotacao
+from .escala import carregar_base_rotacao, semana_atual, tarefas_da_semana
+from .financas import analise, get_dados_caixinha
+from .financas.cache import pagina_em_cache
+from .financas.relatorio import relatorio_do_fechamento
+from .financas.routes_dashboard import (fechamento_do_mes, dados_dashboard_usuario,
+                                        dados_dashboard_tesoureiro)
+from .models import db, EscalaSemanal
+from .paginacao import antes_de, depois_de
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Tarefas pendentes (semanas passadas e a atual) devolvidas no painel
+MAX_TAREFAS_PENDENTES = 20
+
+# Semanas à frente (a partir da próxima) das tarefas previstas no painel
+SEMANAS_PREVISTAS = 8
+
+
+def login_api(f):
+    """Como login_required, mas responde 401 em JSON em vez de redirecionar para o login."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({'erro': 'Não autenticado.'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+# --- SERIALIZAÇÃO ---
+def _data_json(data):
+    return data.isoformat() if data else None
+
+
+def _lancamento_json(l):
+    return {'id': l.id, 'descricao': l.descricao, 'valor': l.valor, 'categoria': l.categoria,
+            'data': _data_json(l.data), 'user_id': l.user_id,
+            'parcela': f'{l.parcela_atual}/{l.parcela_total}' if l.parcela_total else None}
+
+
+def _tarefa_json(t):
+    return {'id': t.id, 'ano': t.ano, 'semana': t.semana, 'tarefa': t.tarefa,
+            'responsavel': t.responsavel, 'status': t.status, 'tipo': t.tipo}
+
+
+def _caixinha_json(dados_caixinha):
+    return {
+        'saldo_atual': dados_caixinha['saldo_atual'],
+        'valor_contribuicao_mensal': dados_caixinha['valor_contribuicao_mensal'],
+        'projecao_proximo_mes': dados_caixinha['projecao_proximo_mes'],
+        'movimentacoes': [{'data': _data_json(m.data), 'descricao': m.descricao,
+                           'valor': m.valor, 'user_id': m.user_id}
+                          for m in dados_caixinha['movimentacoes']],
+    }
+
+
+# --- PARTES DO PAINEL ---
+def _financas_do_mes(ano, mes):
+    """Totais do mês e caixinha. Mesmo cache (por versão dos dados) dos painéis HTML."""
+    fechamento = fechamento_do_mes(ano, mes)
+    # Como no HTML: só o painel do tesoureiro, com o mês aberto, calcula a previsão
+    com_previsao = not fechamento and current_user.is_gerenciador()
+    dados_caixinha = get_dados_caixinha(analise.previsao()['retirada_caixinha_prevista'] if com_previsao else 0.0)
+    if fechamento:
+        # Mês fechado: o que vale é o saldo calculado no fechamento (do retrato gravado)
+        dados_relatorio = relatorio_do_fechamento(fechamento)
+        meu_saldo = next((s for s in dados_relatorio['saldos'] if s['user_id'] == current_user.id), None)
+        totais = {
+            'total_fixo': dados_relatorio['totais']['total_fixo'],
+            'total_variavel': dados_relatorio['totais']['total_variavel'],
+            'total_aluguel': dados_relatorio['totais']['total_aluguel_mes'],
+            'meu_saldo': {'valor_devido': meu_saldo['valor_devido'], 'total_gasto': meu_saldo['total_gasto'],
+                          'saldo_final': meu_saldo['saldo_final'],
+                          'status_pagamento': meu_saldo['status_pagamento']} if meu_saldo else None,
+        }
+        situacao = {'status': 'fechado', 'fechamento_id': fechamento.id,
+                    'relatorio_url': url_for('financas.ver_relatorio', fechamento_id=fechamento.id)}
+    elif current_user.is_gerenciador():
+        dados = dados_dashboard_tesoureiro(ano, mes, dados_caixinha)
+        totais = {chave: dados[chave] for chave in
+                  ('total_fixo', 'total_variavel', 'total_gasto_geral', 'total_a_pagar', 'gastos_por_usuario',
+                   'previsao')}
+        totais['lancamentos'] = [_lancamento_json(l) for l in dados['lancamentos_variaveis']]
+        situacao = {'status': 'aberto'}
+    else:
+        dados = dados_dashboard_usuario(ano, mes, current_user.id)
+        totais = {'total_gasto': dados['total_gasto'],
+                  'lancamentos': [_lancamento_json(l) for l in dados['meus_gastos']]}
+        situacao = {'status': 'aberto'}
+    return {'mes': mes, 'ano': ano, 'fechamento': situacao,
+            'totais': totais, 'caixinha': _caixinha_json(dados_caixinha)}
+
+
+def _escala_e_pendencias():
+    ano, semana = semana_atual()
+    tarefas = tarefas_da_semana(ano, semana)
+    pendentes = EscalaSemanal.query.filter(
+        EscalaSemanal.responsavel == current_user.username,
+        EscalaSemanal.status == 'pendente',
+        antes_de((EscalaSemanal.ano, EscalaSemanal.semana), (ano, semana), inclusive=True)
+    ).order_by(EscalaSemanal.ano.desc(), EscalaSemanal.semana.desc(), EscalaSemanal.id) \
+        .limit(MAX_TAREFAS_PENDENTES).all()
+    return ({'ano': ano, 'semana': semana, 'tarefas': [_tarefa_json(t) for t in tarefas]},
+            [_tarefa_json(t) for t in pendentes])
+
+
+def _proximas_tarefas(ano, semana):
+    """
+    Tarefas do usuário nas próximas semanas. Semanas já geradas na escala
+    (pré-geradas ou editadas à mão) vêm do banco; só as que passam da última
+    semana gerada são previstas pela rotação, com id nulo e status 'prevista'.
+    """
+    semanas = rotacao.semanas_a_partir(ano, semana, SEMANAS_PREVISTAS + 1)[1:]
+    periodo = (depois_de((EscalaSemanal.ano, EscalaSemanal.semana), semanas[0], inclusive=True),
+               antes_de((EscalaSemanal.ano, EscalaSemanal.semana), semanas[-1], inclusive=True))
+    ultima_gerada = db.session.query(EscalaSemanal.ano, EscalaSemanal.semana).filter(
+        EscalaSemanal.tipo == 'recorrente', *periodo
+    ).order_by(EscalaSemanal.ano.desc(), EscalaSemanal.semana.desc()).first()
+
+    tarefas = []
+    if ultima_gerada:
+        tarefas = [_tarefa_json(t) for t in EscalaSemanal.query.filter(
+            EscalaSemanal.responsavel == current_user.username, *periodo,
+            antes_de((EscalaSemanal.ano, EscalaSemanal.semana), tuple(ultima_gerada), inclusive=True)
+        ).order_by(EscalaSemanal.ano, EscalaSemanal.semana, EscalaSemanal.id)]
+        semanas = [s for s in semanas if s > tuple(ultima_gerada)]
+
+    if semanas:
+        previstas = rotacao.tarefas_do_morador(carregar_base_rotacao(), current_user.username,
+                                               *semanas[0], len(semanas))
+        tarefas += [{'id': None, 'ano': a, 'semana': s, 'tarefa': tarefa,
+                     'responsavel': current_user.username, 'status': 'prevista', 'tipo': 'recorrente'}
+                    for a, s, tarefa in previstas]
+    return tarefas
+
+
+# --- ROTAS ---
+@api_bp.route('/painel')
+@login_api
+def painel():
+    hoje = datetime.utcnow()
+    # A escala não entra no cache: ela não muda a versão dos painéis
+    dados = dict(pagina_em_cache('api_painel', hoje.year, hoje.month,
+                                 gerar=lambda: _financas_do_mes(hoje.year, hoje.month)))
+    dados['escala'], dados['minhas_tarefas_pendentes'] = _escala_e_pendencias()
+    dados['minhas_proximas_tarefas'] = _proximas_tarefas(dados['escala']['ano'], dados['escala']['semana'])
+    dados['usuario'] = {'id': current_user.id, 'username': current_user.username,
+                        'gerenciador': current_user.is_gerenciador()}
+    resposta = jsonify(dados)
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    return resposta
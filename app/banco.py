@@ -0,0 +1,139 @@
+# app/banco.py
+# Configuração das conexões com o banco.
+#
+# Postgres: o pool de conexões de cada worker é configurado pelas variáveis
+# DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE e
+# DB_POOL_PRE_PING.
+#
+# SQLite em produção (opcional, SQLITE_PRODUCAO=1): com vários workers do
+# gunicorn, uma escrita longa (fechar_mes, geração da escala) travava as
+# leituras dos outros ("database is locked"). Neste perfil:
+#   - o banco fica em WAL (leitores não esperam o escritor), com
+#     synchronous=NORMAL, busy_timeout, mmap_size e cache_size ajustados;
+#   - há dois motores: o de escrita (db.engine), cujas transações começam com
+#     BEGIN IMMEDIATE, ou seja, pegam a trava de escrita logo no início e
+#     esperam a vez pelo busy_timeout em vez de falhar no meio; e um motor
+#     somente leitura (PRAGMA query_only) para os SELECTs;
+#   - a sessão (SessaoRoteada) manda os SELECTs para o motor de leitura até
+#     a transação escrever algo; a partir daí tudo vai para o de escrita, para
+#     que a transação enxergue o que ela mesma gravou.
+
+from flask import current_app, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+
+# Chave em app.extensions do motor somente leitura
+_MOTOR_LEITURA = 'banco_leitura'
+# Marca na sessão: a transação atual já escreveu (ou vai escrever)
+_ESCREVEU = 'banco_escreveu'
+
+# insert() com ON CONFLICT de cada banco suportado
+_INSERTS_COM_CONFLITO = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def insert_com_conflito(conexao, tabela):
+    """insert() do banco da conexão com on_conflict_do_*, ou None se o banco não tiver."""
+    insercao = _INSERTS_COM_CONFLITO.get(conexao.dialect.name)
+    return insercao(tabela) if insercao else None
+
+
+def _eh_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def _sqlite_em_arquivo(uri):
+    banco = make_url(uri).database
+    return bool(banco) and banco != ':memory:' and not banco.startswith('file::memory:')
+
+
+def opcoes_do_motor(config):
+    """SQLALCHEMY_ENGINE_OPTIONS para a URI configurada (pool só fora do SQLite)."""
+    if _eh_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+# --- 1. PERFIL DE PRODUÇÃO DO SQLITE ---
+def _configurar_conexoes(motor, config, escrita):
+    @event.listens_for(motor, 'connect')
+    def _pragmas(conexao_dbapi, registro):
+        cursor = conexao_dbapi.cursor()
+        if escrita:
+            # journal_mode é gravado no arquivo: basta uma conexão de escrita
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+        else:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        cursor.execute(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+        cursor.execute(f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}")
+        cursor.close()
+        if escrita:
+            # O pysqlite abre as transações sozinho (BEGIN adiado); desligamos
+            # para emitir o BEGIN IMMEDIATE no evento 'begin'
+            conexao_dbapi.isolation_level = None
+
+    if escrita:
+        @event.listens_for(motor, 'begin')
+        def _begin_immediate(conexao):
+            conexao.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def init_app(app, db):
+    """Liga o perfil de produção do SQLite, se configurado. Chamar depois do db.init_app."""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if not app.config['SQLITE_PRODUCAO'] or not _eh_sqlite(uri):
+        return
+    if not _sqlite_em_arquivo(uri):
+        app.logger.warning('SQLITE_PRODUCAO ignorado: o banco SQLite não está num arquivo.')
+        return
+
+    with app.app_context():
+        motor_escrita = db.engine
+    _configurar_conexoes(motor_escrita, app.config, escrita=True)
+
+    motor_leitura = create_engine(motor_escrita.url)
+    _configurar_conexoes(motor_leitura, app.config, escrita=False)
+    app.extensions[_MOTOR_LEITURA] = motor_leitura
+
+
+def motores():
+    """Motores da aplicação atual: o de escrita e, no perfil de produção do SQLite, o de leitura."""
+    from .models import db
+
+    motor_leitura = current_app.extensions.get(_MOTOR_LEITURA)
+    return [db.engine] if motor_leitura is None else [db.engine, motor_leitura]
+
+
+# --- 2. SESSÃO ---
+class SessaoRoteada(Session):
+    """Sessão do Flask-SQLAlchemy que manda as leituras para o motor somente leitura, quando existe."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self.info.get(_ESCREVEU) and has_app_context():
+            motor_leitura = current_app.extensions.get(_MOTOR_LEITURA)
+            if motor_leitura is not None:
+                # Só SELECTs sem FOR UPDATE; flush, text(), DML e session.connection() vão para a escrita
+                if (not self._flushing and getattr(clause, 'is_select', False)
+                        and getattr(clause, '_for_update_arg', None) is None):
+                    return motor_leitura
+                self.info[_ESCREVEU] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(SessaoRoteada, 'after_commit')
+def _fim_da_escrita(session):
+    session.info.pop(_ESCREVEU, None)
+
+
+@event.listens_for(SessaoRoteada, 'after_rollback')
+def _descartar_escrita(session):
+    session.info.pop(_ESCREVEU, None)
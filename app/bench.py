@@ -0,0 +1,374 @@
+# app/bench.py
+# Dados sintéticos e benchmark das rotas mais pesadas ('flask bench').
+#
+# 'flask bench seed' enche um banco vazio com uma república realista: meses
+# de lançamentos (com compras parceladas), meses anteriores fechados com os
+# saldos de cada morador, depósitos e retiradas do caixinha e a escala de
+# todo o período. 'flask bench run' mede as rotas com o cliente de testes do
+# Flask e grava um JSON; 'flask bench compare' compara dois desses JSONs
+# (p.ex. antes e depois de um commit).
+
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import event, func, insert, update
+
+from .banco import motores
+from .models import (db, User, Tarefa, DespesaFixa, Lancamento, FechamentoMensal, SaldoMensal,
+                     CaixinhaMovimentacao, EscalaSemanal)
+
+# Versão do formato do JSON de resultados (muda se o formato mudar)
+VERSAO_FORMATO = 1
+
+# Parte dos lançamentos que são compras parceladas, e o máximo de parcelas
+FRACAO_PARCELADOS = 0.05
+MAX_PARCELAS = 12
+# Parte dos lançamentos pagos pela casa (sem morador)
+FRACAO_CASA = 0.2
+# Das tarefas passadas da escala, 1 em cada TAREFA_PENDENTE_A_CADA continua pendente
+TAREFA_PENDENTE_A_CADA = 7
+
+DESPESAS_GERAIS = (('Internet', 120.0), ('Luz', 250.0), ('Água', 150.0))
+ALUGUEL_POR_MORADOR = 900.0
+DIFERENCA_QUARTO_INDIVIDUAL = 150.0
+CAIXINHA_POR_MORADOR = 20.0
+
+# (categoria, descrições, faixa de valor)
+GASTOS_TIPICOS = (
+    ('Mercado', ('Mercado', 'Feira', 'Padaria', 'Açougue'), (15, 400)),
+    ('Contas', ('Gás', 'Conta de água extra', 'Taxa condomínio'), (30, 300)),
+    ('Lazer', ('Pizza', 'Churrasco', 'Streaming'), (20, 250)),
+    ('Manutenção', ('Lâmpadas', 'Encanador', 'Material de limpeza'), (10, 500)),
+    ('Outros', ('Papel higiênico', 'Correios', 'Diversos'), (5, 150)),
+)
+COMPRAS_PARCELADAS = ('Geladeira', 'Sofá', 'Máquina de lavar', 'Micro-ondas', 'Aspirador')
+
+
+# --- 1. DADOS SINTÉTICOS ---
+def _moradores(n_moradores, hash_senha):
+    """Linhas de User: o primeiro morador é o gerenciador; 1 em cada 3 tem quarto individual."""
+    largura = len(str(n_moradores))
+    linhas = [{'username': 'admin', 'cargo': 'admin', 'password_hash': hash_senha,
+               'tipo_quarto': 'compartilhado'}]
+    for i in range(n_moradores):
+        linhas.append({'username': f'morador{i + 1:0{largura}d}', 'password_hash': hash_senha,
+                       'cargo': 'gerenciador' if i == 0 else 'usuario',
+                       'tipo_quarto': 'individual' if i % 3 == 0 else 'compartilhado',
+                       # Na ordem invertida, cada par de moradores troca de lugar
+                       'ordem_original': i, 'ordem_invertido': i ^ 1 if (i ^ 1) < n_moradores else i})
+    return linhas
+
+
+def _despesas_fixas(moradores):
+    """Despesas gerais, caixinha, aluguel mestre e o aluguel de cada morador (como no Gerenciar Aluguel)."""
+    from .financas import CHAVE_ALUGUEL, CHAVE_CAIXINHA
+
+    n_total = len(moradores)
+    n_individuais = sum(1 for m in moradores if m.tipo_quarto == 'individual')
+    aluguel_total = ALUGUEL_POR_MORADOR * n_total
+    compartilhado = round((aluguel_total - DIFERENCA_QUARTO_INDIVIDUAL * n_individuais) / n_total, 2)
+    individual = round(compartilhado + DIFERENCA_QUARTO_INDIVIDUAL, 2)
+
+    linhas = [{'descricao': descricao, 'valor': valor, 'ativa': True} for descricao, valor in DESPESAS_GERAIS]
+    linhas.append({'descricao': CHAVE_CAIXINHA, 'valor': CAIXINHA_POR_MORADOR * n_total, 'ativa': True})
+    linhas.append({'descricao': CHAVE_ALUGUEL, 'valor': aluguel_total, 'ativa': False,
+                   'diferenca_individual': DIFERENCA_QUARTO_INDIVIDUAL})
+    linhas += [{'descricao': CHAVE_ALUGUEL, 'morador_id': m.id, 'ativa': True,
+                'valor': individual if m.tipo_quarto == 'individual' else compartilhado}
+               for m in moradores]
+    return linhas
+
+
+def _lancamentos_do_mes(aleatorio, inicio_mes, quantidade, ids_moradores):
+    """'quantidade' lançamentos com data no mês de 'inicio_mes'; as parcelas seguintes caem nos meses seguintes."""
+    dias_no_mes = ((inicio_mes + relativedelta(months=1)) - inicio_mes).days
+    linhas = []
+    for _ in range(quantidade):
+        data = inicio_mes + relativedelta(days=aleatorio.randrange(dias_no_mes),
+                                          hours=aleatorio.randrange(8, 22), minutes=aleatorio.randrange(60))
+        user_id = None if aleatorio.random() < FRACAO_CASA else aleatorio.choice(ids_moradores)
+
+        if aleatorio.random() < FRACAO_PARCELADOS:
+            # Mesmo formato do adicionar_gasto (montar_lancamentos)
+            descricao = aleatorio.choice(COMPRAS_PARCELADAS)
+            num_parcelas = aleatorio.randint(2, MAX_PARCELAS)
+            valor_total = round(aleatorio.uniform(300, 4000), 2)
+            valor_parcela = round(valor_total / num_parcelas, 2)
+            parcelamento_id = str(uuid.UUID(int=aleatorio.getrandbits(128)))
+            for parcela in range(1, num_parcelas + 1):
+                referencia = data + relativedelta(months=parcela - 1)
+                valor = valor_parcela
+                if parcela == num_parcelas:
+                    valor = round(valor_parcela + round(valor_total - valor_parcela * num_parcelas, 2), 2)
+                linhas.append({'descricao': f'{descricao} ({parcela}/{num_parcelas})', 'valor': valor,
+                               'categoria': 'Parcelado', 'data': data,
+                               'mes_referencia': referencia.month, 'ano_referencia': referencia.year,
+                               'user_id': user_id, 'parcelamento_id': parcelamento_id,
+                               'parcela_atual': parcela, 'parcela_total': num_parcelas,
+                               'valor_total_compra': valor_total})
+            continue
+
+        categoria, descricoes, (minimo, maximo) = aleatorio.choice(GASTOS_TIPICOS)
+        linhas.append({'descricao': aleatorio.choice(descricoes), 'valor': round(aleatorio.uniform(minimo, maximo), 2),
+                       'categoria': categoria, 'data': data,
+                       'mes_referencia': data.month, 'ano_referencia': data.year, 'user_id': user_id})
+    return linhas
+
+
+def _fechar_meses(aleatorio, meses, moradores, despesas, id_gerenciador):
+    """
+    Fecha os meses passados com a mesma conta do fechar_mes (lendo os
+    agregados), grava o retrato do relatório e registra no caixinha o depósito
+    de cada fechamento e algumas retiradas. Saldos antigos já foram quitados; os dos últimos dois meses
+    ainda têm pendências.
+    """
+    from .financas import CHAVE_ALUGUEL, CHAVE_CAIXINHA, agregados, relatorio, series
+    from .financas.routes_fechamento import alugueis_por_morador, calcular_saldos_mensais
+
+    total_aluguel = sum(d.valor for d in despesas if d.descricao == CHAVE_ALUGUEL and d.morador_id is not None)
+    valor_caixinha = sum(d.valor for d in despesas if d.descricao == CHAVE_CAIXINHA and d.morador_id is None)
+    total_fixo_outros = sum(d.valor for d in despesas if d.ativa and d.morador_id is None
+                            and d.descricao not in (CHAVE_ALUGUEL, CHAVE_CAIXINHA))
+    alugueis = alugueis_por_morador(despesas)
+
+    saldos = []
+    movimentacoes = []
+    for indice, inicio_mes in enumerate(meses):
+        total_variavel = agregados.total_do_mes(inicio_mes.year, inicio_mes.month)
+        cota = (total_fixo_outros + total_variavel + valor_caixinha) / len(moradores)
+        fim_mes = inicio_mes + relativedelta(months=1) - relativedelta(days=1)
+
+        fechamento = FechamentoMensal(mes=inicio_mes.month, ano=inicio_mes.year, total_fixo=total_fixo_outros,
+                                      total_variavel=total_variavel, total_aluguel_mes=total_aluguel,
+                                      valor_caixinha_arrecadado=valor_caixinha, status='fechado',
+                                      atualizado_em=fim_mes)
+        db.session.add(fechamento)
+        db.session.flush()
+        series.registrar_fechamento(fechamento)
+
+        recente = indice >= len(meses) - 2
+        for linha in calcular_saldos_mensais(moradores, alugueis,
+                                             agregados.totais_por_usuario(inicio_mes.year, inicio_mes.month), cota):
+            linha['fechamento_id'] = fechamento.id
+            if not recente or aleatorio.random() < 0.5:
+                linha['status_pagamento'] = 'quitado'
+            saldos.append(linha)
+
+        movimentacoes.append({'descricao': f'Depósito do fechamento {inicio_mes.month}/{inicio_mes.year}',
+                              'valor': valor_caixinha, 'user_id': None, 'data': fim_mes})
+        for _ in range(aleatorio.randrange(3)):
+            movimentacoes.append({'descricao': aleatorio.choice(('Vassoura', 'Detergente', 'Conserto', 'Lâmpada')),
+                                  'valor': -round(aleatorio.uniform(5, valor_caixinha / 4), 2),
+                                  'user_id': id_gerenciador,
+                                  'data': inicio_mes + relativedelta(days=aleatorio.randrange(28))})
+
+    if saldos:
+        db.session.execute(insert(SaldoMensal), saldos)
+        relatorio.reconstruir_relatorios()
+    if movimentacoes:
+        db.session.execute(insert(CaixinhaMovimentacao), movimentacoes)
+    return len(saldos), len(movimentacoes)
+
+
+def _gerar_escala_do_periodo(inicio, hoje):
+    """Escala de 'inicio' até 4 semanas à frente; as tarefas passadas ficam quase todas feitas."""
+    from .escala import gerar_escala, semana_atual
+    from .paginacao import antes_de
+
+    ano, semana = inicio.isocalendar()[0], inicio.isocalendar()[1]
+    semanas = (hoje - inicio).days // 7 + 5
+    gerar_escala(ano, semana, semanas)
+
+    # Pseudoaleatório pelo id, num UPDATE só
+    db.session.execute(
+        update(EscalaSemanal)
+        .where(antes_de((EscalaSemanal.ano, EscalaSemanal.semana), semana_atual()),
+               EscalaSemanal.id % TAREFA_PENDENTE_A_CADA != 0)
+        .values(status='feita')
+    )
+    return db.session.query(func.count(EscalaSemanal.id)).scalar()
+
+
+def semear(n_moradores, meses, lancamentos_por_mes, semente=42, senha='123'):
+    """
+    Enche o banco (vazio) com 'meses' meses fechados mais o mês atual aberto.
+    Todos os usuários (inclusive 'admin') recebem a mesma 'senha'. Faz commit.
+    Retorna um dict com as quantidades inseridas.
+    """
+    from . import TAREFAS_RECORRENTES
+    from .financas import agregados, caixinha
+    from .senhas import gerar_hash
+
+    aleatorio = random.Random(semente)
+    hoje = datetime.utcnow()
+    mes_atual = datetime(hoje.year, hoje.month, 1)
+    meses_fechados = [mes_atual - relativedelta(months=n) for n in range(meses, 0, -1)]
+
+    db.session.execute(insert(User), _moradores(n_moradores, gerar_hash(senha)))
+    moradores = User.query.filter(User.cargo != 'admin').order_by(User.id).all()
+    ids_moradores = [m.id for m in moradores]
+
+    db.session.execute(insert(Tarefa), [{'descricao': d, 'recorrente': True} for d in TAREFAS_RECORRENTES])
+    db.session.execute(insert(DespesaFixa), _despesas_fixas(moradores))
+    despesas = DespesaFixa.query.all()
+
+    n_lancamentos = 0
+    for inicio_mes in meses_fechados + [mes_atual]:
+        linhas = _lancamentos_do_mes(aleatorio, inicio_mes, lancamentos_por_mes, ids_moradores)
+        db.session.execute(insert(Lancamento), linhas)
+        n_lancamentos += len(linhas)
+    # Os inserts em lote não passam pelo before_flush: agregados de uma vez no fim
+    agregados.reconstruir_agregados()
+
+    n_saldos, n_movimentacoes = _fechar_meses(aleatorio, meses_fechados, moradores, despesas, ids_moradores[0])
+    caixinha.recalcular_saldo()
+    n_escala = _gerar_escala_do_periodo(meses_fechados[0] if meses_fechados else mes_atual, hoje)
+
+    db.session.commit()
+    return {'moradores': n_moradores, 'lancamentos': n_lancamentos, 'fechamentos': len(meses_fechados),
+            'saldos': n_saldos, 'movimentacoes_caixinha': n_movimentacoes, 'tarefas_escala': n_escala}
+
+
+# --- 2. BENCHMARK ---
+def _estatisticas(amostras):
+    ordenadas = sorted(amostras)
+    p95 = ordenadas[min(len(ordenadas) - 1, int(round(0.95 * (len(ordenadas) - 1))))]
+    return {'min_ms': round(ordenadas[0], 3), 'mediana_ms': round(statistics.median(ordenadas), 3),
+            'media_ms': round(statistics.fmean(ordenadas), 3), 'p95_ms': round(p95, 3),
+            'max_ms': round(ordenadas[-1], 3), 'amostras_ms': [round(a, 3) for a in amostras]}
+
+
+class _Cronometro:
+    """Tempo e quantidade de comandos SQL de cada requisição feita pelo cliente de testes."""
+
+    def __init__(self, cliente, motores):
+        self.cliente = cliente
+        self.motores = motores
+        self.amostras = {}
+        self.consultas = {}
+
+    def _contar(self, *args):
+        self._n_sql += 1
+
+    def medir(self, nome, metodo, url, status_esperado=(200,), acompanhar=False):
+        """Mede uma requisição. Com 'acompanhar', segue também a página do processamento criado."""
+        self._n_sql = 0
+        for motor in self.motores:
+            event.listen(motor, 'before_cursor_execute', self._contar)
+        try:
+            inicio = time.perf_counter()
+            resposta = self.cliente.open(url, method=metodo)
+            resposta.get_data()
+            if acompanhar and '/processamentos/' in resposta.headers.get('Location', ''):
+                resposta = self.cliente.get(resposta.headers['Location'])
+            duracao = (time.perf_counter() - inicio) * 1000
+        finally:
+            for motor in self.motores:
+                event.remove(motor, 'before_cursor_execute', self._contar)
+        if resposta.status_code not in status_esperado:
+            raise RuntimeError(f'{metodo} {url} respondeu {resposta.status_code} '
+                               f'(esperado {", ".join(map(str, status_esperado))}).')
+        if nome is not None:
+            self.amostras.setdefault(nome, []).append(duracao)
+            self.consultas[nome] = self._n_sql
+        return resposta
+
+
+def _commit_atual(pasta):
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=pasta, capture_output=True,
+                              text=True, check=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _resumo_dos_dados():
+    return {'moradores': User.query.filter(User.cargo != 'admin').count(),
+            'lancamentos': db.session.query(func.count(Lancamento.id)).scalar(),
+            'fechamentos': FechamentoMensal.query.filter_by(status='fechado').count(),
+            'tarefas_escala': db.session.query(func.count(EscalaSemanal.id)).scalar()}
+
+
+def medir_rotas(app, username, senha, repeticoes=20, aquecimento=2):
+    """
+    Mede as rotas quentes no banco atual e retorna o dict do JSON de
+    resultados. O mês atual precisa estar aberto: fechar_mes e reabrir_mes
+    são medidos em pares, então o banco termina como começou. O fechar_mes
+    roda de forma síncrona e inclui a página do processamento.
+    """
+    from .escala import semana_atual
+
+    hoje = datetime.utcnow()
+    if FechamentoMensal.query.filter_by(mes=hoje.month, ano=hoje.year, status='fechado').first():
+        raise RuntimeError('O mês atual está fechado; reabra-o antes de rodar o benchmark.')
+
+    # O fechamento roda dentro da requisição, para que o tempo medido seja o do cálculo
+    app.config['PROCESSAMENTO_SINCRONO'] = True
+    cliente = app.test_client()
+    resposta = cliente.post('/login', data={'username': username, 'password': senha})
+    if resposta.status_code != 302 or resposta.headers.get('Location', '').endswith('/login'):
+        raise RuntimeError(f'Não foi possível entrar como "{username}".')
+
+    ano, semana = semana_atual()
+    leituras = (
+        ('dashboard_tesoureiro', '/financas/dashboard_tesoureiro'),
+        ('dashboard_graficos', '/financas/graficos'),
+        # Todo o histórico semeado, para ver se o custo cresce com o intervalo
+        ('grafico_categorias', '/financas/graficos/categorias.json?de='),
+        ('grafico_historico', '/financas/graficos/historico.json?de=&comparar=1'),
+        ('grafico_moradores', '/financas/graficos/moradores.json?de='),
+        ('ver_escala', f'/escala/{ano}/{semana}'),
+        ('historico_escala', '/escala/historico'),
+    )
+    cronometro = _Cronometro(cliente, motores())
+    for rodada in range(aquecimento + repeticoes):
+        medindo = rodada >= aquecimento
+        for nome, url in leituras:
+            cronometro.medir(nome if medindo else None, 'GET', url)
+
+        resposta = cronometro.medir('fechar_mes' if medindo else None, 'POST', '/financas/fechar_mes', (302,),
+                                    acompanhar=True)
+        destino = resposta.headers.get('Location', '')
+        if '/relatorio/' not in destino:
+            raise RuntimeError(f'fechar_mes não fechou o mês (redirecionou para {destino or "nada"}).')
+        fechamento_id = int(destino.rstrip('/').rsplit('/', 1)[1])
+        cronometro.medir('reabrir_mes' if medindo else None, 'POST', f'/financas/reabrir_mes/{fechamento_id}', (302,))
+
+    return {
+        'versao_formato': VERSAO_FORMATO,
+        'commit': _commit_atual(app.root_path),
+        'gerado_em': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'banco': db.engine.dialect.name,
+        'cache_paineis': app.config['PAINEL_CACHE_TTL'] > 0,
+        'repeticoes': repeticoes,
+        'dados': _resumo_dos_dados(),
+        'rotas': {nome: dict(_estatisticas(amostras), consultas_sql=cronometro.consultas[nome])
+                  for nome, amostras in cronometro.amostras.items()},
+    }
+
+
+def comparar(antes, depois):
+    """[(rota, mediana antes, mediana depois, variação %, p95 antes, p95 depois)] das rotas em comum."""
+    linhas = []
+    for nome in sorted(set(antes['rotas']) & set(depois['rotas'])):
+        a, d = antes['rotas'][nome], depois['rotas'][nome]
+        variacao = (d['mediana_ms'] - a['mediana_ms']) / a['mediana_ms'] * 100 if a['mediana_ms'] else 0.0
+        linhas.append((nome, a['mediana_ms'], d['mediana_ms'], variacao, a['p95_ms'], d['p95_ms']))
+    return linhas
+
+
+def ler_resultado(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        resultado = json.load(arquivo)
+    if resultado.get('versao_formato') != VERSAO_FORMATO:
+        raise ValueError(f'{caminho}: formato {resultado.get("versao_formato")} não suportado '
+                         f'(esperado {VERSAO_FORMATO}).')
+    return resultado
@@ -0,0 +1,145 @@
+# app/cache_usuarios.py
+# Cache local (por processo) dos usuários carregados pelo Flask-Login.
+#
+# O load_user roda em toda requisição autenticada. Em vez de um SELECT por
+# requisição, guardamos uma cópia destacada (detached) de cada User e a
+# anexamos à sessão da requisição com merge(load=False), que não consulta o
+# banco: uma requisição com o usuário em cache não faz nenhuma consulta.
+#
+# Não há versão compartilhada: uma transação que altera ou remove um User
+# (admin.edit_usuario, deletar_usuario, troca de senha...) tira o usuário do
+# cache deste processo no after_commit, e os outros workers o releem quando a
+# entrada expira (USUARIO_CACHE_TTL, 60 s por padrão). Nesse intervalo um
+# worker ainda pode ver o cargo ou a senha antigos; TTL 0 desliga o cache.
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import event, inspect as inspecionar
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .models import db, User
+
+# Marca na sessão: ids de usuários alterados na transação atual
+_ALTERADOS = 'usuarios_alterados'
+
+
+class CacheUsuarios:
+    """LRU com TTL de usuários destacados da sessão, seguro entre threads."""
+
+    def __init__(self):
+        self._itens = OrderedDict()  # user_id -> (user destacado, expira_em)
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, user_id):
+        with self._trava:
+            item = self._itens.get(user_id)
+            if item is None or item[1] < time.monotonic():
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(user_id)
+            self.acertos += 1
+            return item[0]
+
+    def guardar(self, user_id, user, ttl, tamanho):
+        with self._trava:
+            self._itens[user_id] = (user, time.monotonic() + ttl)
+            self._itens.move_to_end(user_id)
+            while len(self._itens) > tamanho:
+                self._itens.popitem(last=False)
+
+    def remover(self, ids):
+        with self._trava:
+            for user_id in ids:
+                self._itens.pop(user_id, None)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._trava:
+            total = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / total, 4) if total else 0.0,
+                'itens': len(self._itens),
+            }
+
+
+_cache = CacheUsuarios()
+
+
+def _copia_destacada(user):
+    """Cópia só com as colunas, fora de qualquer sessão (pode ser compartilhada entre threads)."""
+    colunas = {attr.key: getattr(user, attr.key) for attr in inspecionar(User).column_attrs}
+    copia = User(**colunas)
+    make_transient_to_detached(copia)
+    return copia
+
+
+def carregar_usuario(user_id):
+    """User da sessão atual, vindo do cache quando possível (usado pelo load_user)."""
+    ttl = current_app.config['USUARIO_CACHE_TTL']
+    if ttl <= 0:
+        return db.session.get(User, user_id)
+
+    em_cache = _cache.obter(user_id)
+    if em_cache is not None:
+        return db.session.merge(em_cache, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        _cache.guardar(user_id, _copia_destacada(user), ttl, current_app.config['USUARIO_CACHE_TAMANHO'])
+    return user
+
+
+def estatisticas():
+    """Acertos, falhas e tamanho do cache deste processo."""
+    return _cache.estatisticas()
+
+
+# --- INVALIDAÇÃO ---
+def _marcar_alterados(session, ids):
+    session.info[_ALTERADOS] = session.info.get(_ALTERADOS, set()) | ids
+
+
+@event.listens_for(Session, 'before_flush')
+def _observar_flush(session, flush_context, instances):
+    # is_modified: atribuição sem mudança de valor não sobe a versão
+    alterados = [obj for obj in session.dirty if isinstance(obj, User) and session.is_modified(obj)]
+    ids = {obj.id for obj in (*alterados, *session.deleted) if isinstance(obj, User) and obj.id is not None}
+    if ids:
+        _marcar_alterados(session, ids)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _observar_execute(orm_execute_state):
+    # update()/delete() em massa não dizem quais ids mudaram: esquece todos
+    estado = orm_execute_state
+    if not (estado.is_update or estado.is_delete):
+        return
+    mapper = estado.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, User):
+        _marcar_alterados(estado.session, {None})
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar(session):
+    alterados = session.info.pop(_ALTERADOS, None)
+    if not alterados:
+        return
+    if None in alterados:
+        _cache.limpar()
+    else:
+        _cache.remover(alterados)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_marca(session):
+    session.info.pop(_ALTERADOS, None)
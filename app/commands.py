@@ -1,7 +1,10 @@
 # Arquivo: app/commands.py  <-- CÓDIGO CORRIGIDO
 
+import json
+import time
+
 import click
-from flask.cli import with_appcontext
+from flask.cli import AppGroup, with_appcontext
 
 # REMOVEMOS AS IMPORTAÇÕES DE 'db', 'models' e 'TAREFAS' DAQUI
 # Elas serão movidas para dentro da função abaixo
@@ -15,13 +18,20 @@ def init_db_command():
     # As importações agora estão DENTRO da função
     from . import db
     from .models import User, Tarefa
-    from . import TAREFAS_RECORRENTES
+    from . import TAREFAS_RECORRENTES, ROTACAO_ORIGINAL, ROTACAO_INVERTIDA
+    from .senhas import gerar_hashes
     # --- FIM DA MUDANÇA ---
 
     # 1. Cria todas as tabelas (ele já verifica se existem)
     db.create_all()
     click.echo('Tabelas criadas com sucesso!')
 
+    # Linha da versão do cache dos painéis e a do saldo do caixinha, como as migrações fazem
+    from .financas.cache import garantir_versao
+    from .financas.caixinha import garantir_linha_saldo
+    garantir_versao(db.session.connection())
+    garantir_linha_saldo(db.session.connection())
+
     # 2. Popula a tabela de Tarefas se estiver vazia
     if Tarefa.query.first() is None:
         for desc in TAREFAS_RECORRENTES:
@@ -43,18 +53,319 @@ def init_db_command():
     ]
 
     # 5. Loop para verificar e criar cada usuário se ele não existir
-    for username in default_users:
-        if not User.query.filter_by(username=username).first():
-            user = User(username=username, cargo='usuario')
-            user.set_password('123')
-            db.session.add(user)
-            click.echo(f"Usuário padrão '{username}' criado com sucesso!")
+    #    (os hashes das senhas são calculados em paralelo, não um por vez)
+    novos = [username for username in default_users
+             if not User.query.filter_by(username=username).first()]
+    for username, hash_senha in zip(novos, gerar_hashes(['123'] * len(novos))):
+        user = User(username=username, cargo='usuario',
+                    ordem_original=ROTACAO_ORIGINAL.index(username),
+                    ordem_invertido=ROTACAO_INVERTIDA.index(username),
+                    password_hash=hash_senha)
+        db.session.add(user)
+        click.echo(f"Usuário padrão '{username}' criado com sucesso!")
 
     # 6. Salva todas as novas criações no banco de dados
     db.session.commit()
     click.echo('Todas as alterações foram salvas no banco de dados.')
 
 
+@click.command('rebuild-agregados')
+@click.option('--check', is_flag=True, help='Apenas verifica o drift, sem reconstruir.')
+@with_appcontext
+def rebuild_agregados_command(check):
+    """Recalcula a tabela de agregados de lançamentos (e a série dos gráficos) e verifica drift."""
+    from . import db
+    from .financas import series
+    from .financas.agregados import TOLERANCIA_DRIFT, verificar_drift, reconstruir_agregados
+
+    # Drift dos agregados e da série mensal dos gráficos (derivada deles e dos fechamentos)
+    divergencias = verificar_drift() + series.verificar_drift(TOLERANCIA_DRIFT)
+    for chave, armazenado, calculado in divergencias:
+        click.echo(f'Drift em {chave}: armazenado={armazenado} calculado={calculado}')
+    click.echo(f'{len(divergencias)} chave(s) com drift.')
+
+    if check:
+        if divergencias:
+            raise SystemExit(1)
+        return
+
+    total_chaves = reconstruir_agregados()
+    db.session.commit()
+    click.echo(f'Agregados reconstruídos: {total_chaves} chave(s).')
+
+
+@click.command('rebuild-caixinha')
+@with_appcontext
+def rebuild_caixinha_command():
+    """Recalcula o saldo corrente do caixinha a partir das movimentações."""
+    from . import db
+    from .financas.caixinha import recalcular_saldo
+
+    antigo, novo = recalcular_saldo()
+    db.session.commit()
+    click.echo(f'Saldo do caixinha: R$ {antigo:.2f} -> R$ {novo:.2f}')
+
+
+@click.command('rebuild-relatorios')
+@click.option('--todos', is_flag=True, help='Refaz também os retratos que já estão na versão atual.')
+@with_appcontext
+def rebuild_relatorios_command(todos):
+    """Grava o retrato do relatório dos meses fechados que ainda não têm (ou estão desatualizados)."""
+    from . import db
+    from .financas.relatorio import reconstruir_relatorios
+
+    total = reconstruir_relatorios(todos=todos)
+    db.session.commit()
+    click.echo(f'Retratos de relatório gravados: {total} fechamento(s).')
+
+
+@click.command('explain-check')
+@with_appcontext
+def explain_check_command():
+    """Roda EXPLAIN QUERY PLAN nas consultas principais e falha se houver full scan (de tabela ou índice)."""
+    from . import db
+    from .diagnostico import verificar_planos
+
+    if db.engine.dialect.name != 'sqlite':
+        click.echo('O explain-check só está disponível para SQLite.')
+        return
+
+    resultados, problemas = verificar_planos()
+    for rota, descricao, plano in resultados:
+        click.echo(f'{rota} ({descricao}):')
+        for detalhe in plano:
+            click.echo(f'    {detalhe}')
+
+    if problemas:
+        for rota, descricao, detalhe in problemas:
+            click.echo(f'FULL SCAN ({detalhe}): {rota} ({descricao})', err=True)
+        raise SystemExit(1)
+    click.echo('Nenhuma leitura completa de tabela ou índice nas consultas principais.')
+
+
+@click.command('query-budget')
+@click.option('--pequena', type=click.IntRange(min=1), default=10, show_default=True,
+              help='Moradores na casa pequena.')
+@click.option('--grande', type=click.IntRange(min=2), default=1000, show_default=True,
+              help='Moradores na casa grande.')
+def query_budget_command(pequena, grande):
+    """Falha se alguma rota executa mais consultas SQL na casa grande do que na pequena (N+1)."""
+    from .orcamento_consultas import verificar_orcamento
+
+    estouros = 0
+    for nome, status, n_pequena, n_grande, cresceram in verificar_orcamento(pequena, grande):
+        situacao = 'OK' if not cresceram else 'ESTOURO'
+        click.echo(f'{situacao:8} {nome}: {n_pequena} -> {n_grande} consulta(s) (status {status[0]}/{status[1]})')
+        if cresceram:
+            estouros += 1
+            for comando, vezes_pequena, vezes_grande in cresceram:
+                click.echo(f'    {vezes_pequena} -> {vezes_grande}x {comando}', err=True)
+
+    if estouros:
+        click.echo(f'{estouros} rota(s) com consultas que crescem com o número de moradores.', err=True)
+        raise SystemExit(1)
+    click.echo('Nenhuma rota com consultas que crescem com o número de moradores.')
+
+
+@click.command('saldos-check')
+@click.option('--casas', type=click.IntRange(min=2), default=6, show_default=True,
+              help='Quantas casas aleatórias comparar.')
+@click.option('--minimo', type=click.IntRange(min=1), default=10, show_default=True,
+              help='Moradores na menor casa.')
+@click.option('--maximo', type=click.IntRange(min=1), default=5000, show_default=True,
+              help='Moradores na maior casa.')
+@click.option('--semente', type=int, default=2014, show_default=True, help='Semente do sorteio das casas.')
+def saldos_check_command(casas, minimo, maximo, semente):
+    """Falha se os saldos do fechamento divergem do cálculo antigo (uma consulta por morador)."""
+    from .conferencia_saldos import verificar_saldos
+
+    if minimo > maximo:
+        raise click.BadParameter('--minimo maior que --maximo.')
+
+    falhas = 0
+    for n_moradores, situacao, divergencias in verificar_saldos(casas, minimo, maximo, semente):
+        click.echo(f"{'OK' if not divergencias else 'DIVERGE':8} {n_moradores} morador(es) ({situacao})")
+        if divergencias:
+            falhas += 1
+            for divergencia in divergencias[:10]:
+                click.echo(f'    {divergencia}', err=True)
+
+    if falhas:
+        click.echo(f'{falhas} casa(s) com saldos diferentes do cálculo de referência.', err=True)
+        raise SystemExit(1)
+    click.echo('Saldos idênticos ao cálculo de referência em todas as casas.')
+
+
+@click.command('importar-extrato')
+@click.argument('caminho', type=click.Path(exists=True, dir_okay=False))
+@click.option('--pagador', default='casa', show_default=True,
+              help="Username de quem pagou, ou 'casa'.")
+@click.option('--encoding', default='utf-8-sig', show_default=True, help='Codificação do arquivo.')
+@click.option('--despesas-positivas', is_flag=True,
+              help='As despesas vêm com valor positivo (fatura de cartão).')
+@with_appcontext
+def importar_extrato_command(caminho, pagador, encoding, despesas_positivas):
+    """Importa um extrato CSV ou OFX como lançamentos (sem duplicar)."""
+    from .models import User
+    from .financas.importacao import importar_extrato, leitor_por_nome
+
+    user_id = None
+    if pagador != 'casa':
+        user = User.query.filter_by(username=pagador).first()
+        if not user:
+            raise click.BadParameter(f'Usuário "{pagador}" não encontrado.', param_hint='--pagador')
+        user_id = user.id
+
+    leitor = leitor_por_nome(caminho)
+    with open(caminho, encoding=encoding, errors='replace', newline='') as arquivo:
+        try:
+            resumo = importar_extrato(leitor(arquivo), user_id=user_id,
+                                      despesas_negativas=not despesas_positivas)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    click.echo(f"{resumo['lidas']} linha(s) lida(s): {resumo['importadas']} importada(s), "
+               f"{resumo['duplicadas']} já existente(s), {resumo['ignoradas']} crédito(s) ignorado(s), "
+               f"{resumo['mes_fechado']} de mês fechado, {resumo['invalidas']} inválida(s).")
+
+
+escala_cli = AppGroup('escala', help='Comandos da escala semanal.')
+
+
+@escala_cli.command('generate')
+@click.option('--from', 'inicio', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Data dentro da primeira semana a gerar (padrão: semana atual).')
+@click.option('--weeks', 'semanas', type=click.IntRange(min=1), default=52, show_default=True,
+              help='Quantidade de semanas a gerar.')
+def escala_generate_command(inicio, semanas):
+    """Pré-gera (de forma idempotente) as tarefas recorrentes da escala."""
+    from . import db
+    from .escala import gerar_escala, semana_atual
+    from .rotacao import semanas_a_partir
+
+    if inicio:
+        ano, semana = inicio.isocalendar()[0], inicio.isocalendar()[1]
+    else:
+        ano, semana = semana_atual()
+
+    linhas = gerar_escala(ano, semana, semanas)
+    db.session.commit()
+
+    ultima = semanas_a_partir(ano, semana, semanas)[-1]
+    click.echo(f'Escala gerada de {semana}/{ano} a {ultima[1]}/{ultima[0]} '
+               f'({linhas} posições verificadas; as já existentes foram mantidas).')
+
+
+bench_cli = AppGroup('bench', help='Dados sintéticos e benchmark das rotas mais pesadas.')
+
+
+@bench_cli.command('seed')
+@click.option('--moradores', type=click.IntRange(min=1), default=10, show_default=True,
+              help='Quantidade de moradores (o primeiro é o gerenciador).')
+@click.option('--months', 'meses', type=click.IntRange(min=0), default=24, show_default=True,
+              help='Meses fechados antes do mês atual.')
+@click.option('--lancamentos-per-month', 'lancamentos_por_mes', type=click.IntRange(min=0),
+              default=200, show_default=True, help='Lançamentos por mês (parcelas seguintes à parte).')
+@click.option('--seed', 'semente', type=int, default=42, show_default=True,
+              help='Semente do gerador (mesma semente, mesmos dados).')
+@click.option('--senha', default='123', show_default=True, help='Senha de todos os usuários gerados.')
+def bench_seed_command(moradores, meses, lancamentos_por_mes, semente, senha):
+    """Enche um banco vazio com dados sintéticos realistas."""
+    from . import db
+    from .models import User
+    from .bench import semear
+
+    db.create_all()
+    if User.query.first() is not None:
+        raise click.ClickException('O banco já tem usuários. Use um banco vazio (DATABASE_URL).')
+
+    inicio = time.perf_counter()
+    quantidades = semear(moradores, meses, lancamentos_por_mes, semente=semente, senha=senha)
+    click.echo(', '.join(f'{n} {nome.replace("_", " ")}' for nome, n in quantidades.items()) +
+               f' em {time.perf_counter() - inicio:.1f} s.')
+    gerenciador = User.query.filter_by(cargo='gerenciador').first()
+    click.echo(f"Gerenciador: '{gerenciador.username}'; todos os usuários (e 'admin') com a senha '{senha}'.")
+
+
+@bench_cli.command('run')
+@click.option('--usuario', 'username', default=None,
+              help='Gerenciador usado nas requisições (padrão: o primeiro gerenciador).')
+@click.option('--senha', default='123', show_default=True)
+@click.option('--repeticoes', type=click.IntRange(min=1), default=20, show_default=True,
+              help='Medições por rota (fora o aquecimento).')
+@click.option('--com-cache', is_flag=True, help='Mantém o cache dos painéis ligado (mede acertos de cache).')
+@click.option('--saida', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Arquivo JSON de resultados (padrão: saída padrão).')
+def bench_run_command(username, senha, repeticoes, com_cache, saida):
+    """Mede as rotas quentes no banco atual e grava os resultados em JSON."""
+    from flask import current_app
+    from .models import User
+    from .bench import medir_rotas
+
+    if username is None:
+        gerenciador = User.query.filter_by(cargo='gerenciador').order_by(User.id).first()
+        if gerenciador is None:
+            raise click.ClickException('Nenhum gerenciador no banco; informe --usuario.')
+        username = gerenciador.username
+    if not com_cache:
+        # Mede o trabalho das rotas, não o cache local dos painéis
+        current_app.config['PAINEL_CACHE_TTL'] = 0
+
+    try:
+        resultado = medir_rotas(current_app, username, senha, repeticoes)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto + '\n')
+        for nome, rota in resultado['rotas'].items():
+            click.echo(f"{nome:22} mediana {rota['mediana_ms']:9.2f} ms   p95 {rota['p95_ms']:9.2f} ms   "
+                       f"{rota['consultas_sql']} consulta(s)")
+        click.echo(f'Resultados gravados em {saida}.')
+    else:
+        click.echo(texto)
+
+
+@bench_cli.command('compare')
+@click.argument('antes', type=click.Path(exists=True, dir_okay=False))
+@click.argument('depois', type=click.Path(exists=True, dir_okay=False))
+@click.option('--limite', type=float, default=None,
+              help='Falha se a mediana de alguma rota piorar mais que este percentual.')
+def bench_compare_command(antes, depois, limite):
+    """Compara dois resultados do 'flask bench run' (mediana e p95 por rota)."""
+    from .bench import comparar, ler_resultado
+
+    try:
+        resultado_antes, resultado_depois = ler_resultado(antes), ler_resultado(depois)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if resultado_antes['dados'] != resultado_depois['dados']:
+        click.echo('Atenção: os resultados foram medidos com dados diferentes.', err=True)
+
+    click.echo(f"{'rota':22} {'mediana antes':>14} {'depois':>10} {'variação':>9} {'p95 antes':>10} {'depois':>10}")
+    pioraram = []
+    for nome, mediana_a, mediana_d, variacao, p95_a, p95_d in comparar(resultado_antes, resultado_depois):
+        click.echo(f'{nome:22} {mediana_a:11.2f} ms {mediana_d:7.2f} ms {variacao:+8.1f}% '
+                   f'{p95_a:7.2f} ms {p95_d:7.2f} ms')
+        if limite is not None and variacao > limite:
+            pioraram.append(nome)
+
+    if pioraram:
+        click.echo(f"Pioraram mais de {limite:g}%: {', '.join(pioraram)}.", err=True)
+        raise SystemExit(1)
+
+
 def init_app(app):
     """Registra os comandos da CLI na aplicação Flask."""
-    app.cli.add_command(init_db_command)
\ No newline at end of file
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_agregados_command)
+    app.cli.add_command(rebuild_caixinha_command)
+    app.cli.add_command(rebuild_relatorios_command)
+    app.cli.add_command(explain_check_command)
+    app.cli.add_command(query_budget_command)
+    app.cli.add_command(saldos_check_command)
+    app.cli.add_command(importar_extrato_command)
+    app.cli.add_command(escala_cli)
+    app.cli.add_command(bench_cli)
\ No newline at end of file
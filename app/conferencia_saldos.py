@@ -0,0 +1,217 @@
+# app/conferencia_saldos.py
+# Conferência do cálculo dos saldos do fechamento ('flask saldos-check').
+#
+# O fechar_mes calcula os saldos em memória (calcular_saldos_mensais), com
+# os aluguéis tirados das despesas fixas já carregadas. Esta conferência
+# monta casas aleatórias (10 a 5.000 moradores por padrão) num SQLite
+# temporário e compara o resultado, linha a linha, com o laço antigo, que
+# consultava o aluguel de cada morador. O laço antigo fica aqui só como
+# referência. Com a mesma semente, as casas são sempre as mesmas.
+# tests/test_fechamento.py fecha casas semeadas pela rota e compara as
+# linhas gravadas de SaldoMensal com a mesma referência.
+
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import insert
+
+CATEGORIAS = ('Mercado', 'Contas', 'Limpeza', 'Manutenção', 'Outros')
+
+
+# --- 1. REFERÊNCIA (LAÇO ANTIGO) ---
+def saldos_por_morador_referencia(moradores, gastos_por_usuario, cota_outras_despesas):
+    """As linhas de SaldoMensal como o fechar_mes calculava antes: uma consulta de aluguel por morador."""
+    from .financas import CHAVE_ALUGUEL
+    from .models import DespesaFixa
+
+    linhas = []
+    for morador in moradores:
+        despesa_aluguel_morador = DespesaFixa.query.filter_by(
+            descricao=CHAVE_ALUGUEL,
+            morador_id=morador.id,
+            ativa=True
+        ).first()
+
+        if not despesa_aluguel_morador:
+            raise ValueError(f"Morador '{morador.username}' não possui despesa de aluguel ativa. Por favor, atualize os valores em 'Gerenciar Aluguel'.")
+
+        valor_aluguel_morador = despesa_aluguel_morador.valor
+        gastos_pessoais_devidos = 0.0
+        valor_devido_user = valor_aluguel_morador + cota_outras_despesas
+        total_gasto_lancado_user = gastos_por_usuario.get(morador.id, 0.0)
+
+        linhas.append({
+            'user_id': morador.id,
+            'total_gasto': total_gasto_lancado_user,
+            'valor_devido': valor_devido_user,
+            'valor_devido_aluguel': valor_aluguel_morador,
+            'valor_devido_outros': cota_outras_despesas,
+            'valor_devido_pessoais': gastos_pessoais_devidos,
+            'saldo_final': total_gasto_lancado_user - valor_devido_user,
+            'status_pagamento': 'pendente',
+        })
+    return linhas
+
+
+# --- 2. DADOS ---
+def _valor(rng, minimo, maximo):
+    return round(rng.uniform(minimo, maximo), 2)
+
+
+def semear_casa_aleatoria(rng, n_moradores, hoje, sem_aluguel=False):
+    """
+    Casa com 'n_moradores', aluguéis e lançamentos sorteados. Alguns moradores
+    têm um aluguel antigo inativo ou um segundo aluguel ativo; com
+    'sem_aluguel', um deles fica sem aluguel ativo (o fechamento deve falhar).
+    """
+    from .financas import CHAVE_ALUGUEL, CHAVE_CAIXINHA, agregados
+    from .models import db, User, DespesaFixa, Lancamento
+    from .senhas import gerar_hash
+
+    hash_senha = gerar_hash('x')
+    usuarios = [{'username': 'admin', 'cargo': 'admin', 'password_hash': hash_senha,
+                 'tipo_quarto': 'compartilhado'}]
+    for i in range(n_moradores):
+        usuarios.append({'username': f'morador{i:04d}', 'password_hash': hash_senha,
+                         'cargo': 'gerenciador' if i == 0 else 'usuario',
+                         'tipo_quarto': rng.choice(('individual', 'compartilhado'))})
+    db.session.execute(insert(User), usuarios)
+    ids_moradores = list(range(2, n_moradores + 2))  # ids 2..N+1 (1 = admin)
+
+    despesas = [{'descricao': 'Internet', 'valor': _valor(rng, 80, 200), 'ativa': True},
+                {'descricao': 'Luz', 'valor': _valor(rng, 100, 400), 'ativa': rng.random() < 0.8},
+                {'descricao': CHAVE_CAIXINHA, 'valor': rng.choice((0.0, _valor(rng, 20, 100))), 'ativa': True},
+                {'descricao': CHAVE_ALUGUEL, 'valor': 1000.0 * n_moradores, 'ativa': False,
+                 'diferenca_individual': 100.0}]
+    sem_aluguel_id = rng.choice(ids_moradores) if sem_aluguel else None
+    for user_id in ids_moradores:
+        if rng.random() < 0.05:
+            despesas.append({'descricao': CHAVE_ALUGUEL, 'valor': _valor(rng, 300, 1500),
+                             'ativa': False, 'morador_id': user_id})
+        if user_id == sem_aluguel_id:
+            continue
+        despesas.append({'descricao': CHAVE_ALUGUEL, 'valor': _valor(rng, 300, 1500),
+                         'ativa': True, 'morador_id': user_id})
+        if rng.random() < 0.02:
+            despesas.append({'descricao': CHAVE_ALUGUEL, 'valor': _valor(rng, 300, 1500),
+                             'ativa': True, 'morador_id': user_id})
+    db.session.execute(insert(DespesaFixa), despesas)
+
+    anterior = hoje - relativedelta(months=1)
+    lancamentos = []
+    for mes_ref in (hoje, anterior):
+        pagadores = [rng.choice(ids_moradores + [None]) for _ in range(rng.randint(0, 3 * n_moradores))]
+        for user_id in pagadores:
+            lancamentos.append({'descricao': 'Compra', 'valor': _valor(rng, -50, 400),
+                                'categoria': rng.choice(CATEGORIAS), 'data': mes_ref,
+                                'mes_referencia': mes_ref.month, 'ano_referencia': mes_ref.year,
+                                'user_id': user_id})
+    if lancamentos:
+        db.session.execute(insert(Lancamento), lancamentos)
+    agregados.reconstruir_agregados()
+    db.session.commit()
+
+
+# --- 3. COMPARAÇÃO ---
+def _calcular(funcao):
+    """('ok', linhas) ou ('erro', mensagem) do cálculo."""
+    try:
+        return 'ok', funcao()
+    except ValueError as e:
+        return 'erro', str(e)
+
+
+def entradas_do_fechamento(hoje):
+    """
+    As entradas que o executar_fechamento monta para o mês de 'hoje':
+    (despesas fixas ativas, moradores, gastos por morador, cota das outras despesas).
+    """
+    from .financas import CHAVE_ALUGUEL, CHAVE_CAIXINHA, agregados
+    from .models import DespesaFixa, User
+
+    despesas_fixas = DespesaFixa.query.filter_by(ativa=True).all()
+    valor_caixinha = sum(d.valor for d in despesas_fixas
+                         if d.descricao == CHAVE_CAIXINHA and d.morador_id is None)
+    total_fixo_outros = sum(d.valor for d in despesas_fixas
+                            if d.descricao not in (CHAVE_ALUGUEL, CHAVE_CAIXINHA) and d.morador_id is None)
+    total_variavel = agregados.total_do_mes(hoje.year, hoje.month)
+    gastos_por_usuario = agregados.totais_por_usuario(hoje.year, hoje.month)
+    moradores = User.query.filter(User.cargo != 'admin').all()
+    cota = (total_fixo_outros + total_variavel + valor_caixinha) / len(moradores)
+    return despesas_fixas, moradores, gastos_por_usuario, cota
+
+
+def comparar_saldos(hoje):
+    """Roda os dois cálculos na casa do banco atual. Retorna (resultado novo, resultado da referência)."""
+    from .financas.routes_fechamento import alugueis_por_morador, calcular_saldos_mensais
+
+    despesas_fixas, moradores, gastos_por_usuario, cota = entradas_do_fechamento(hoje)
+    novo = _calcular(lambda: calcular_saldos_mensais(
+        moradores, alugueis_por_morador(despesas_fixas), gastos_por_usuario, cota))
+    referencia = _calcular(lambda: saldos_por_morador_referencia(moradores, gastos_por_usuario, cota))
+    return novo, referencia
+
+
+def _divergencias(novo, referencia):
+    """Descrições das diferenças entre os dois resultados (vazia se iguais)."""
+    if novo[0] != referencia[0]:
+        return [f'novo={novo[0]} ({novo[1] if novo[0] == "erro" else "ok"}), '
+                f'referência={referencia[0]} ({referencia[1] if referencia[0] == "erro" else "ok"})']
+    if novo[0] == 'erro':
+        return [] if novo[1] == referencia[1] else [f'mensagens diferentes: {novo[1]!r} != {referencia[1]!r}']
+    if len(novo[1]) != len(referencia[1]):
+        return [f'{len(novo[1])} linha(s) != {len(referencia[1])} linha(s) na referência']
+    return [f'user_id={linha["user_id"]}: {linha} != {esperada}'
+            for linha, esperada in zip(novo[1], referencia[1]) if linha != esperada]
+
+
+def _rodar_casa(caminho, rng, n_moradores, hoje, sem_aluguel):
+    from . import banco, create_app
+    from .models import db
+
+    variaveis = {'DATABASE_URL': 'sqlite:///' + caminho, 'METRICAS_ATIVAS': '0'}
+    anteriores = {chave: os.environ.get(chave) for chave in variaveis}
+    os.environ.update(variaveis)
+    try:
+        app = create_app()
+    finally:
+        for chave, valor in anteriores.items():
+            if valor is None:
+                os.environ.pop(chave, None)
+            else:
+                os.environ[chave] = valor
+
+    with app.app_context():
+        try:
+            db.create_all()
+            semear_casa_aleatoria(rng, n_moradores, hoje, sem_aluguel=sem_aluguel)
+            return comparar_saldos(hoje)
+        finally:
+            db.session.remove()
+            for motor in banco.motores():
+                motor.dispose()
+
+
+def verificar_saldos(casas=6, minimo=10, maximo=5000, semente=2014):
+    """
+    Compara os dois cálculos em 'casas' casas aleatórias (a menor e a maior
+    sempre entram). Retorna [(moradores, situação, [divergências])], com
+    situação 'ok' ou 'erro' (o fechamento recusaria a casa).
+    """
+    rng = random.Random(semente)
+    tamanhos = [minimo, maximo][:casas] + [rng.randint(minimo, maximo) for _ in range(casas - 2)]
+    hoje = datetime.utcnow()
+    pasta = tempfile.mkdtemp(prefix='saldos-check-')
+    resultados = []
+    try:
+        for i, n_moradores in enumerate(tamanhos):
+            caminho = os.path.join(pasta, f'casa_{i}.db')
+            novo, referencia = _rodar_casa(caminho, rng, n_moradores, hoje, sem_aluguel=rng.random() < 0.25)
+            resultados.append((n_moradores, referencia[0], _divergencias(novo, referencia)))
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    return resultados
@@ -0,0 +1,123 @@
+# app/diagnostico.py
+# Ferramentas de diagnóstico de desempenho usadas pelos comandos da CLI.
+
+import re
+
+from sqlalchemy import func
+
+from .models import (db, Lancamento, LancamentoAgregado, FechamentoMensal, CaixinhaMovimentacao,
+                     EscalaSemanal)
+from .paginacao import antes_de
+
+# 'SCAN tabela' (ou 'SCAN TABLE tabela' em SQLite antigo) é uma leitura da
+# tabela inteira. Com 'USING [COVERING] INDEX', o SQLite percorre o índice
+# inteiro (em geral para evitar o ORDER BY): só é aceitável se a consulta tem
+# LIMIT ou está em VARREDURAS_PERMITIDAS.
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?:\s+AS \w+)?(\s+USING (?:COVERING )?INDEX \w+)?$')
+
+# (rota, descrição) das consultas que podem percorrer um índice inteiro sem
+# LIMIT, com o motivo. Ex.: ('rota', 'consulta'): 'tabela com poucas linhas'.
+VARREDURAS_PERMITIDAS = {}
+
+
+# --- EXPLAIN QUERY PLAN ---
+def consultas_principais(ano=2024, mes=1, semana=1, user_id=1, fechamento_id=1):
+    """
+    As consultas principais de cada rota, montadas como nas próprias rotas.
+    Retorna uma lista de (rota, descrição, query).
+    """
+    from .financas import series
+    from .financas.routes_aluguel import consulta_alugueis_individuais
+
+    chave_lancamento = (Lancamento.ano_referencia, Lancamento.mes_referencia, Lancamento.id)
+    ordem_lancamento = [coluna.desc() for coluna in chave_lancamento]
+    fechado_do_mes = FechamentoMensal.query.filter_by(mes=mes, ano=ano, status='fechado')
+    agregado_do_mes = db.session.query(func.sum(LancamentoAgregado.total)).filter(
+        LancamentoAgregado.ano_referencia == ano,
+        LancamentoAgregado.mes_referencia == mes,
+        LancamentoAgregado.quantidade > 0
+    )
+    return [
+        ('financas.dashboard', 'fechamento do mês', fechado_do_mes),
+        ('financas.dashboard_usuario', 'gastos do usuário no mês',
+         Lancamento.query.filter_by(user_id=user_id, mes_referencia=mes, ano_referencia=ano)
+         .order_by(Lancamento.data.desc())),
+        ('financas.dashboard_usuario', 'total do usuário (agregado)',
+         agregado_do_mes.filter(LancamentoAgregado.user_id == user_id)),
+        ('financas.dashboard_tesoureiro', 'lançamentos do mês',
+         Lancamento.query.filter_by(mes_referencia=mes, ano_referencia=ano)
+         .order_by(Lancamento.data.desc())),
+        ('financas.dashboard_tesoureiro', 'totais por usuário (agregado)',
+         db.session.query(LancamentoAgregado.user_id, func.sum(LancamentoAgregado.total))
+         .filter(LancamentoAgregado.ano_referencia == ano,
+                 LancamentoAgregado.mes_referencia == mes,
+                 LancamentoAgregado.user_id != None)
+         .group_by(LancamentoAgregado.user_id)),
+        ('financas.dashboard_tesoureiro', 'últimas movimentações do caixinha',
+         CaixinhaMovimentacao.query.order_by(CaixinhaMovimentacao.data.desc()).limit(10)),
+        ('financas.fechar_mes', 'total do mês (agregado)', agregado_do_mes),
+        ('financas.gerenciar_aluguel', 'aluguéis dos moradores (recálculo)', consulta_alugueis_individuais()),
+        ('financas.editar_lancamento', 'mês fechado?', fechado_do_mes),
+        ('financas.ver_relatorio', 'fechamento (com o relatório gravado)',
+         FechamentoMensal.query.filter_by(id=fechamento_id)),
+        ('financas.historico_financeiro', 'meses fechados',
+         FechamentoMensal.query.filter_by(status='fechado')
+         .filter(antes_de((FechamentoMensal.ano, FechamentoMensal.mes), (ano, mes)))
+         .order_by(FechamentoMensal.ano.desc(), FechamentoMensal.mes.desc()).limit(13)),
+        ('financas.navegar_lancamentos', 'página de lançamentos',
+         Lancamento.query.filter(antes_de(chave_lancamento, (ano, mes, 1000)))
+         .order_by(*ordem_lancamento).limit(51)),
+        ('financas.navegar_lancamentos', 'página de lançamentos (por pagador)',
+         Lancamento.query.filter(Lancamento.user_id == user_id, antes_de(chave_lancamento, (ano, mes, 1000)))
+         .order_by(*ordem_lancamento).limit(51)),
+        ('financas.grafico_categorias', 'gastos por categoria (série mensal)',
+         series.consulta_por_categoria((ano - 10, mes), (ano, mes))),
+        ('financas.grafico_historico', 'total dos meses fechados (série mensal)',
+         series.consulta_por_mes_fechado((ano - 10, mes), (ano, mes))),
+        ('financas.grafico_moradores', 'total por morador (agregado)',
+         series.consulta_por_morador((ano - 10, mes), (ano, mes))),
+        ('escala.ver_escala', 'tarefas da semana',
+         EscalaSemanal.query.filter_by(semana=semana, ano=ano).order_by(EscalaSemanal.id)),
+        ('escala.historico_escala', 'semanas da página',
+         db.session.query(EscalaSemanal.ano, EscalaSemanal.semana)
+         .filter(EscalaSemanal.ano <= ano).distinct()
+         .order_by(EscalaSemanal.ano.desc(), EscalaSemanal.semana.desc()).limit(11)),
+        ('escala.historico_escala', 'semanas da página (por responsável)',
+         db.session.query(EscalaSemanal.ano, EscalaSemanal.semana)
+         .filter(EscalaSemanal.ano <= ano, EscalaSemanal.responsavel == 'morador').distinct()
+         .order_by(EscalaSemanal.ano.desc(), EscalaSemanal.semana.desc()).limit(11)),
+    ]
+
+
+def plano_de_consulta(query):
+    """Executa EXPLAIN QUERY PLAN (SQLite) e retorna as linhas de 'detail'."""
+    conexao = db.session.connection()
+    compilada = query.statement.compile(dialect=conexao.dialect)
+    parametros = tuple(compilada.params[nome] for nome in (compilada.positiontup or []))
+    linhas = conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compilada), parametros).fetchall()
+    return [linha[-1] for linha in linhas]
+
+
+def _tem_limite(query):
+    return query.statement._limit_clause is not None
+
+
+def verificar_planos():
+    """
+    Retorna (resultados, problemas): o plano de cada consulta principal e a
+    lista de (rota, descrição, detalhe do plano) das que leem uma tabela ou
+    um índice inteiro.
+    """
+    resultados = []
+    problemas = []
+    for rota, descricao, query in consultas_principais():
+        plano = plano_de_consulta(query)
+        resultados.append((rota, descricao, plano))
+        for detalhe in plano:
+            scan = _SCAN.match(detalhe)
+            if not scan:
+                continue
+            if scan.group(2) and (_tem_limite(query) or (rota, descricao) in VARREDURAS_PERMITIDAS):
+                continue
+            problemas.append((rota, descricao, detalhe))
+    return resultados, problemas
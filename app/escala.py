@@ -2,38 +2,91 @@ from flask import Blueprint, render_template, redirect, url_for, request, flash,
 from flask_login import login_required, current_user
 from datetime import date, timedelta, datetime
 from .models import db, User, Tarefa, EscalaSemanal
+from sqlalchemy import text, select
+from . import rotacao
+from .banco import insert_com_conflito
+from .exportacao import FORMATOS, linhas_da_consulta, resposta_exportacao
+from .paginacao import ler_cursor, montar_cursor, antes_de, depois_de
 import itertools
 
 escala_bp = Blueprint('escala', __name__)
 
+# Quantas semanas cada página do histórico mostra
+SEMANAS_POR_PAGINA_HISTORICO = 10
+
+
+def semana_atual():
+    """(ano, semana) ISO da escala vigente. A semana da escala vira na quarta-feira."""
+    data_ajustada = date.today() - timedelta(days=2)
+    return data_ajustada.isocalendar()[0], data_ajustada.isocalendar()[1]
+
+
+def carregar_base_rotacao():
+    """Base da rotação a partir do quadro atual de moradores e tarefas recorrentes."""
+    moradores = User.query.filter(
+        (User.ordem_original != None) | (User.ordem_invertido != None)
+    ).all()
+    original = sorted((u for u in moradores if u.ordem_original is not None),
+                      key=lambda u: (u.ordem_original, u.id))
+    invertido = sorted((u for u in moradores if u.ordem_invertido is not None),
+                       key=lambda u: (u.ordem_invertido, u.id))
+    tarefas_recorrentes = Tarefa.query.filter_by(recorrente=True).order_by(Tarefa.id).all()
+    return rotacao.BaseRotacao(
+        original=tuple(u.username for u in original),
+        invertido=tuple(u.username for u in invertido),
+        tarefas=tuple(t.descricao for t in tarefas_recorrentes)
+    )
+
+def _insert_ignorando_existentes():
+    """INSERT em escala_semanal que ignora posições recorrentes já geradas (ON CONFLICT DO NOTHING)."""
+    motor = db.session.get_bind()
+    insercao = insert_com_conflito(motor, EscalaSemanal.__table__)
+    if insercao is None:
+        raise RuntimeError(f'Geração da escala não suportada para o banco "{motor.dialect.name}".')
+    return insercao.on_conflict_do_nothing(
+        index_elements=['ano', 'semana', 'ordem'],
+        index_where=text("tipo = 'recorrente'")
+    )
+
+def gerar_escala(ano, semana, semanas=1):
+    """
+    Gera as tarefas recorrentes de 'semanas' semanas a partir de (ano, semana)
+    num único insert em lote. Posições que já existem são mantidas, então pode
+    ser chamada várias vezes (ou por vários workers ao mesmo tempo) sem
+    duplicar nada. Não faz commit. Retorna quantas linhas foram enviadas.
+    """
+    base = carregar_base_rotacao()
+
+    linhas = []
+    for ano_semana, num_semana, tarefas_semana in rotacao.escala_do_periodo(base, ano, semana, semanas):
+        for ordem, (tarefa_desc, responsavel_nome) in enumerate(tarefas_semana):
+            linhas.append({'semana': num_semana, 'ano': ano_semana, 'tarefa': tarefa_desc,
+                           'responsavel': responsavel_nome, 'status': 'pendente',
+                           'tipo': 'recorrente', 'ordem': ordem})
+
+    if linhas:
+        db.session.execute(_insert_ignorando_existentes(), linhas)
+    return len(linhas)
+
+def tarefas_da_semana(ano, semana):
+    """Tarefas da semana (página da escala e API /api/v1)."""
+    tabela_db = EscalaSemanal.query.filter_by(semana=semana, ano=ano).order_by(EscalaSemanal.id).all()
 
-# Listas de responsáveis para o cálculo da escala
-responsaveis_invertido = [
-    "falamansa", "parabrisa", "duposto", "jubileu", 
-    "vigarista", "peçarrara", "karcaça", "macale", "serrote", "6bomba"
-]
-responsaveis_original = [
-    "parabrisa", "falamansa", "jubileu", "duposto", 
-    "peçarrara", "vigarista", "macale", "karcaça" ,"6bomba", "serrote"
-]
-tarefas = [
-    "Cozinha Cima", "Cozinha baixo + escadas", "Banheiro baixo + salinha",
-    "Sala + Entrada", "Banheiro cima", "Organizar área da stella e limpar varanda",
-    "Área de baixo + Corredor máquina", "Limpeza da dispensa", "Folga", "Folga"
-]
-
-def get_total_weeks(ano, semana):
-    return (ano - 2024) * 52 + semana
+    # As semanas são pré-geradas por 'flask escala generate'. Se esta ainda não
+    # foi, gera só ela aqui; o insert ignora conflitos, então dois acessos
+    # simultâneos não duplicam as tarefas.
+    if not tabela_db:
+        if gerar_escala(ano, semana):
+            db.session.commit()
+            tabela_db = EscalaSemanal.query.filter_by(semana=semana, ano=ano).order_by(EscalaSemanal.id).all()
+    return tabela_db
 
 @escala_bp.route('/escala')
 @escala_bp.route('/escala/<int:ano>/<int:semana>')
 @login_required
 def ver_escala(ano=None, semana=None):
     if ano is None or semana is None:
-        hoje = date.today()
-        data_ajustada = hoje - timedelta(days=2)
-        semana = data_ajustada.isocalendar()[1]
-        ano = data_ajustada.isocalendar()[0]
+        ano, semana = semana_atual()
 
     data_referencia = datetime.fromisocalendar(ano, semana, 1)
     data_anterior = data_referencia - timedelta(days=7)
@@ -41,29 +94,7 @@ def ver_escala(ano=None, semana=None):
     semana_anterior = {'ano': data_anterior.isocalendar()[0], 'semana': data_anterior.isocalendar()[1]}
     semana_proxima = {'ano': data_proxima.isocalendar()[0], 'semana': data_proxima.isocalendar()[1]}
 
-    tabela_db = EscalaSemanal.query.filter_by(semana=semana, ano=ano).order_by(EscalaSemanal.id).all()
-
-    if not tabela_db:
-        tarefas_recorrentes_db = Tarefa.query.filter_by(recorrente=True).order_by(Tarefa.id).all()
-        tarefas_desc = [t.descricao for t in tarefas_recorrentes_db]
-
-        total_weeks = get_total_weeks(ano, semana)
-        cycle_number = (total_weeks - 1) // 5
-
-        base_a_usar = responsaveis_original if cycle_number % 2 == 0 else responsaveis_invertido
-        
-        rotacao = (semana * -2) % len(base_a_usar)
-        responsaveis_final = base_a_usar[rotacao:] + base_a_usar[:rotacao]
-        
-        responsaveis_ajustados = (responsaveis_final * (len(tarefas_desc) // len(responsaveis_final) + 1))[:len(tarefas_desc)]
-
-        for tarefa_desc, responsavel_nome in zip(tarefas_desc, responsaveis_ajustados):
-            nova_tarefa_db = EscalaSemanal(semana=semana, ano=ano, tarefa=tarefa_desc, responsavel=responsavel_nome, tipo='recorrente')
-            db.session.add(nova_tarefa_db)
-        
-        db.session.commit()
-        tabela_db = EscalaSemanal.query.filter_by(semana=semana, ano=ano).order_by(EscalaSemanal.id).all()
-
+    tabela_db = tarefas_da_semana(ano, semana)
     return render_template('escala.html', tabela=tabela_db, semana=semana, ano=ano,
                            semana_anterior=semana_anterior, semana_proxima=semana_proxima)
 
@@ -138,12 +169,71 @@ def fazer(id_tarefa):
         flash('Você não tem permissão para marcar esta tarefa como feita.', 'danger')
     return redirect(url_for('escala.ver_escala', ano=tarefa.ano, semana=tarefa.semana))
 
+_CHAVE_SEMANA = (EscalaSemanal.ano, EscalaSemanal.semana)
+
+def _filtros_historico(responsavel, status):
+    filtros = []
+    if responsavel:
+        filtros.append(EscalaSemanal.responsavel == responsavel)
+    if status in ('feita', 'pendente'):
+        filtros.append(EscalaSemanal.status == status)
+    return filtros
+
 @escala_bp.route('/escala/historico')
 @login_required
 def historico_escala():
-    todas_as_tarefas = EscalaSemanal.query.order_by(EscalaSemanal.ano.desc(), EscalaSemanal.semana.desc()).all()
+    """
+    Histórico paginado por cursor (ano, semana): cada página lê só as semanas
+    dela pelo índice, então o custo não cresce com os anos de escala.
+    """
+    responsavel = request.args.get('responsavel', '').strip()
+    status = request.args.get('status', '').strip()
+    cursor = ler_cursor(request.args.get('antes'), 2)
+    filtros = _filtros_historico(responsavel, status)
+
+    if cursor:
+        limite = antes_de(_CHAVE_SEMANA, cursor)
+    else:
+        # Semanas futuras já pré-geradas não fazem parte do histórico
+        limite = antes_de(_CHAVE_SEMANA, semana_atual(), inclusive=True)
+
+    chaves = db.session.query(EscalaSemanal.ano, EscalaSemanal.semana) \
+        .filter(limite, *filtros).distinct() \
+        .order_by(EscalaSemanal.ano.desc(), EscalaSemanal.semana.desc()) \
+        .limit(SEMANAS_POR_PAGINA_HISTORICO + 1).all()
+    tem_mais = len(chaves) > SEMANAS_POR_PAGINA_HISTORICO
+    chaves = chaves[:SEMANAS_POR_PAGINA_HISTORICO]
+
     dados_agrupados = []
-    for chave, grupo in itertools.groupby(todas_as_tarefas, key=lambda x: (x.ano, x.semana)):
-        dados_agrupados.append({'chave': chave, 'tarefas': list(grupo)})
-    return render_template('historico.html', dados_agrupados=dados_agrupados)
+    if chaves:
+        primeira, ultima = chaves[0], chaves[-1]
+        tarefas_pagina = EscalaSemanal.query.filter(
+            antes_de(_CHAVE_SEMANA, primeira, inclusive=True),
+            depois_de(_CHAVE_SEMANA, ultima, inclusive=True),
+            *filtros
+        ).order_by(EscalaSemanal.ano.desc(), EscalaSemanal.semana.desc(), EscalaSemanal.id).all()
+        for chave, grupo in itertools.groupby(tarefas_pagina, key=lambda x: (x.ano, x.semana)):
+            dados_agrupados.append({'chave': chave, 'tarefas': list(grupo)})
+
+    proximo_cursor = montar_cursor(chaves[-1]) if tem_mais else None
+    usuarios = User.query.order_by(User.username).all()
+    return render_template('historico.html', dados_agrupados=dados_agrupados,
+                           proximo_cursor=proximo_cursor, cursor=request.args.get('antes'),
+                           responsavel=responsavel, status=status, usuarios=usuarios)
 
+
+@escala_bp.route('/escala/historico/exportar.<formato>')
+@login_required
+def exportar_historico_escala(formato):
+    """Histórico inteiro (com os filtros da página), lido em blocos enquanto é enviado."""
+    if formato not in FORMATOS:
+        abort(404)
+    filtros = _filtros_historico(request.args.get('responsavel', '').strip(),
+                                 request.args.get('status', '').strip())
+    consulta = select(EscalaSemanal.ano, EscalaSemanal.semana, EscalaSemanal.tarefa,
+                      EscalaSemanal.responsavel, EscalaSemanal.status, EscalaSemanal.tipo) \
+        .where(antes_de(_CHAVE_SEMANA, semana_atual(), inclusive=True), *filtros) \
+        .order_by(EscalaSemanal.ano.desc(), EscalaSemanal.semana.desc(), EscalaSemanal.id)
+    return resposta_exportacao('historico_escala', formato,
+                               ['Ano', 'Semana', 'Tarefa', 'Responsável', 'Status', 'Tipo'],
+                               linhas_da_consulta(consulta))
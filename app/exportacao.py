@@ -0,0 +1,185 @@
+# app/exportacao.py
+# Exportação em CSV e XLSX com memória constante.
+#
+# As linhas vêm de um cursor do lado do servidor (stream_results/yield_per) e
+# passam por geradores até a resposta HTTP: nem a consulta inteira nem o
+# arquivo inteiro ficam na memória. O XLSX é um zip escrito em fluxo
+# (sem seek), com a planilha gerada linha a linha.
+
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from flask import Response, stream_with_context
+
+from .models import db
+
+# Linhas buscadas do banco por vez (e escritas antes de devolver um pedaço)
+LINHAS_POR_BLOCO = 1000
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Texto que o Excel/LibreOffice interpretaria como fórmula (descrições vêm dos usuários)
+_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+# Caracteres que não podem aparecer num XML 1.0 (nem escapados)
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def linhas_da_consulta(consulta):
+    """Gera as linhas (tuplas) de um select, em blocos, sem carregar o resultado inteiro."""
+    resultado = db.session.execute(
+        consulta.execution_options(stream_results=True, yield_per=LINHAS_POR_BLOCO))
+    for linha in resultado:
+        yield tuple(linha)
+
+
+# --- CSV ---
+def _celula_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float):
+        # Vírgula decimal: o Excel em português abre sem converter
+        return f'{valor:.2f}'.replace('.', ',')
+    if isinstance(valor, datetime):
+        return valor.strftime('%d/%m/%Y %H:%M')
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, str) and valor.startswith(_INICIO_FORMULA):
+        # O apóstrofo faz a planilha mostrar o texto em vez de calcular
+        return "'" + valor
+    return valor
+
+
+def gerar_csv(cabecalho, linhas):
+    """Gera o CSV (separador ';', com BOM) em pedaços de texto."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')  # BOM: o Excel reconhece o UTF-8
+    escritor.writerow(cabecalho)
+    for i, linha in enumerate(linhas, 1):
+        escritor.writerow([_celula_csv(v) for v in linha])
+        if i % LINHAS_POR_BLOCO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# --- XLSX ---
+class _SaidaZip:
+    """Arquivo só de escrita (sem seek) cujo conteúdo é recolhido aos pedaços."""
+
+    def __init__(self):
+        self.pedacos = []
+
+    def write(self, dados):
+        self.pedacos.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def recolher(self):
+        dados = b''.join(self.pedacos)
+        self.pedacos = []
+        return dados
+
+
+_XLSX_FIXOS = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>',
+    'xl/_rels/workbook.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>',
+}
+
+
+def _workbook_xml(nome_planilha):
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{_texto_xml(nome_planilha[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>')
+
+
+def _texto_xml(valor):
+    return escape(_INVALIDOS_XML.sub('', valor))
+
+
+def _celula_xlsx(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, bool):
+        valor = 'Sim' if valor else 'Não'
+    elif isinstance(valor, (int, float)):
+        return f'<c t="n"><v>{valor}</v></c>'
+    elif isinstance(valor, datetime):
+        valor = valor.strftime('%d/%m/%Y %H:%M')
+    elif isinstance(valor, date):
+        valor = valor.strftime('%d/%m/%Y')
+    return f'<c t="inlineStr"><is><t>{_texto_xml(str(valor))}</t></is></c>'
+
+
+def _linha_xlsx(valores):
+    return '<row>' + ''.join(_celula_xlsx(v) for v in valores) + '</row>'
+
+
+def gerar_xlsx(cabecalho, linhas, nome_planilha='Dados'):
+    """Gera o XLSX (uma planilha, strings inline) em pedaços de bytes."""
+    saida = _SaidaZip()
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as pacote:
+        for nome, conteudo in _XLSX_FIXOS.items():
+            pacote.writestr(nome, conteudo)
+        pacote.writestr('xl/workbook.xml', _workbook_xml(nome_planilha))
+        with pacote.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                           b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                           b'<sheetData>')
+            planilha.write(_linha_xlsx(cabecalho).encode())
+            for i, linha in enumerate(linhas, 1):
+                planilha.write(_linha_xlsx(linha).encode())
+                if i % LINHAS_POR_BLOCO == 0:
+                    yield saida.recolher()
+            planilha.write(b'</sheetData></worksheet>')
+    yield saida.recolher()
+
+
+def resposta_exportacao(nome_arquivo, formato, cabecalho, linhas):
+    """
+    Response em streaming com o arquivo. 'linhas' é um iterável consumido só
+    enquanto a resposta é enviada (o contexto da requisição, e com ele a sessão
+    do banco, fica aberto até o fim).
+    """
+    if formato == 'xlsx':
+        corpo = gerar_xlsx(cabecalho, linhas, nome_planilha=nome_arquivo)
+    else:
+        corpo = gerar_csv(cabecalho, linhas)
+    resposta = Response(stream_with_context(corpo), content_type=FORMATOS[formato])
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.{formato}"'
+    resposta.cache_control.private = True
+    resposta.cache_control.no_store = True
+    return resposta
@@ -7,6 +7,7 @@ from sqlalchemy import func
 # Precisamos do db e dos modelos que a função 'get_dados_caixinha' usa.
 # Adicionado 'db' para ser importado pelos outros módulos
 from ..models import db, DespesaFixa, CaixinhaMovimentacao 
+from . import caixinha
 
 # --- 1. CONSTANTES GLOBAIS ---
 CHAVE_CAIXINHA = 'Caixinha'
@@ -19,13 +20,17 @@ financas_bp = Blueprint('financas',
                         template_folder='../templates/financas') 
 
 # --- 3. FUNÇÕES HELPER GLOBAIS ---
-def get_dados_caixinha():
-    """Busca o saldo atual, projeção e movimentações do caixinha."""
+def get_dados_caixinha(retirada_prevista=0.0):
+    """
+    Busca o saldo atual, projeção e movimentações do caixinha. A projeção
+    desconta 'retirada_prevista', que só o painel do tesoureiro calcula
+    (previsão do histórico, ver analise.py).
+    """
     saldo_inicial_de_teste = 0
     # --- FIM DO VALOR DE TESTE ---
     
-    # Busca o saldo real que está salvo no banco de dados
-    saldo_do_banco = db.session.query(func.sum(CaixinhaMovimentacao.valor)).scalar() or 0.0
+    # Busca o saldo corrente mantido em 'caixinha_saldo' (uma linha, sem SUM)
+    saldo_do_banco = caixinha.saldo_atual()
     
     # O saldo atual agora é o valor de teste + o que estiver no banco
     saldo_atual = saldo_inicial_de_teste + saldo_do_banco
@@ -38,15 +43,23 @@ def get_dados_caixinha():
     movimentacoes = CaixinhaMovimentacao.query.order_by(CaixinhaMovimentacao.data.desc()).limit(10).all()
     return {
         "saldo_atual": saldo_atual,
-        "projecao_proximo_mes": saldo_atual + valor_arrecadacao_mes,
+        "projecao_proximo_mes": saldo_atual + valor_arrecadacao_mes - retirada_prevista,
         "valor_contribuicao_mensal": valor_arrecadacao_mes,
+        "retirada_prevista": retirada_prevista,
         "movimentacoes": movimentacoes
     }
 
 
 # --- 4. IMPORTAÇÃO DAS ROTAS (ATUALIZADO) ---
 # Importamos os módulos de rotas NO FINAL do arquivo.
+from . import agregados         # Listener que mantém LancamentoAgregado
+from . import cache             # Listeners que invalidam o cache dos painéis
+from . import analise           # Estatísticas e previsão (NumPy)
 from . import routes_dashboard
 from . import routes_lancamentos
 from . import routes_aluguel      # <-- ADICIONADO
-from . import routes_fechamento   # <-- ADICIONADO
\ No newline at end of file
+from . import routes_fechamento   # <-- ADICIONADO
+from . import routes_importacao
+from . import routes_exportacao
+from . import routes_graficos
+from . import routes_processamentos
\ No newline at end of file
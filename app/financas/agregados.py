@@ -0,0 +1,225 @@
+# app/financas/agregados.py
+
+from collections import defaultdict
+
+from sqlalchemy import delete, event, func, inspect, insert, literal_column, select, update
+from sqlalchemy.orm import Session
+
+from . import series
+from ..banco import insert_com_conflito
+from ..models import db, User, Lancamento, LancamentoAgregado
+
+# Tolerância para comparar somas de float (centavos)
+TOLERANCIA_DRIFT = 0.005
+
+# Colunas do índice único uq_lancamento_agregado_chave (alvo do ON CONFLICT)
+_CHAVE_UNICA = [LancamentoAgregado.ano_referencia, LancamentoAgregado.mes_referencia,
+                func.coalesce(LancamentoAgregado.user_id, literal_column('0')), LancamentoAgregado.categoria]
+
+
+# --- 1. MANUTENÇÃO INCREMENTAL (MESMA TRANSAÇÃO DO LANCAMENTO) ---
+def _valor_original(obj, attr):
+    """Valor do atributo antes das mudanças pendentes nesta sessão."""
+    hist = inspect(obj).attrs[attr].history
+    if hist.deleted:
+        return hist.deleted[0]
+    return getattr(obj, attr)
+
+
+def _chave(ano, mes, user_id, categoria):
+    return (ano, mes, user_id, categoria or 'Outros')
+
+
+def _chave_atual(lanc):
+    return _chave(lanc.ano_referencia, lanc.mes_referencia, lanc.user_id, lanc.categoria)
+
+
+def _chave_original(lanc):
+    return _chave(_valor_original(lanc, 'ano_referencia'),
+                  _valor_original(lanc, 'mes_referencia'),
+                  _valor_original(lanc, 'user_id'),
+                  _valor_original(lanc, 'categoria'))
+
+
+def _filtro_chave(ano, mes, user_id, categoria):
+    filtros = [
+        LancamentoAgregado.ano_referencia == ano,
+        LancamentoAgregado.mes_referencia == mes,
+        LancamentoAgregado.categoria == categoria,
+    ]
+    if user_id is None:
+        filtros.append(LancamentoAgregado.user_id.is_(None))
+    else:
+        filtros.append(LancamentoAgregado.user_id == user_id)
+    return filtros
+
+
+def aplicar_deltas(connection, deltas):
+    """
+    Soma os deltas {(ano, mes, user_id, categoria): [valor, quantidade]}
+    na tabela de agregados usando a conexão (e transação) recebida.
+    Usado pelo listener de flush e por caminhos de insert em massa,
+    que não passam pelos eventos do ORM. Atualiza também a série mensal
+    dos gráficos.
+    """
+    for (ano, mes, user_id, categoria), (valor, quantidade) in deltas.items():
+        if not valor and not quantidade:
+            continue
+        insercao = insert_com_conflito(connection, LancamentoAgregado)
+        if insercao is not None:
+            # Um só comando: duas primeiras escritas na mesma chave não disputam o INSERT
+            insercao = insercao.values(ano_referencia=ano, mes_referencia=mes, user_id=user_id,
+                                       categoria=categoria, total=valor, quantidade=quantidade)
+            connection.execute(insercao.on_conflict_do_update(
+                index_elements=_CHAVE_UNICA,
+                set_={'total': LancamentoAgregado.total + insercao.excluded.total,
+                      'quantidade': LancamentoAgregado.quantidade + insercao.excluded.quantidade}
+            ))
+            continue
+        resultado = connection.execute(
+            update(LancamentoAgregado)
+            .where(*_filtro_chave(ano, mes, user_id, categoria))
+            .values(total=LancamentoAgregado.total + valor,
+                    quantidade=LancamentoAgregado.quantidade + quantidade)
+        )
+        if resultado.rowcount == 0:
+            connection.execute(insert(LancamentoAgregado).values(
+                ano_referencia=ano, mes_referencia=mes, user_id=user_id,
+                categoria=categoria, total=valor, quantidade=quantidade
+            ))
+    series.aplicar_deltas_variaveis(connection, deltas)
+
+
+@event.listens_for(Session, 'before_flush')
+def _atualizar_agregados(session, flush_context, instances):
+    deltas = defaultdict(lambda: [0.0, 0])
+
+    for obj in session.new:
+        if isinstance(obj, Lancamento):
+            delta = deltas[_chave_atual(obj)]
+            delta[0] += obj.valor or 0.0
+            delta[1] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Lancamento):
+            delta = deltas[_chave_original(obj)]
+            delta[0] -= _valor_original(obj, 'valor') or 0.0
+            delta[1] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Lancamento) and session.is_modified(obj, include_collections=False):
+            antigo = deltas[_chave_original(obj)]
+            antigo[0] -= _valor_original(obj, 'valor') or 0.0
+            antigo[1] -= 1
+            novo = deltas[_chave_atual(obj)]
+            novo[0] += obj.valor or 0.0
+            novo[1] += 1
+
+    # Ao remover um usuário, o ORM anula o user_id dos lançamentos dele
+    # durante o próprio flush (depois deste evento): os agregados passam
+    # aqui para a casa (user_id=None). Na série os deltas se anulam.
+    usuarios_removidos = [obj.id for obj in session.deleted if isinstance(obj, User) and obj.id is not None]
+    if usuarios_removidos:
+        linhas = session.connection().execute(
+            select(LancamentoAgregado.ano_referencia, LancamentoAgregado.mes_referencia,
+                   LancamentoAgregado.user_id, LancamentoAgregado.categoria,
+                   LancamentoAgregado.total, LancamentoAgregado.quantidade)
+            .where(LancamentoAgregado.user_id.in_(usuarios_removidos))
+        )
+        for ano, mes, user_id, categoria, total, quantidade in linhas:
+            antigo = deltas[_chave(ano, mes, user_id, categoria)]
+            antigo[0] -= total
+            antigo[1] -= quantidade
+            novo = deltas[_chave(ano, mes, None, categoria)]
+            novo[0] += total
+            novo[1] += quantidade
+
+    if deltas:
+        aplicar_deltas(session.connection(), deltas)
+    if usuarios_removidos:
+        # Chaves do usuário removido, já zeradas pelos deltas acima
+        session.connection().execute(
+            delete(LancamentoAgregado).where(LancamentoAgregado.user_id.in_(usuarios_removidos)))
+
+
+# --- 2. CONSULTAS USADAS PELOS PAINÉIS ---
+def _query_mes(*colunas, ano, mes):
+    return db.session.query(*colunas).filter(
+        LancamentoAgregado.ano_referencia == ano,
+        LancamentoAgregado.mes_referencia == mes,
+        LancamentoAgregado.quantidade > 0
+    )
+
+
+def total_do_mes(ano, mes):
+    """Soma de todos os lançamentos do mês (pagos pela casa ou por moradores)."""
+    return _query_mes(func.sum(LancamentoAgregado.total), ano=ano, mes=mes).scalar() or 0.0
+
+
+def totais_por_usuario(ano, mes):
+    """{user_id: total lançado no mês}, apenas para lançamentos com pagador."""
+    linhas = _query_mes(LancamentoAgregado.user_id, func.sum(LancamentoAgregado.total),
+                        ano=ano, mes=mes) \
+        .filter(LancamentoAgregado.user_id != None) \
+        .group_by(LancamentoAgregado.user_id).all()
+    return {user_id: total for user_id, total in linhas}
+
+
+def total_do_usuario(ano, mes, user_id):
+    return _query_mes(func.sum(LancamentoAgregado.total), ano=ano, mes=mes) \
+        .filter(LancamentoAgregado.user_id == user_id).scalar() or 0.0
+
+
+def totais_por_categoria(ano, mes):
+    """Lista de (categoria, total) do mês."""
+    return _query_mes(LancamentoAgregado.categoria, func.sum(LancamentoAgregado.total),
+                      ano=ano, mes=mes) \
+        .group_by(LancamentoAgregado.categoria).all()
+
+
+# --- 3. RECONSTRUÇÃO E VERIFICAÇÃO DE DRIFT ---
+def _agregados_calculados():
+    """Recalcula os agregados direto da tabela de lançamentos."""
+    linhas = db.session.query(
+        Lancamento.ano_referencia, Lancamento.mes_referencia, Lancamento.user_id,
+        func.coalesce(Lancamento.categoria, 'Outros'),
+        func.sum(Lancamento.valor), func.count(Lancamento.id)
+    ).group_by(
+        Lancamento.ano_referencia, Lancamento.mes_referencia, Lancamento.user_id,
+        func.coalesce(Lancamento.categoria, 'Outros')
+    ).all()
+    return {(a, m, u, c): (t or 0.0, q) for a, m, u, c, t, q in linhas}
+
+
+def verificar_drift():
+    """
+    Compara os agregados armazenados com os recalculados.
+    Retorna uma lista de (chave, armazenado, calculado) com as divergências.
+    """
+    calculados = _agregados_calculados()
+    armazenados = {}
+    for ag in LancamentoAgregado.query.filter(LancamentoAgregado.quantidade != 0).all():
+        armazenados[_chave(ag.ano_referencia, ag.mes_referencia, ag.user_id, ag.categoria)] = \
+            (ag.total, ag.quantidade)
+
+    divergencias = []
+    for chave in set(calculados) | set(armazenados):
+        total_arm, qtd_arm = armazenados.get(chave, (0.0, 0))
+        total_calc, qtd_calc = calculados.get(chave, (0.0, 0))
+        if qtd_arm != qtd_calc or abs(total_arm - total_calc) > TOLERANCIA_DRIFT:
+            divergencias.append((chave, (total_arm, qtd_arm), (total_calc, qtd_calc)))
+    return sorted(divergencias, key=lambda d: tuple(str(x) for x in d[0]))
+
+
+def reconstruir_agregados():
+    """Apaga e recria a tabela de agregados (e a série dos gráficos) a partir dos lançamentos. Não faz commit."""
+    calculados = _agregados_calculados()
+    db.session.query(LancamentoAgregado).delete(synchronize_session=False)
+    if calculados:
+        db.session.execute(insert(LancamentoAgregado), [
+            {'ano_referencia': a, 'mes_referencia': m, 'user_id': u, 'categoria': c,
+             'total': total, 'quantidade': quantidade}
+            for (a, m, u, c), (total, quantidade) in calculados.items()
+        ])
+    series.reconstruir_series()
+    return len(calculados)
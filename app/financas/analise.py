@@ -0,0 +1,292 @@
+# app/financas/analise.py
+# Estatísticas e previsão da conta do mês seguinte.
+#
+# O histórico vem das tabelas já somadas por mês (gasto_mensal_categoria,
+# lancamento_agregado, fechamentos e as retiradas do caixinha agrupadas por
+# mês), nunca dos lançamentos linha a linha: recalcular custa o número de
+# meses, categorias e moradores, não o de lançamentos. As colunas vão para
+# arrays do NumPy e todas as contas são vetorizadas (bincount, cumsum,
+# convolve). O resultado fica guardado por app junto com a versão dos dados
+# dos painéis (ver cache.py): só é recalculado depois de alguma escrita (ou
+# na virada do mês). Só o painel do tesoureiro (e a API dele) usa a previsão.
+#
+# Previsão dos gastos variáveis do mês seguinte:
+#   - série mensal dos meses completos (o mês atual ainda está em aberto);
+#   - sazonalidade multiplicativa por mês do ano (razão para a média móvel
+#     centrada de 12 meses), só com pelo menos MESES_MINIMOS_SAZONALIDADE;
+#   - nível = média dos últimos 3 meses sem a sazonalidade, multiplicada pelo
+#     índice do mês previsto;
+#   - nunca abaixo do que já está lançado para o mês (parcelas futuras).
+# Somando as despesas fixas ativas (aluguel, demais fixas, caixinha), sai a
+# conta prevista e a cota de cada morador, com a mesma divisão do fechar_mes.
+
+from datetime import datetime
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from sqlalchemy import extract, func, select
+
+from . import CHAVE_ALUGUEL, CHAVE_CAIXINHA
+from .cache import versao_atual
+from .series import TIPO_VARIAVEL
+from ..models import (db, User, DespesaFixa, FechamentoMensal, CaixinhaMovimentacao,
+                      GastoMensalCategoria, LancamentoAgregado)
+
+# Meses completos usados nas estatísticas por categoria e por morador
+JANELA_ESTATISTICAS = 12
+# Meses usados no nível da previsão e na média de retiradas do caixinha
+JANELA_NIVEL = 3
+JANELA_RETIRADAS = 6
+MESES_MINIMOS_SAZONALIDADE = 24
+
+# Chave em app.extensions: (chave da versão, resultado)
+_EXTENSAO = 'financas_analise'
+
+
+# --- 1. LEITURA EM COLUNAS ---
+def _indice_mes(ano, mes):
+    return ano * 12 + mes - 1
+
+
+def _ano_mes(indice):
+    return int(indice) // 12, int(indice) % 12 + 1
+
+
+def _colunas(consulta, tipos):
+    """Executa a consulta e devolve um array por coluna, com os dtypes dados."""
+    linhas = db.session.execute(consulta).all()
+    if not linhas:
+        return [np.array([], dtype=tipo) for tipo in tipos]
+    return [np.array(coluna, dtype=tipo) for coluna, tipo in zip(zip(*linhas), tipos)]
+
+
+def carregar_historico(hoje):
+    """Histórico mensal em arrays: um dict de colunas por série (uma linha por mês e grupo)."""
+    mes_categoria = GastoMensalCategoria.ano * 12 + GastoMensalCategoria.mes - 1
+    cat_mes, cat_categoria, cat_total, cat_quantidade = _colunas(
+        select(mes_categoria, GastoMensalCategoria.categoria, GastoMensalCategoria.total,
+               GastoMensalCategoria.quantidade)
+        .where(GastoMensalCategoria.tipo == TIPO_VARIAVEL),
+        (np.int64, object, np.float64, np.int64))
+
+    # Sem a "Casa" (user_id nulo) e somando as categorias de cada morador
+    mor_mes, mor_user, mor_total, mor_quantidade = _colunas(
+        select(LancamentoAgregado.ano_referencia * 12 + LancamentoAgregado.mes_referencia - 1,
+               LancamentoAgregado.user_id, func.sum(LancamentoAgregado.total),
+               func.sum(LancamentoAgregado.quantidade))
+        .where(LancamentoAgregado.user_id.isnot(None))
+        .group_by(LancamentoAgregado.ano_referencia, LancamentoAgregado.mes_referencia,
+                  LancamentoAgregado.user_id),
+        (np.int64, np.int64, np.float64, np.int64))
+
+    fech_mes, fech_total = _colunas(
+        select(FechamentoMensal.ano * 12 + FechamentoMensal.mes - 1,
+               FechamentoMensal.total_fixo + FechamentoMensal.total_variavel
+               + FechamentoMensal.total_aluguel_mes + FechamentoMensal.valor_caixinha_arrecadado)
+        .where(FechamentoMensal.status == 'fechado'),
+        (np.int64, np.float64))
+
+    # Retiradas do caixinha por mês, só da janela usada na previsão (índice por data)
+    ano_caixa = extract('year', CaixinhaMovimentacao.data)
+    mes_caixa = extract('month', CaixinhaMovimentacao.data)
+    inicio_retiradas = datetime(hoje.year, hoje.month, 1) - relativedelta(months=JANELA_RETIRADAS)
+    caixa_mes, caixa_valor = _colunas(
+        select(ano_caixa * 12 + mes_caixa - 1, func.sum(CaixinhaMovimentacao.valor))
+        .where(CaixinhaMovimentacao.data >= inicio_retiradas, CaixinhaMovimentacao.valor < 0)
+        .group_by(ano_caixa, mes_caixa),
+        (np.int64, np.float64))
+
+    return {
+        'categorias': {'mes': cat_mes, 'categoria': cat_categoria, 'total': cat_total, 'quantidade': cat_quantidade},
+        'moradores': {'mes': mor_mes, 'user_id': mor_user, 'total': mor_total, 'quantidade': mor_quantidade},
+        'fechamentos': {'mes': fech_mes, 'total': fech_total},
+        'retiradas': {'mes': caixa_mes, 'valor': caixa_valor},
+    }
+
+
+# --- 2. CONTAS VETORIZADAS ---
+def serie_mensal(meses, valores, inicio, fim):
+    """Soma de 'valores' por mês, de 'inicio' até 'fim' (exclusivo): array de fim - inicio posições."""
+    tamanho = max(fim - inicio, 0)
+    dentro = (meses >= inicio) & (meses < fim)
+    # astype: sem nenhuma linha, o bincount devolve inteiros
+    return np.bincount(meses[dentro] - inicio, weights=valores[dentro], minlength=tamanho)[:tamanho] \
+        .astype(np.float64)
+
+
+def matriz_mensal(grupos, n_grupos, meses, valores, inicio, fim):
+    """Como serie_mensal, com uma linha por grupo (códigos 0..n_grupos-1): array (n_grupos, fim - inicio)."""
+    tamanho = max(fim - inicio, 0)
+    dentro = (meses >= inicio) & (meses < fim)
+    posicoes = grupos[dentro] * tamanho + (meses[dentro] - inicio)
+    return np.bincount(posicoes, weights=valores[dentro], minlength=n_grupos * tamanho) \
+        .astype(np.float64).reshape(n_grupos, tamanho)
+
+
+def medias_moveis(matriz, janela):
+    """Média móvel simples ao longo do último eixo (só as posições com a janela completa)."""
+    matriz = np.atleast_2d(matriz)
+    if matriz.shape[-1] < janela:
+        return np.empty(matriz.shape[:-1] + (0,))
+    acumulado = np.cumsum(np.pad(matriz, [(0, 0)] * (matriz.ndim - 1) + [(1, 0)]), axis=-1)
+    return (acumulado[..., janela:] - acumulado[..., :-janela]) / janela
+
+
+def indices_sazonais(serie, primeiro_mes):
+    """Índice multiplicativo de cada mês do ano (12 posições, média 1); tudo 1 sem histórico suficiente."""
+    if len(serie) < MESES_MINIMOS_SAZONALIDADE:
+        return np.ones(12)
+    # Média móvel centrada 2x12: pesos 1/24, 1/12 x 11, 1/24
+    pesos = np.r_[0.5, np.ones(11), 0.5] / 12
+    centrada = np.convolve(serie, pesos, mode='valid')
+    razoes = np.divide(serie[6:len(serie) - 6], centrada, out=np.ones_like(centrada), where=centrada > 0)
+    mes_do_ano = (primeiro_mes + 6 + np.arange(len(razoes))) % 12
+    quantidade = np.bincount(mes_do_ano, minlength=12)
+    indices = np.divide(np.bincount(mes_do_ano, weights=razoes, minlength=12), quantidade,
+                        out=np.ones(12), where=quantidade > 0)
+    return indices / indices.mean()
+
+
+def prever_serie(serie, primeiro_mes, alvo):
+    """(previsão, desvio) do valor da série no mês 'alvo', pelo nível recente e a sazonalidade."""
+    if not len(serie):
+        return 0.0, 0.0
+    indices = indices_sazonais(serie, primeiro_mes)
+    sazonal = indices[(primeiro_mes + np.arange(len(serie))) % 12]
+    dessazonalizada = serie / sazonal
+    nivel = dessazonalizada[-JANELA_NIVEL:].mean()
+    desvio = dessazonalizada[-JANELA_ESTATISTICAS:].std()
+    fator = indices[alvo % 12]
+    return float(nivel * fator), float(desvio * fator)
+
+
+# --- 3. ESTATÍSTICAS ---
+def _estatisticas_por_grupo(matriz, quantidades, nomes):
+    """Linhas de estatísticas (total, média, desvio, tendência...) de cada grupo, do maior total para o menor."""
+    totais = matriz.sum(axis=1)
+    com_gasto = totais != 0
+    tamanho = matriz.shape[1]
+    media = totais / tamanho if tamanho else np.zeros_like(totais)
+    desvio = matriz.std(axis=1) if tamanho else np.zeros_like(totais)
+    recente = medias_moveis(matriz, JANELA_NIVEL)[:, -1] if tamanho >= JANELA_NIVEL else media
+    tendencia = np.divide(recente - media, media, out=np.zeros_like(media), where=media != 0)
+    ticket = np.divide(totais, quantidades, out=np.zeros_like(totais), where=quantidades > 0)
+    participacao = totais / totais.sum() if totais.sum() else np.zeros_like(totais)
+
+    ordem = np.argsort(-totais)
+    return [{'nome': nomes[i], 'total': round(float(totais[i]), 2), 'media_mensal': round(float(media[i]), 2),
+             'desvio_mensal': round(float(desvio[i]), 2), 'quantidade': int(quantidades[i]),
+             'ticket_medio': round(float(ticket[i]), 2), 'participacao': round(float(participacao[i]), 4),
+             'tendencia': round(float(tendencia[i]), 4)}
+            for i in ordem if com_gasto[i]]
+
+
+def _ponto_da_serie(indice, total, media_3, media_12):
+    ano, mes = _ano_mes(indice)
+    return {'mes': f'{mes:02d}/{ano}', 'total': round(float(total), 2),
+            'media_3': None if np.isnan(media_3) else round(float(media_3), 2),
+            'media_12': None if np.isnan(media_12) else round(float(media_12), 2)}
+
+
+def calcular(historico, hoje, despesas_fixas, moradores):
+    """
+    Estatísticas e previsão a partir do histórico em arrays. 'despesas_fixas'
+    são as ativas; 'moradores' é {user_id: username} de quem divide a conta.
+    """
+    cat = historico['categorias']
+    atual = _indice_mes(hoje.year, hoje.month)
+    alvo = atual + 1
+    inicio = int(cat['mes'].min()) if len(cat['mes']) else atual
+    inicio = min(inicio, atual)
+
+    # Série dos meses completos e previsão dos variáveis
+    serie = serie_mensal(cat['mes'], cat['total'], inicio, atual)
+    prevista, desvio = prever_serie(serie, inicio % 12, alvo)
+    ja_lancado = float(cat['total'][cat['mes'] == alvo].sum())
+    variavel = max(prevista, ja_lancado)
+
+    # Por categoria e por morador: últimos JANELA_ESTATISTICAS meses completos
+    inicio_janela = max(inicio, atual - JANELA_ESTATISTICAS)
+    na_janela = (cat['mes'] >= inicio_janela) & (cat['mes'] < atual)
+    categorias, codigos = np.unique(cat['categoria'], return_inverse=True) if len(cat['categoria']) \
+        else (np.array([], dtype=object), np.array([], dtype=np.int64))
+    por_categoria = _estatisticas_por_grupo(
+        matriz_mensal(codigos, len(categorias), cat['mes'], cat['total'], inicio_janela, atual),
+        np.bincount(codigos[na_janela], weights=cat['quantidade'][na_janela], minlength=len(categorias)),
+        list(categorias))
+
+    mor = historico['moradores']
+    ids = np.array(sorted(moradores), dtype=np.int64)
+    posicao = np.searchsorted(ids, mor['user_id'])
+    do_morador = np.isin(mor['user_id'], ids)
+    codigos_morador = np.where(do_morador, posicao, 0)
+    na_janela_morador = do_morador & (mor['mes'] >= inicio_janela) & (mor['mes'] < atual)
+    por_morador = _estatisticas_por_grupo(
+        matriz_mensal(codigos_morador[do_morador], len(ids), mor['mes'][do_morador],
+                      mor['total'][do_morador], inicio_janela, atual),
+        np.bincount(codigos_morador[na_janela_morador], weights=mor['quantidade'][na_janela_morador],
+                    minlength=len(ids)),
+        [moradores[int(i)] for i in ids])
+
+    # Médias móveis da série total, alinhadas ao último mês de cada janela (NaN sem janela completa)
+    media_3 = np.full(len(serie), np.nan)
+    media_3[2:] = medias_moveis(serie, 3)[0]
+    media_12 = np.full(len(serie), np.nan)
+    media_12[11:] = medias_moveis(serie, 12)[0]
+
+    # Conta prevista, com a mesma divisão do fechar_mes
+    aluguel = sum(d.valor for d in despesas_fixas if d.descricao == CHAVE_ALUGUEL and d.morador_id is not None)
+    caixinha = sum(d.valor for d in despesas_fixas if d.descricao == CHAVE_CAIXINHA and d.morador_id is None)
+    fixo_outros = sum(d.valor for d in despesas_fixas if d.morador_id is None
+                      and d.descricao not in (CHAVE_ALUGUEL, CHAVE_CAIXINHA))
+    total = fixo_outros + aluguel + caixinha + variavel
+    n_moradores = len(moradores)
+    cota = (fixo_outros + caixinha + variavel) / n_moradores if n_moradores else 0.0
+
+    # Conta dos meses fechados (para comparar a previsão com a média recente)
+    fech = historico['fechamentos']
+    recentes = fech['total'][fech['mes'] >= atual - JANELA_ESTATISTICAS]
+    conta_media = float(recentes.mean()) if len(recentes) else None
+
+    # Retiradas do caixinha: média mensal dos últimos JANELA_RETIRADAS meses completos
+    caixa = historico['retiradas']
+    retiradas = serie_mensal(caixa['mes'], caixa['valor'], atual - JANELA_RETIRADAS, atual)
+    retirada_prevista = float(-retiradas.mean()) if len(retiradas) else 0.0
+
+    ano_alvo, mes_alvo = _ano_mes(alvo)
+    return {
+        'ano': ano_alvo,
+        'mes': mes_alvo,
+        'meses_de_historico': int(len(serie)),
+        'variavel_prevista': round(variavel, 2),
+        'variavel_desvio': round(desvio, 2),
+        'variavel_ja_lancado': round(ja_lancado, 2),
+        'total_fixo': round(fixo_outros, 2),
+        'total_aluguel': round(aluguel, 2),
+        'total_caixinha': round(caixinha, 2),
+        'total_previsto': round(total, 2),
+        'cota_por_morador': round(cota, 2),
+        'conta_media_fechada': round(conta_media, 2) if conta_media is not None else None,
+        'retirada_caixinha_prevista': round(retirada_prevista, 2),
+        'serie': [_ponto_da_serie(inicio + i, serie[i], media_3[i], media_12[i])
+                  for i in range(max(len(serie) - JANELA_ESTATISTICAS, 0), len(serie))],
+        'por_categoria': por_categoria,
+        'por_morador': por_morador,
+    }
+
+
+# --- 4. USO NAS ROTAS ---
+def previsao():
+    """Estatísticas e previsão do mês seguinte, recalculadas só quando os dados (ou o mês) mudam."""
+    hoje = datetime.utcnow()
+    chave = (versao_atual(), hoje.year, hoje.month)
+    guardado = current_app.extensions.get(_EXTENSAO)
+    if guardado is not None and guardado[0] == chave:
+        return guardado[1]
+
+    moradores = dict(db.session.query(User.id, User.username).filter(User.cargo != 'admin').all())
+    despesas_fixas = DespesaFixa.query.filter_by(ativa=True).all()
+    resultado = calcular(carregar_historico(hoje), hoje, despesas_fixas, moradores)
+    current_app.extensions[_EXTENSAO] = (chave, resultado)
+    return resultado
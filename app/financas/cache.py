@@ -0,0 +1,197 @@
+# app/financas/cache.py
+# Cache local (por processo) do HTML dos painéis financeiros.
+#
+# Cada entrada guarda a versão de 'cache_versao' com que foi gerada. Toda
+# transação que escreve num modelo observado incrementa essa versão no banco,
+# então qualquer worker percebe na próxima leitura que o seu cache ficou
+# velho, sem precisar de Redis.
+#
+# O incremento roda no after_commit, numa transação curta só dele, e não na
+# transação da escrita: senão a linha única da versão ficaria travada até o
+# commit e todas as escritas concorrentes (importações, processamentos em
+# segundo plano) esperariam umas pelas outras no Postgres. O custo: entre o
+# commit e o incremento, e se o incremento falhar, os outros workers ainda
+# servem a página antiga até o PAINEL_CACHE_TTL. O worker que escreveu limpa
+# o seu cache na hora.
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, has_app_context, session as sessao_http
+from flask_login import current_user
+from sqlalchemy import event, insert, update
+from sqlalchemy.orm import Session
+
+from ..banco import insert_com_conflito
+from ..models import (db, CacheVersao, User, Lancamento, DespesaFixa, FechamentoMensal,
+                      SaldoMensal, CaixinhaMovimentacao, CaixinhaSaldo, GastoMensalCategoria)
+
+# Linha de 'cache_versao' com a versão dos painéis (a linha 2, dos usuários,
+# não é mais usada: ver app/cache_usuarios.py)
+ID_VERSAO = 1
+
+# Escritas nestes modelos mudam algum painel
+MODELOS_OBSERVADOS = (User, Lancamento, DespesaFixa, FechamentoMensal, SaldoMensal,
+                      CaixinhaMovimentacao, CaixinhaSaldo, GastoMensalCategoria)
+
+# Marca na sessão: esta transação escreveu num modelo observado
+_ALTERADO = 'paineis_alterados'
+
+
+class CachePaineis:
+    """LRU com TTL, seguro entre threads do mesmo processo."""
+
+    def __init__(self):
+        self._itens = OrderedDict()  # chave -> (valor, versao, expira_em)
+        self._trava = threading.Lock()
+        self._versao = None
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave, versao):
+        with self._trava:
+            if versao != self._versao:
+                # Outro worker (ou este) escreveu: tudo o que está aqui é velho
+                self._itens.clear()
+                self._versao = versao
+            item = self._itens.get(chave)
+            if item is None or item[1] != versao or item[2] < time.monotonic():
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item[0]
+
+    def guardar(self, chave, valor, versao, ttl, tamanho):
+        with self._trava:
+            if versao != self._versao:
+                return
+            self._itens[chave] = (valor, versao, time.monotonic() + ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > tamanho:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self._versao = None
+
+    def estatisticas(self):
+        with self._trava:
+            total = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / total, 4) if total else 0.0,
+                'itens': len(self._itens),
+                'versao': self._versao,
+            }
+
+
+_cache = CachePaineis()
+
+
+# --- 1. VERSÃO COMPARTILHADA ENTRE WORKERS ---
+def versao_atual():
+    """Versão dos dados dos painéis no banco, lida uma vez por requisição."""
+    if 'versao_cache' not in g:
+        g.versao_cache = db.session.query(CacheVersao.versao).filter(CacheVersao.id == ID_VERSAO).scalar() or 0
+    return g.versao_cache
+
+
+def esquecer_versao():
+    """Descarta a versão lida nesta requisição (depois de um commit que a mudou)."""
+    if has_app_context():
+        g.pop('versao_cache', None)
+
+
+def _criar_linha_versao(conexao, id_versao):
+    # INSERT que não falha se outra transação criou a linha antes
+    insercao = insert_com_conflito(conexao, CacheVersao)
+    if insercao is None:
+        conexao.execute(insert(CacheVersao).values(id=id_versao, versao=0))
+    else:
+        conexao.execute(insercao.values(id=id_versao, versao=0).on_conflict_do_nothing())
+
+
+def garantir_versao(conexao):
+    """Cria a linha da versão dos painéis, se faltar (init-db; a migração já a cria)."""
+    _criar_linha_versao(conexao, ID_VERSAO)
+
+
+def incrementar_versao(conexao, id_versao):
+    """Soma 1 à versão 'id_versao' na transação de 'conexao'."""
+    incremento = update(CacheVersao).where(CacheVersao.id == id_versao).values(versao=CacheVersao.versao + 1)
+    if conexao.execute(incremento).rowcount == 0:
+        # Banco sem a linha: cria (sem disputar com outra transação) e incrementa
+        _criar_linha_versao(conexao, id_versao)
+        conexao.execute(incremento)
+
+
+def _marcar_alterado(session):
+    session.info[_ALTERADO] = True
+
+
+@event.listens_for(Session, 'before_flush')
+def _observar_flush(session, flush_context, instances):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, MODELOS_OBSERVADOS):
+            _marcar_alterado(session)
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _observar_execute(orm_execute_state):
+    # insert()/update() em massa pela sessão não passam pelo flush
+    estado = orm_execute_state
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    mapper = estado.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, MODELOS_OBSERVADOS):
+        _marcar_alterado(estado.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar(session):
+    if not session.info.pop(_ALTERADO, False):
+        return
+    _cache.limpar()
+    esquecer_versao()
+    try:
+        # Transação própria e curta; o motor de escrita, fora do roteamento da sessão
+        with db.engine.begin() as conexao:
+            incrementar_versao(conexao, ID_VERSAO)
+    except Exception:
+        # Perder um incremento só deixa os outros workers esperarem o TTL
+        current_app.logger.exception('Falha ao incrementar a versão dos painéis')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_marca(session):
+    session.info.pop(_ALTERADO, None)
+
+
+# --- 2. USO NAS ROTAS ---
+def pagina_em_cache(visao, *partes, gerar):
+    """
+    HTML da página 'visao' para o usuário logado e as 'partes' da chave
+    (ano, mês, fechamento...). Chama gerar() quando não está em cache.
+    """
+    ttl = current_app.config['PAINEL_CACHE_TTL']
+    # Mensagens flash pendentes são renderizadas (e consumidas) pela própria página
+    if ttl <= 0 or '_flashes' in sessao_http:
+        return gerar()
+
+    chave = (visao, current_user.get_id(), *partes)
+    versao = versao_atual()
+    html = _cache.obter(chave, versao)
+    if html is None:
+        html = gerar()
+        _cache.guardar(chave, html, versao, ttl, current_app.config['PAINEL_CACHE_TAMANHO'])
+    return html
+
+
+def estatisticas():
+    """Acertos, falhas e tamanho do cache deste processo."""
+    return _cache.estatisticas()
@@ -0,0 +1,108 @@
+# app/financas/caixinha.py
+
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, update
+
+from ..banco import insert_com_conflito
+from ..models import db, CaixinhaMovimentacao, CaixinhaSaldo
+
+# O saldo corrente fica numa única linha de 'caixinha_saldo'
+ID_SALDO = 1
+
+
+def _linha_saldo():
+    """
+    Retorna a linha de saldo. Ela é criada pela migração e pelo init-db; se
+    faltar (banco antigo), é criada aqui a partir do histórico.
+    """
+    linha = db.session.get(CaixinhaSaldo, ID_SALDO)
+    if linha is None:
+        garantir_linha_saldo(db.session.connection())
+        linha = db.session.get(CaixinhaSaldo, ID_SALDO)
+    return linha
+
+
+def garantir_linha_saldo(conexao):
+    """
+    Cria a linha de saldo (com o saldo do histórico) se ela não existir. Com
+    ON CONFLICT DO NOTHING, duas primeiras movimentações simultâneas não
+    disputam o INSERT: a segunda só relê a linha da primeira.
+    """
+    valores = {'id': ID_SALDO, 'saldo': select(func.coalesce(func.sum(CaixinhaMovimentacao.valor), 0.0))
+               .scalar_subquery(), 'atualizado_em': datetime.utcnow()}
+    insercao = insert_com_conflito(conexao, CaixinhaSaldo)
+    if insercao is not None:
+        conexao.execute(insercao.values(**valores).on_conflict_do_nothing(index_elements=['id']))
+    elif conexao.execute(select(CaixinhaSaldo.id).where(CaixinhaSaldo.id == ID_SALDO)).first() is None:
+        conexao.execute(insert(CaixinhaSaldo).values(**valores))
+
+
+def _saldo_pelo_historico():
+    return db.session.query(func.sum(CaixinhaMovimentacao.valor)).scalar() or 0.0
+
+
+def saldo_atual():
+    """Saldo atual do caixinha (busca pela chave primária)."""
+    linha = db.session.get(CaixinhaSaldo, ID_SALDO)
+    if linha is None:
+        # Leitura não cria a linha; ela nasce na primeira movimentação
+        return _saldo_pelo_historico()
+    return linha.saldo
+
+
+def _somar_ao_saldo(valor, saldo_minimo=None):
+    """
+    Soma 'valor' ao saldo com um UPDATE atômico no banco. Se 'saldo_minimo'
+    for informado, só atualiza se o saldo atual for >= a ele. O UPDATE trava a
+    linha (Postgres) ou o banco (SQLite) até o commit, então retiradas
+    concorrentes de vários workers são serializadas.
+    Retorna True se o saldo foi atualizado.
+    """
+    _linha_saldo()
+    stmt = update(CaixinhaSaldo).where(CaixinhaSaldo.id == ID_SALDO) \
+        .values(saldo=CaixinhaSaldo.saldo + valor, atualizado_em=datetime.utcnow())
+    if saldo_minimo is not None:
+        stmt = stmt.where(CaixinhaSaldo.saldo >= saldo_minimo)
+    resultado = db.session.execute(stmt, execution_options={'synchronize_session': False})
+    # A linha carregada na sessão passa a estar desatualizada
+    db.session.expire(db.session.get(CaixinhaSaldo, ID_SALDO))
+    return resultado.rowcount == 1
+
+
+def registrar_movimentacao(descricao, valor, user_id=None, data=None):
+    """Registra uma entrada (valor > 0) ou saída no caixinha. Não faz commit."""
+    _somar_ao_saldo(valor)
+    movimentacao = CaixinhaMovimentacao(descricao=descricao, valor=valor, user_id=user_id,
+                                        data=data or datetime.utcnow())
+    db.session.add(movimentacao)
+    return movimentacao
+
+
+def registrar_retirada(descricao, valor_retirada, user_id):
+    """
+    Registra uma retirada somente se houver saldo suficiente.
+    Retorna a movimentação criada ou None se o saldo for insuficiente. Não faz commit.
+    """
+    if not _somar_ao_saldo(-valor_retirada, saldo_minimo=valor_retirada):
+        return None
+    movimentacao = CaixinhaMovimentacao(descricao=descricao, valor=-valor_retirada,
+                                        user_id=user_id, data=datetime.utcnow())
+    db.session.add(movimentacao)
+    return movimentacao
+
+
+def remover_movimentacao(movimentacao):
+    """Remove uma movimentação e desfaz seu efeito no saldo. Não faz commit."""
+    _somar_ao_saldo(-movimentacao.valor)
+    db.session.delete(movimentacao)
+
+
+def recalcular_saldo():
+    """Recalcula o saldo a partir de todas as movimentações. Retorna (antigo, novo). Não faz commit."""
+    linha = _linha_saldo()
+    antigo = linha.saldo
+    novo = _saldo_pelo_historico()
+    linha.saldo = novo
+    linha.atualizado_em = datetime.utcnow()
+    return antigo, novo
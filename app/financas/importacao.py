@@ -0,0 +1,262 @@
+# app/financas/importacao.py
+# Importação de extratos bancários (CSV ou OFX) para Lancamento.
+#
+# O arquivo é lido em streaming (CSV linha a linha, OFX em blocos) e as
+# linhas são inseridas em lotes com executemany. Cada linha recebe um hash do
+# conteúdo (data, valor, descrição e quantas vezes essa mesma linha já
+# apareceu no arquivo); o índice único em Lancamento.hash_conteudo faz com
+# que reimportar um extrato, ou importar dois extratos que se sobrepõem,
+# ignore o que já existe.
+
+import csv
+import hashlib
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert
+
+from ..models import db, Lancamento, FechamentoMensal, RegraCategoria
+from . import agregados
+
+# Linhas por lote (um SELECT de deduplicação + um executemany + um commit)
+TAMANHO_LOTE = 500
+
+CATEGORIA_PADRAO = 'Outros'
+
+LinhaExtrato = namedtuple('LinhaExtrato', ['data', 'valor', 'descricao'])
+
+# Palavras que identificam cada coluna no cabeçalho do CSV (já sem acentos)
+_COLUNAS_CSV = {
+    'data': ('data', 'date', 'dt'),
+    'valor': ('valor', 'amount', 'value', 'quantia'),
+    'descricao': ('descricao', 'description', 'historico', 'memo', 'titulo', 'title',
+                  'estabelecimento', 'lancamento'),
+}
+
+_FORMATOS_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%Y', '%Y/%m/%d')
+
+_TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+# --- 1. LEITURA DOS ARQUIVOS (GERADORES) ---
+def _normalizar(texto):
+    sem_acento = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode()
+    return ' '.join(sem_acento.lower().split())
+
+
+def ler_valor(texto):
+    """'1.234,56', '-12.50', 'R$ (8,00)' -> float. Lança ValueError se inválido."""
+    texto = texto.replace('R$', '').replace(' ', '').strip()
+    negativo = texto.startswith('(') and texto.endswith(')')
+    texto = texto.strip('()')
+    if ',' in texto and '.' in texto:
+        # O último separador é o decimal
+        if texto.rfind(',') > texto.rfind('.'):
+            texto = texto.replace('.', '').replace(',', '.')
+        else:
+            texto = texto.replace(',', '')
+    else:
+        texto = texto.replace(',', '.')
+    valor = float(texto)
+    return -valor if negativo else valor
+
+
+def ler_data(texto):
+    texto = texto.strip()
+    for formato in _FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+    raise ValueError(f'Data inválida: {texto}')
+
+
+def _mapear_cabecalho(cabecalho):
+    """{campo: índice da coluna}. Lança ValueError se faltar alguma coluna."""
+    normalizados = [_normalizar(c) for c in cabecalho]
+    indices = {}
+    for campo, palavras in _COLUNAS_CSV.items():
+        for i, nome in enumerate(normalizados):
+            if i not in indices.values() and any(p in nome.split() or nome.startswith(p) for p in palavras):
+                indices[campo] = i
+                break
+    faltando = [campo for campo in _COLUNAS_CSV if campo not in indices]
+    if faltando:
+        raise ValueError(f'Colunas não encontradas no CSV: {", ".join(faltando)}.')
+    return indices
+
+
+def ler_csv(arquivo):
+    """
+    Gera LinhaExtrato (ou None para linha inválida) de um CSV de banco.
+    O separador (',', ';' ou tab) é detectado pelo cabeçalho.
+    """
+    primeira = next(arquivo, '')
+    try:
+        dialeto = csv.Sniffer().sniff(primeira, delimiters=',;\t')
+    except csv.Error:
+        dialeto = csv.excel
+    indices = _mapear_cabecalho(next(csv.reader([primeira], dialeto)))
+
+    for linha in csv.reader(arquivo, dialeto):
+        if not any(campo.strip() for campo in linha):
+            continue
+        try:
+            yield LinhaExtrato(ler_data(linha[indices['data']]),
+                               ler_valor(linha[indices['valor']]),
+                               linha[indices['descricao']].strip())
+        except (ValueError, IndexError):
+            yield None
+
+
+def _tokens_ofx(arquivo, tamanho_bloco=65536):
+    """Gera (fechamento, TAG, texto) de um OFX (SGML ou XML), lendo em blocos."""
+    resto = ''
+    while True:
+        bloco = arquivo.read(tamanho_bloco)
+        texto = resto + bloco
+        # Sem bloco novo, tudo é processado; senão para antes do último '<',
+        # cuja tag pode ter sido cortada no meio
+        corte = texto.rfind('<') if bloco else len(texto)
+        if corte < 0:
+            resto = texto
+            continue
+        for m in _TAG_OFX.finditer(texto, 0, corte):
+            yield m.group(1) == '/', m.group(2).upper(), m.group(3).strip()
+        resto = texto[corte:]
+        if not bloco:
+            return
+
+
+def ler_ofx(arquivo):
+    """Gera LinhaExtrato (ou None para transação inválida) de um OFX."""
+    transacao = None
+    for fechamento, tag, texto in _tokens_ofx(arquivo):
+        if tag == 'STMTTRN':
+            if not fechamento:
+                transacao = {}
+            elif transacao is not None:
+                try:
+                    yield LinhaExtrato(datetime.strptime(transacao['DTPOSTED'][:8], '%Y%m%d'),
+                                       ler_valor(transacao['TRNAMT']),
+                                       transacao.get('MEMO') or transacao.get('NAME', ''))
+                except (KeyError, ValueError):
+                    yield None
+                transacao = None
+        elif transacao is not None and not fechamento and texto:
+            transacao[tag] = texto
+
+
+def leitor_por_nome(nome_arquivo):
+    """ler_ofx para .ofx/.qfx, ler_csv para o resto."""
+    return ler_ofx if nome_arquivo.lower().endswith(('.ofx', '.qfx')) else ler_csv
+
+
+# --- 2. CATEGORIAS E HASH ---
+def carregar_regras():
+    """Lista de (padrão em minúsculas, categoria), na ordem em que são testadas."""
+    regras = RegraCategoria.query.order_by(RegraCategoria.prioridade, RegraCategoria.id).all()
+    return [(r.padrao.lower(), r.categoria) for r in regras]
+
+
+def categorizar(descricao, regras):
+    descricao = descricao.lower()
+    for padrao, categoria in regras:
+        if padrao in descricao:
+            return categoria
+    return CATEGORIA_PADRAO
+
+
+def conteudo(data, valor, descricao):
+    """Texto que identifica a linha: data, valor e descrição normalizada."""
+    return f'{data:%Y-%m-%d}|{valor:.2f}|{" ".join(descricao.upper().split())}'
+
+
+def hash_conteudo(texto_conteudo, ocorrencia):
+    return hashlib.sha256(f'{texto_conteudo}|{ocorrencia}'.encode()).hexdigest()
+
+
+# --- 3. IMPORTAÇÃO EM LOTES ---
+def _em_lotes(iteravel, tamanho):
+    iterador = iter(iteravel)
+    while True:
+        lote = list(islice(iterador, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def _inserir_lote(lote, resumo):
+    """Insere as linhas do lote que ainda não existem e atualiza os agregados."""
+    existentes = {h for (h,) in db.session.query(Lancamento.hash_conteudo)
+                  .filter(Lancamento.hash_conteudo.in_([l['hash_conteudo'] for l in lote]))}
+    novas = [l for l in lote if l['hash_conteudo'] not in existentes]
+    resumo['duplicadas'] += len(lote) - len(novas)
+    if not novas:
+        return
+
+    db.session.execute(insert(Lancamento), novas)
+    # O insert em massa não passa pelo before_flush que mantém os agregados
+    deltas = defaultdict(lambda: [0.0, 0])
+    for l in novas:
+        delta = deltas[(l['ano_referencia'], l['mes_referencia'], l['user_id'], l['categoria'])]
+        delta[0] += l['valor']
+        delta[1] += 1
+    agregados.aplicar_deltas(db.session.connection(), deltas)
+    resumo['importadas'] += len(novas)
+
+
+def importar_extrato(linhas, user_id=None, despesas_negativas=True, tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa as linhas (LinhaExtrato ou None) como lançamentos pagos por
+    'user_id' (None = Casa). Só despesas entram: valores negativos num extrato
+    de conta, ou positivos numa fatura de cartão (despesas_negativas=False).
+    Linhas de meses já fechados são ignoradas. Faz commit a cada lote, então
+    uma importação interrompida pode ser repetida sem duplicar nada.
+    Retorna um dict com as contagens.
+    """
+    regras = carregar_regras()
+    meses_fechados = set(db.session.query(FechamentoMensal.ano, FechamentoMensal.mes)
+                         .filter_by(status='fechado').all())
+    resumo = {'lidas': 0, 'importadas': 0, 'duplicadas': 0, 'ignoradas': 0,
+              'mes_fechado': 0, 'invalidas': 0}
+    # Linhas idênticas no mesmo arquivo (dois cafés no mesmo dia) são distintas;
+    # guarda só um digest curto por conteúdo
+    ocorrencias = defaultdict(int)
+
+    def _preparadas():
+        for linha in linhas:
+            resumo['lidas'] += 1
+            if linha is None or not linha.descricao:
+                resumo['invalidas'] += 1
+                continue
+            valor = -linha.valor if despesas_negativas else linha.valor
+            if valor <= 0:
+                resumo['ignoradas'] += 1
+                continue
+            if (linha.data.year, linha.data.month) in meses_fechados:
+                resumo['mes_fechado'] += 1
+                continue
+            valor = round(valor, 2)
+            texto_conteudo = conteudo(linha.data, valor, linha.descricao)
+            digest = hashlib.sha1(texto_conteudo.encode()).digest()
+            ocorrencias[digest] += 1
+            descricao = linha.descricao[:200]
+            yield {
+                'descricao': descricao,
+                'valor': valor,
+                'categoria': categorizar(descricao, regras),
+                'data': linha.data,
+                'mes_referencia': linha.data.month,
+                'ano_referencia': linha.data.year,
+                'user_id': user_id,
+                'hash_conteudo': hash_conteudo(texto_conteudo, ocorrencias[digest]),
+            }
+
+    for lote in _em_lotes(_preparadas(), tamanho_lote):
+        _inserir_lote(lote, resumo)
+        db.session.commit()
+    return resumo
@@ -0,0 +1,94 @@
+# app/financas/relatorio.py
+# Retrato (snapshot) do relatório de um mês fechado.
+#
+# No fechamento, o relatório pronto (totais, saldo de cada morador e depósito
+# do caixinha) é gravado em JSON na própria linha de 'fechamento_mensal'. O
+# relatório, as exportações e a API passam a ler só essa linha, sem o JOIN de
+# SaldoMensal com User. O retrato é imutável: o nome e o quarto do morador
+# ficam como estavam no fechamento. A única exceção é o status de pagamento,
+# que o quitar_saldo corrige no retrato (num UPDATE condicional pela versão
+# do fechamento) e em SaldoMensal na mesma transação.
+#
+# Fechamentos antigos (sem retrato, ou de uma versão anterior do formato) são
+# montados na hora a partir das tabelas; 'flask rebuild-relatorios' grava os
+# que faltam.
+
+import json
+
+from ..models import db, User, FechamentoMensal, SaldoMensal
+
+# Muda quando o formato do retrato muda; retratos de outra versão são refeitos
+VERSAO_RELATORIO = 1
+
+
+def montar_relatorio(fechamento):
+    """Dict do relatório de um fechamento, lido das tabelas (um SELECT com JOIN)."""
+    linhas = db.session.query(SaldoMensal, User.username, User.tipo_quarto) \
+        .join(User, SaldoMensal.user_id == User.id) \
+        .filter(SaldoMensal.fechamento_id == fechamento.id) \
+        .order_by(User.username).all()
+
+    return {
+        'versao': VERSAO_RELATORIO,
+        'mes': fechamento.mes,
+        'ano': fechamento.ano,
+        'totais': {
+            'total_fixo': fechamento.total_fixo,
+            'total_variavel': fechamento.total_variavel,
+            'total_aluguel_mes': fechamento.total_aluguel_mes,
+            'total_geral': fechamento.total_fixo + fechamento.total_variavel + fechamento.total_aluguel_mes,
+        },
+        'caixinha': {'deposito': fechamento.valor_caixinha_arrecadado},
+        'saldos': [{
+            'id': saldo.id,
+            'user_id': saldo.user_id,
+            'username': username,
+            'tipo_quarto': tipo_quarto,
+            'total_gasto': saldo.total_gasto,
+            'valor_devido': saldo.valor_devido,
+            'valor_devido_aluguel': saldo.valor_devido_aluguel,
+            'valor_devido_outros': saldo.valor_devido_outros,
+            'valor_devido_pessoais': saldo.valor_devido_pessoais,
+            'saldo_final': saldo.saldo_final,
+            'status_pagamento': saldo.status_pagamento,
+        } for saldo, username, tipo_quarto in linhas],
+    }
+
+
+def gravar_relatorio(fechamento):
+    """Monta e grava o retrato no fechamento. Não faz commit."""
+    dados = montar_relatorio(fechamento)
+    fechamento.relatorio = json.dumps(dados)
+    return dados
+
+
+def relatorio_do_fechamento(fechamento):
+    """Retrato gravado; se não houver (ou for de outra versão), monta na hora sem gravar."""
+    if fechamento.relatorio:
+        dados = json.loads(fechamento.relatorio)
+        if dados.get('versao') == VERSAO_RELATORIO:
+            return dados
+    return montar_relatorio(fechamento)
+
+
+def relatorio_com_status(relatorio_json, saldo_id, status):
+    """JSON do retrato com o status de um saldo corrigido (None se não houver retrato)."""
+    if not relatorio_json:
+        return relatorio_json
+    dados = json.loads(relatorio_json)
+    for saldo in dados['saldos']:
+        if saldo['id'] == saldo_id:
+            saldo['status_pagamento'] = status
+    return json.dumps(dados)
+
+
+def reconstruir_relatorios(todos=False):
+    """Grava o retrato dos fechamentos sem retrato atual (ou de todos). Não faz commit. Retorna quantos."""
+    total = 0
+    for fechamento in FechamentoMensal.query.filter_by(status='fechado').order_by(FechamentoMensal.id):
+        if not todos and fechamento.relatorio \
+                and json.loads(fechamento.relatorio).get('versao') == VERSAO_RELATORIO:
+            continue
+        gravar_relatorio(fechamento)
+        total += 1
+    return total
@@ -2,68 +2,89 @@
 
 from flask import render_template, redirect, url_for, request, flash, abort
 from flask_login import login_required, current_user
-from sqlalchemy import func
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import joinedload
 
 # 1. Importa o Blueprint, constantes e o db
 from . import financas_bp, db, CHAVE_ALUGUEL, CHAVE_CAIXINHA
 # --- CORREÇÃO AQUI: 'ValorAluguel' foi removido ---
 from ..models import User, DespesaFixa 
+from .routes_processamentos import resposta_enfileirado
+from .. import processamentos
+from ..processamentos import FalhaProcessamento
 
 # --- FUNÇÃO HELPER PARA ATUALIZAR ALUGUEIS ---
-def recalcular_e_atualizar_alugueis(aluguel_total, diferenca):
+def consulta_alugueis_individuais():
+    """Despesas de aluguel dos moradores, as ativas primeiro e, em cada grupo, por id."""
+    return DespesaFixa.query.filter(
+        DespesaFixa.descricao == CHAVE_ALUGUEL, DespesaFixa.morador_id != None
+    ).order_by(DespesaFixa.ativa.desc(), DespesaFixa.id)
+
+
+def recalcular_e_atualizar_alugueis(aluguel_total, diferenca, progresso=None):
     """
     Calcula e salva o valor do aluguel individual de cada morador
-    na tabela DespesaFixa.
+    na tabela DespesaFixa. Lança ValueError se não houver moradores.
     """
-    
+    progresso = progresso or (lambda pct, etapa: None)
+
+    progresso(10, 'Lendo os moradores')
     moradores = User.query.filter(User.cargo != 'admin').all() 
     
     if not moradores:
-        flash('Nenhum morador (não-admin) encontrado para calcular.', 'warning')
-        return (None, None)
+        raise ValueError('Nenhum morador (não-admin) encontrado para calcular.')
 
     Ntotal = len(moradores)
-    n1 = User.query.filter(User.cargo != 'admin', User.tipo_quarto == 'individual').count()
+    n1 = sum(1 for morador in moradores if morador.tipo_quarto == 'individual')
 
-    try:
-        if Ntotal == 0: 
-            raise ZeroDivisionError
-
-        aluguel_compartilhado = (aluguel_total - diferenca * n1) / Ntotal
-        aluguel_individual = aluguel_compartilhado + diferenca
+    aluguel_compartilhado = (aluguel_total - diferenca * n1) / Ntotal
+    aluguel_individual = aluguel_compartilhado + diferenca
 
-        aluguel_compartilhado = round(aluguel_compartilhado, 2)
-        aluguel_individual = round(aluguel_individual, 2)
+    aluguel_compartilhado = round(aluguel_compartilhado, 2)
+    aluguel_individual = round(aluguel_individual, 2)
 
-    except ZeroDivisionError:
-        flash('Erro: Não há moradores para dividir o aluguel.', 'danger')
-        return (None, None)
+    progresso(40, 'Calculando o aluguel de cada morador')
+    # Despesas de aluguel já existentes, numa consulta só (não uma por morador).
+    # Uma por morador: a ativa de menor id (a mesma que o fechamento usa); uma
+    # inativa só é reaproveitada se o morador não tiver nenhuma ativa.
+    despesas_aluguel = {}
+    for d in consulta_alugueis_individuais():
+        despesas_aluguel.setdefault(d.morador_id, d.id)
 
+    atualizacoes = []
+    novas = []
     for morador in moradores:
         valor_a_pagar = aluguel_individual if morador.tipo_quarto == 'individual' else aluguel_compartilhado
-        
-        despesa_aluguel_morador = DespesaFixa.query.filter_by(
-            descricao=CHAVE_ALUGUEL, 
-            morador_id=morador.id
-        ).first()
 
-        if despesa_aluguel_morador:
-            despesa_aluguel_morador.valor = valor_a_pagar
-            despesa_aluguel_morador.ativa = True
+        if morador.id in despesas_aluguel:
+            atualizacoes.append({'id': despesas_aluguel[morador.id], 'valor': valor_a_pagar, 'ativa': True})
         else:
-            nova_despesa_aluguel = DespesaFixa(
-                descricao=CHAVE_ALUGUEL,
-                valor=valor_a_pagar,
-                morador_id=morador.id,
-                ativa=True
-            )
-            db.session.add(nova_despesa_aluguel)
+            novas.append({'descricao': CHAVE_ALUGUEL, 'valor': valor_a_pagar,
+                          'morador_id': morador.id, 'ativa': True})
+
+    progresso(80, 'Gravando os aluguéis')
+    # UPDATE/INSERT em lote (executemany) em vez de um comando por morador
+    if atualizacoes:
+        db.session.execute(update(DespesaFixa), atualizacoes)
+    if novas:
+        db.session.execute(insert(DespesaFixa), novas)
 
     db.session.commit()
     
     return (aluguel_individual, aluguel_compartilhado)
 
 
+@processamentos.registrar('recalcular_alugueis', destino_erro='financas.gerenciar_aluguel',
+                          por_parametros=True)
+def executar_recalculo_alugueis(progresso, aluguel_total, diferenca):
+    try:
+        recalcular_e_atualizar_alugueis(aluguel_total, diferenca, progresso)
+    except ValueError as e:
+        raise FalhaProcessamento(str(e), categoria='warning')
+    return {'mensagem': 'Valores do aluguel salvos e despesas individuais atualizadas!', 'categoria': 'success',
+            'destino': 'financas.gerenciar_aluguel'}
+
+
 # --- ROTA GERENCIAR ALUGUEL ---
 @financas_bp.route('/gerenciar_aluguel', methods=['GET', 'POST'])
 @login_required
@@ -86,10 +107,11 @@ def gerenciar_aluguel():
         aluguel_master.diferenca_individual = diferenca_form
         db.session.commit()
 
-        recalcular_e_atualizar_alugueis(aluguel_total_form, diferenca_form)
-        
-        flash('Valores do aluguel salvos e despesas individuais atualizadas!', 'success')
-        return redirect(url_for('financas.gerenciar_aluguel'))
+        # As despesas individuais são recalculadas em segundo plano
+        processamento = processamentos.enfileirar('recalcular_alugueis', current_user.id,
+                                                  aluguel_total=aluguel_total_form,
+                                                  diferenca=diferenca_form)
+        return resposta_enfileirado(processamento)
 
     moradores = User.query.filter(User.cargo != 'admin').all()
     valor_individual_calc = None
@@ -123,7 +145,8 @@ def gerenciar_despesas_fixas():
     if not current_user.is_gerenciador(): abort(403)
     
     # Simplesmente pegamos todas as despesas.
-    despesas = DespesaFixa.query.order_by(DespesaFixa.ativa.desc(), DespesaFixa.descricao).all()
+    despesas = DespesaFixa.query.options(joinedload(DespesaFixa.morador)) \
+        .order_by(DespesaFixa.ativa.desc(), DespesaFixa.descricao).all()
     
     # --- LÓGICA VIRTUAL REMOVIDA ---
 
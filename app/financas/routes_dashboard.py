@@ -3,13 +3,85 @@
 from flask import render_template, redirect, url_for, abort, flash, request # <-- ADDED request HERE
 from flask_login import login_required, current_user
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 # 1. Importa o Blueprint, helpers e constantes do __init__.py desta pasta
 from . import financas_bp, get_dados_caixinha, CHAVE_ALUGUEL, CHAVE_CAIXINHA
+from . import agregados, caixinha, analise
+from .cache import pagina_em_cache
 
 # 2. Importa os modelos e o db subindo um nível (de 'app/financas' para 'app')
-from ..models import db, User, Lancamento, DespesaFixa, FechamentoMensal, CaixinhaMovimentacao
+from ..models import db, User, Lancamento, DespesaFixa, FechamentoMensal
+
+# --- CONSULTAS DOS PAINÉIS (USADAS PELAS PÁGINAS E PELA API /api/v1) ---
+def fechamento_do_mes(ano, mes):
+    """O fechamento 'fechado' do mês, ou None se o mês ainda está aberto."""
+    return FechamentoMensal.query.filter_by(mes=mes, ano=ano, status='fechado').first()
+
+
+def dados_dashboard_usuario(ano, mes, user_id):
+    """Gastos lançados (pagos) pelo usuário no mês e o total deles."""
+    meus_gastos = Lancamento.query.filter_by(
+        user_id=user_id, # Filtra por quem pagou (user_id)
+        mes_referencia=mes,
+        ano_referencia=ano
+    ).order_by(Lancamento.data.desc()).all()
+    return {'meus_gastos': meus_gastos,
+            'total_gasto': agregados.total_do_usuario(ano, mes, user_id)}
+
+
+def dados_dashboard_tesoureiro(ano, mes, dados_caixinha):
+    """Despesas, lançamentos e totais do mês para o painel do tesoureiro."""
+    # O template mostra o morador de cada despesa e o autor de cada lançamento:
+    # carregados no mesmo SELECT (joinedload), não um SELECT por linha
+    despesas_fixas = DespesaFixa.query.options(joinedload(DespesaFixa.morador)).filter_by(ativa=True).all()
+    lancamentos_variaveis_mes = Lancamento.query.options(joinedload(Lancamento.autor)).filter_by(
+        mes_referencia=mes,
+        ano_referencia=ano
+    ).order_by(Lancamento.data.desc()).all()
+
+    # Gastos lançados/pagos POR usuário (crédito), lidos da tabela de agregados
+    gastos_dict = agregados.totais_por_usuario(ano, mes)
+
+    todos_usuarios_moradores = User.query.filter(User.cargo != 'admin').order_by(User.username).all()
+
+    # Média mensal de cada morador nos últimos meses completos (para comparar com o mês atual)
+    previsao = analise.previsao()
+    medias_mensais = {m['nome']: m['media_mensal'] for m in previsao['por_morador']}
+
+    gastos_lancados_por_usuario = []
+    for user in todos_usuarios_moradores:
+        total = gastos_dict.get(user.id, 0.0)
+        gastos_lancados_por_usuario.append({'username': user.username, 'total_lancado': total, 'tipo_quarto': user.tipo_quarto,
+                                            'media_mensal': medias_mensais.get(user.username, 0.0)})
+
+    # ATUALIZADO: Calcula totais PARA EXIBIÇÃO RÁPIDA (baseado em morador_id)
+    total_fixo_outros_exib = sum(d.valor for d in despesas_fixas 
+                                  if CHAVE_ALUGUEL not in d.descricao 
+                                  and CHAVE_CAIXINHA not in d.descricao 
+                                  and d.morador_id is None)
+    
+    total_variavel_casa_exib = agregados.total_do_mes(ano, mes)
+    
+    # Soma apenas aluguéis individuais (com morador_id)
+    total_aluguel_exib = sum(d.valor for d in despesas_fixas 
+                              if CHAVE_ALUGUEL in d.descricao 
+                              and d.morador_id is not None) 
+    
+    total_caixinha_exib = dados_caixinha["valor_contribuicao_mensal"]
+    total_gasto_geral_exibicao = total_fixo_outros_exib + total_variavel_casa_exib + total_aluguel_exib
+    total_a_pagar_exibicao = total_gasto_geral_exibicao + total_caixinha_exib
+
+    return {'despesas_fixas': despesas_fixas,
+            'lancamentos_variaveis': lancamentos_variaveis_mes,
+            'gastos_por_usuario': gastos_lancados_por_usuario,
+            'total_fixo': total_fixo_outros_exib,
+            'total_variavel': total_variavel_casa_exib,
+            'total_gasto_geral': total_gasto_geral_exibicao,
+            'total_a_pagar': total_a_pagar_exibicao,
+            # Estatísticas do histórico e previsão da conta do mês seguinte
+            'previsao': previsao}
+
 
 # --- DASHBOARDS ---
 @financas_bp.route('/')
@@ -19,7 +91,7 @@ def dashboard():
     hoje = datetime.utcnow()
     mes_atual = hoje.month
     ano_atual = hoje.year
-    fechamento = FechamentoMensal.query.filter_by(mes=mes_atual, ano=ano_atual, status='fechado').first()
+    fechamento = fechamento_do_mes(ano_atual, mes_atual)
     if fechamento:
         return redirect(url_for('financas.ver_relatorio', fechamento_id=fechamento.id))
     if current_user.is_gerenciador():
@@ -33,20 +105,20 @@ def dashboard_usuario():
     hoje = datetime.utcnow()
     mes_atual = hoje.month
     ano_atual = hoje.year
-    fechamento = FechamentoMensal.query.filter_by(mes=mes_atual, ano=ano_atual, status='fechado').first()
+    fechamento = fechamento_do_mes(ano_atual, mes_atual)
     if fechamento:
         return redirect(url_for('financas.ver_relatorio', fechamento_id=fechamento.id))
+    return pagina_em_cache('dashboard_usuario', ano_atual, mes_atual,
+                           gerar=lambda: _render_dashboard_usuario(ano_atual, mes_atual))
+
+
+def _render_dashboard_usuario(ano_atual, mes_atual):
     # Mostra gastos LANÇADOS pelo usuário logado
-    meus_gastos = Lancamento.query.filter_by(
-        user_id=current_user.id, # Filtra por quem pagou (user_id)
-        mes_referencia=mes_atual,
-        ano_referencia=ano_atual
-    ).order_by(Lancamento.data.desc()).all()
-    total_gasto = sum(g.valor for g in meus_gastos)
+    dados = dados_dashboard_usuario(ano_atual, mes_atual, current_user.id)
     dados_caixinha = get_dados_caixinha()
     return render_template('dashboard_usuario.html',  # Caminho relativo ao 'template_folder'
-                           meus_gastos=meus_gastos,
-                           total_gasto=total_gasto,
+                           meus_gastos=dados['meus_gastos'],
+                           total_gasto=dados['total_gasto'],
                            dados_caixinha=dados_caixinha,
                            mes=mes_atual, ano=ano_atual)
 
@@ -58,63 +130,22 @@ def dashboard_tesoureiro():
     hoje = datetime.utcnow()
     mes_atual = hoje.month
     ano_atual = hoje.year
-    fechamento = FechamentoMensal.query.filter_by(mes=mes_atual, ano=ano_atual, status='fechado').first()
+    fechamento = fechamento_do_mes(ano_atual, mes_atual)
     if fechamento:
         return redirect(url_for('financas.ver_relatorio', fechamento_id=fechamento.id))
+    return pagina_em_cache('dashboard_tesoureiro', ano_atual, mes_atual,
+                           gerar=lambda: _render_dashboard_tesoureiro(ano_atual, mes_atual))
 
-    dados_caixinha = get_dados_caixinha()
-    despesas_fixas = DespesaFixa.query.filter_by(ativa=True).all()
-    lancamentos_variaveis_mes = Lancamento.query.filter_by(
-        mes_referencia=mes_atual,
-        ano_referencia=ano_atual
-    ).order_by(Lancamento.data.desc()).all()
-
-    # Gastos lançados/pagos POR usuário (crédito)
-    gastos_lancados_por_usuario_query = db.session.query(
-        User.username, func.sum(Lancamento.valor).label('total')
-    ).join(User, Lancamento.user_id == User.id).filter( # Join explícito em user_id (pagador)
-        Lancamento.mes_referencia == mes_atual,
-        Lancamento.ano_referencia == ano_atual,
-        Lancamento.user_id != None # Não inclui gastos da "Casa" (user_id=None)
-    ).group_by(User.username).all()
-
-    todos_usuarios_moradores = User.query.filter(User.cargo != 'admin').order_by(User.username).all()
-    gastos_dict = {username: total for username, total in gastos_lancados_por_usuario_query}
-
-    gastos_lancados_por_usuario = []
-    for user in todos_usuarios_moradores:
-        total = gastos_dict.get(user.username, 0.0)
-        gastos_lancados_por_usuario.append({'username': user.username, 'total_lancado': total, 'tipo_quarto': user.tipo_quarto})
-
-    # ATUALIZADO: Calcula totais PARA EXIBIÇÃO RÁPIDA (baseado em morador_id)
-    total_fixo_outros_exib = sum(d.valor for d in despesas_fixas 
-                                  if CHAVE_ALUGUEL not in d.descricao 
-                                  and CHAVE_CAIXINHA not in d.descricao 
-                                  and d.morador_id is None)
-    
-    total_variavel_casa_exib = sum(l.valor for l in lancamentos_variaveis_mes) 
-    
-    # Soma apenas aluguéis individuais (com morador_id)
-    total_aluguel_exib = sum(d.valor for d in despesas_fixas 
-                              if CHAVE_ALUGUEL in d.descricao 
-                              and d.morador_id is not None) 
-    
-    total_caixinha_exib = dados_caixinha["valor_contribuicao_mensal"]
-    total_gasto_geral_exibicao = total_fixo_outros_exib + total_variavel_casa_exib + total_aluguel_exib
-    total_a_pagar_exibicao = total_gasto_geral_exibicao + total_caixinha_exib
 
+def _render_dashboard_tesoureiro(ano_atual, mes_atual):
+    dados_caixinha = get_dados_caixinha(analise.previsao()['retirada_caixinha_prevista'])
+    dados = dados_dashboard_tesoureiro(ano_atual, mes_atual, dados_caixinha)
     return render_template('dashboard_tesoureiro.html', # Caminho relativo
-                           despesas_fixas=despesas_fixas,
-                           lancamentos_variaveis=lancamentos_variaveis_mes,
-                           gastos_por_usuario=gastos_lancados_por_usuario,
                            dados_caixinha=dados_caixinha,
-                           total_fixo=total_fixo_outros_exib,
-                           total_variavel=total_variavel_casa_exib,
-                           total_gasto_geral=total_gasto_geral_exibicao,
-                           total_a_pagar=total_a_pagar_exibicao,
                            chave_caixinha=CHAVE_CAIXINHA,
                            chave_aluguel=CHAVE_ALUGUEL,
-                           mes=mes_atual, ano=ano_atual)
+                           mes=mes_atual, ano=ano_atual,
+                           **dados)
 
 
 # --- ROTA RETIRAR CAIXINHA (ADICIONADA) ---
@@ -136,17 +167,13 @@ def retirar_da_caixinha():
         flash('Valor inválido.', 'danger')
         return redirect(url_for('financas.dashboard_tesoureiro'))
     
-    saldo_atual = db.session.query(func.sum(CaixinhaMovimentacao.valor)).scalar() or 0.0
-    if valor_retirada > saldo_atual:
+    # Débito condicional e atômico: retiradas simultâneas não deixam o saldo negativo
+    nova_retirada = caixinha.registrar_retirada(descricao, valor_retirada, current_user.id)
+    if nova_retirada is None:
+        db.session.rollback()
+        saldo_atual = caixinha.saldo_atual()
         flash(f'Saldo insuficiente no caixinha (Saldo: R$ {saldo_atual:.2f}).', 'danger')
         return redirect(url_for('financas.dashboard_tesoureiro'))
-    
-    nova_retirada = CaixinhaMovimentacao(
-        descricao=descricao,
-        valor=-valor_retirada,
-        user_id=current_user.id
-    )
-    db.session.add(nova_retirada)
     db.session.commit()
     flash('Retirada do caixinha registrada com sucesso.', 'success')
     return redirect(url_for('financas.dashboard_tesoureiro'))
\ No newline at end of file
@@ -0,0 +1,73 @@
+# app/financas/routes_exportacao.py
+# Exportação (CSV/XLSX) de lançamentos, saldos de um fechamento e caixinha.
+# As consultas selecionam só as colunas exportadas e são lidas em blocos
+# enquanto a resposta é enviada (ver app/exportacao.py). Os saldos saem do
+# retrato gravado no fechamento (ver relatorio.py).
+
+from flask import abort, request
+from flask_login import login_required, current_user
+from sqlalchemy import select
+
+from . import financas_bp, relatorio
+from .routes_lancamentos import filtros_lancamentos
+from ..exportacao import FORMATOS, linhas_da_consulta, resposta_exportacao
+from ..models import User, Lancamento, FechamentoMensal, CaixinhaMovimentacao
+
+
+def _validar_formato(formato):
+    if formato not in FORMATOS:
+        abort(404)
+
+
+@financas_bp.route('/exportar/lancamentos.<formato>')
+@login_required
+def exportar_lancamentos(formato):
+    """Lançamentos com os mesmos filtros do navegador (morador: só os próprios)."""
+    _validar_formato(formato)
+    filtros, _ = filtros_lancamentos(request.args)
+    consulta = select(Lancamento.ano_referencia, Lancamento.mes_referencia, Lancamento.data,
+                      Lancamento.descricao, Lancamento.categoria, Lancamento.valor,
+                      User.username, Lancamento.parcela_atual, Lancamento.parcela_total) \
+        .outerjoin(User, Lancamento.user_id == User.id) \
+        .where(*filtros) \
+        .order_by(Lancamento.ano_referencia.desc(), Lancamento.mes_referencia.desc(), Lancamento.id.desc())
+
+    def linhas():
+        for ano, mes, data, descricao, categoria, valor, pagador, parcela, parcelas in linhas_da_consulta(consulta):
+            yield (ano, mes, data, descricao, categoria, valor, pagador or 'Casa',
+                   f'{parcela}/{parcelas}' if parcelas else '')
+
+    return resposta_exportacao('lancamentos', formato,
+                               ['Ano', 'Mês', 'Data', 'Descrição', 'Categoria', 'Valor', 'Pagador', 'Parcela'],
+                               linhas())
+
+
+@financas_bp.route('/exportar/saldos/<int:fechamento_id>.<formato>')
+@login_required
+def exportar_saldos(fechamento_id, formato):
+    """Saldos de cada morador num fechamento (o mesmo conteúdo do relatório)."""
+    _validar_formato(formato)
+    fechamento = FechamentoMensal.query.get_or_404(fechamento_id)
+    saldos = relatorio.relatorio_do_fechamento(fechamento)['saldos']
+    linhas = ((s['username'], s['total_gasto'], s['valor_devido_aluguel'], s['valor_devido_outros'],
+               s['valor_devido'], s['saldo_final'], s['status_pagamento']) for s in saldos)
+
+    return resposta_exportacao(f'saldos_{fechamento.ano}_{fechamento.mes:02d}', formato,
+                               ['Morador', 'Total Gasto', 'Aluguel', 'Outras Despesas', 'Valor Devido',
+                                'Saldo Final', 'Status'],
+                               linhas)
+
+
+@financas_bp.route('/exportar/caixinha.<formato>')
+@login_required
+def exportar_caixinha(formato):
+    if not current_user.is_gerenciador(): abort(403)
+    _validar_formato(formato)
+    consulta = select(CaixinhaMovimentacao.data, CaixinhaMovimentacao.descricao,
+                      CaixinhaMovimentacao.valor, User.username) \
+        .outerjoin(User, CaixinhaMovimentacao.user_id == User.id) \
+        .order_by(CaixinhaMovimentacao.data.desc(), CaixinhaMovimentacao.id.desc())
+
+    return resposta_exportacao('caixinha', formato,
+                               ['Data', 'Descrição', 'Valor', 'Usuário'],
+                               linhas_da_consulta(consulta))
@@ -1,34 +1,80 @@
 # app/financas/routes_fechamento.py (VERSÃO CORRIGIDA FINAL)
 
-from flask import render_template, redirect, url_for, request, flash, abort
+import hashlib
+
+from flask import render_template, redirect, url_for, request, flash, abort, make_response, session
 from flask_login import login_required, current_user
-from sqlalchemy import func
+from sqlalchemy import insert, update
 from datetime import datetime
+from werkzeug.http import is_resource_modified
 
 # 1. Importa o Blueprint, constantes e o db
 from . import financas_bp, db, CHAVE_ALUGUEL, CHAVE_CAIXINHA
+from . import agregados, caixinha, relatorio, series
+from .cache import pagina_em_cache
+from .routes_processamentos import resposta_enfileirado
+from .. import processamentos
+from ..processamentos import FalhaProcessamento
+from ..paginacao import ler_cursor, montar_cursor, antes_de
 # --- CORREÇÃO AQUI: REMOVIDO 'ValorAluguel' ---
-from ..models import (User, Lancamento, DespesaFixa, FechamentoMensal,
+from ..models import (User, DespesaFixa, FechamentoMensal,
                     SaldoMensal, CaixinhaMovimentacao)
 
-
-# --- ROTA DE FECHAMENTO (CORRIGIDA) ---
-@financas_bp.route('/fechar_mes', methods=['POST'])
-@login_required
-def fechar_mes():
-    if not current_user.is_gerenciador():
-        abort(403)
-
-    hoje = datetime.utcnow()
-    mes = hoje.month
-    ano = hoje.year
-
+MESES_POR_PAGINA_HISTORICO = 12
+
+
+# --- CÁLCULO DOS SALDOS (EM MEMÓRIA) ---
+def alugueis_por_morador(despesas_fixas):
+    """
+    {morador_id: valor} do aluguel individual ativo de cada morador. Com mais
+    de um, vale o de menor id, na mesma ordem do recálculo dos aluguéis
+    (ativas primeiro, depois por id).
+    """
+    alugueis = {}
+    for d in sorted(despesas_fixas, key=lambda d: (not d.ativa, d.id)):
+        if d.descricao == CHAVE_ALUGUEL and d.morador_id is not None and d.ativa:
+            alugueis.setdefault(d.morador_id, d.valor)
+    return alugueis
+
+
+def calcular_saldos_mensais(moradores, alugueis, gastos_por_usuario, cota_outras_despesas):
+    """
+    Monta as linhas de SaldoMensal (sem fechamento_id) de cada morador.
+    Lança ValueError se algum morador não tiver aluguel ativo.
+    """
+    linhas = []
+    for morador in moradores:
+        if morador.id not in alugueis:
+            raise ValueError(f"Morador '{morador.username}' não possui despesa de aluguel ativa. Por favor, atualize os valores em 'Gerenciar Aluguel'.")
+
+        valor_aluguel_morador = alugueis[morador.id]
+        gastos_pessoais_devidos = 0.0 # Mantido como 0
+        valor_devido_user = valor_aluguel_morador + cota_outras_despesas
+        total_gasto_lancado_user = gastos_por_usuario.get(morador.id, 0.0)
+
+        linhas.append({
+            'user_id': morador.id,
+            'total_gasto': total_gasto_lancado_user,
+            'valor_devido': valor_devido_user,
+            'valor_devido_aluguel': valor_aluguel_morador,
+            'valor_devido_outros': cota_outras_despesas,
+            'valor_devido_pessoais': gastos_pessoais_devidos,
+            'saldo_final': total_gasto_lancado_user - valor_devido_user,
+            'status_pagamento': 'pendente',
+        })
+    return linhas
+
+
+# --- FECHAMENTO (EM SEGUNDO PLANO) ---
+@processamentos.registrar('fechar_mes', destino_erro='financas.dashboard')
+def executar_fechamento(progresso, ano, mes):
+    """Fecha o mês: calcula e grava os saldos de cada morador e o depósito do caixinha. Faz commit."""
     if FechamentoMensal.query.filter_by(mes=mes, ano=ano, status='fechado').first():
-        flash('Este mês já foi fechado.', 'warning')
-        return redirect(url_for('financas.dashboard'))
+        raise FalhaProcessamento('Este mês já foi fechado.', categoria='warning')
 
     # --- LÓGICA DE ALUGUEL BASEADA EM 'ValorAluguel' REMOVIDA ---
 
+    progresso(10, 'Lendo despesas fixas')
     despesas_fixas_query = DespesaFixa.query.filter_by(ativa=True).all()
 
     # Soma das despesas fixas 'Aluguel' individuais (com morador_id)
@@ -47,100 +93,84 @@ def fechar_mes():
                             and d.descricao != CHAVE_CAIXINHA
                             and d.morador_id is None)
 
+    progresso(30, 'Somando os gastos do mês')
     # Lançamentos variáveis são todos da "casa"
-    total_variavel_casa = db.session.query(func.sum(Lancamento.valor)).filter(
-        Lancamento.mes_referencia == mes,
-        Lancamento.ano_referencia == ano
-    ).scalar() or 0.0
+    total_variavel_casa = agregados.total_do_mes(ano, mes)
+    # Total lançado por cada morador no mês (um único GROUP BY nos agregados)
+    gastos_por_usuario = agregados.totais_por_usuario(ano, mes)
 
     total_outras_despesas_gerais = total_fixo_outros + total_variavel_casa + valor_caixinha_mes
 
     moradores = User.query.filter(User.cargo != 'admin').all()
     if not moradores:
-        flash('Nenhum morador (usuário ou gerenciador) encontrado para dividir.', 'danger')
-        return redirect(url_for('financas.dashboard'))
+        raise FalhaProcessamento('Nenhum morador (usuário ou gerenciador) encontrado para dividir.')
 
     num_moradores = len(moradores)
     cota_outras_despesas = total_outras_despesas_gerais / num_moradores if num_moradores > 0 else 0
 
+    progresso(60, 'Calculando os saldos dos moradores')
+    # Aluguéis já vieram na consulta de despesas fixas; totais por morador
+    # num único GROUP BY. Calculados antes das escritas.
     try:
-        novo_fechamento = FechamentoMensal(
-            mes=mes,
-            ano=ano,
-            total_fixo=total_fixo_outros,
-            total_variavel=total_variavel_casa,
-            total_aluguel_mes=total_aluguel_fixo_mes,
-            valor_caixinha_arrecadado=valor_caixinha_mes,
-            status='fechado'
+        linhas_saldo = calcular_saldos_mensais(
+            moradores, alugueis_por_morador(despesas_fixas_query),
+            gastos_por_usuario, cota_outras_despesas
+        )
+    except ValueError as ve:
+        raise FalhaProcessamento(f'Erro ao fechar o mês: {ve}', destino='financas.gerenciar_aluguel')
+
+    progresso(80, 'Gravando o fechamento')
+    novo_fechamento = FechamentoMensal(
+        mes=mes,
+        ano=ano,
+        total_fixo=total_fixo_outros,
+        total_variavel=total_variavel_casa,
+        total_aluguel_mes=total_aluguel_fixo_mes,
+        valor_caixinha_arrecadado=valor_caixinha_mes,
+        status='fechado'
+    )
+    db.session.add(novo_fechamento)
+    db.session.flush()
+
+    if valor_caixinha_mes > 0:
+        caixinha.registrar_movimentacao(
+            descricao=f"Depósito do fechamento {mes}/{ano}",
+            valor=valor_caixinha_mes,
+            user_id=None,
+            data=datetime.utcnow()
         )
-        db.session.add(novo_fechamento)
-        db.session.flush()
-
-        if valor_caixinha_mes > 0:
-            entrada_caixinha = CaixinhaMovimentacao(
-                data=hoje,
-                descricao=f"Depósito do fechamento {mes}/{ano}",
-                valor=valor_caixinha_mes,
-                user_id=None
-            )
-            db.session.add(entrada_caixinha)
-
-        for morador in moradores:
-            # --- NOVA LÓGICA DE ALUGUEL ---
-            # Busca a despesa de aluguel específica daquele morador
-            despesa_aluguel_morador = DespesaFixa.query.filter_by(
-                descricao=CHAVE_ALUGUEL,
-                morador_id=morador.id,
-                ativa=True # Considera apenas se a despesa individual está ativa
-            ).first()
-
-            if not despesa_aluguel_morador:
-                # Se não achar, lança um erro
-                raise ValueError(f"Morador '{morador.username}' não possui despesa de aluguel ativa. Por favor, atualize os valores em 'Gerenciar Aluguel'.")
-
-            valor_aluguel_morador = despesa_aluguel_morador.valor
-            # --- FIM DA NOVA LÓGICA ---
-
-            gastos_pessoais_devidos = 0.0 # Mantido como 0
-            valor_devido_user = valor_aluguel_morador + cota_outras_despesas
-
-            total_gasto_lancado_user = db.session.query(func.sum(Lancamento.valor)).filter_by(
-                mes_referencia=mes, ano_referencia=ano, user_id=morador.id
-            ).scalar() or 0.0
-
-            saldo_final = total_gasto_lancado_user - valor_devido_user
-
-            novo_saldo = SaldoMensal(
-                fechamento_id=novo_fechamento.id,
-                user_id=morador.id,
-                total_gasto=total_gasto_lancado_user,
-                valor_devido=valor_devido_user,
-                valor_devido_aluguel=valor_aluguel_morador,
-                valor_devido_outros=cota_outras_despesas,
-                valor_devido_pessoais=gastos_pessoais_devidos,
-                saldo_final=saldo_final,
-                status_pagamento='pendente'
-            )
-            db.session.add(novo_saldo)
 
-        db.session.commit()
-        flash(f'Mês {mes}/{ano} fechado com sucesso!', 'success')
-        return redirect(url_for('financas.ver_relatorio', fechamento_id=novo_fechamento.id))
+    # Os saldos são gravados num insert em lote
+    for linha in linhas_saldo:
+        linha['fechamento_id'] = novo_fechamento.id
+    db.session.execute(insert(SaldoMensal), linhas_saldo)
+    series.registrar_fechamento(novo_fechamento)
 
-    except ValueError as ve:
-        db.session.rollback()
-        flash(f'Erro ao fechar o mês: {ve}', 'danger')
-        if 'Gerenciar Aluguel' in str(ve):
-             return redirect(url_for('financas.gerenciar_aluguel'))
-        else:
-             return redirect(url_for('financas.dashboard'))
-    except Exception as e:
-        db.session.rollback()
-        # Logar o erro completo pode ser útil para debug
-        # current_app.logger.error(f'Erro inesperado ao fechar o mês: {e}', exc_info=True)
-        flash(f'Erro inesperado ao fechar o mês. Verifique os logs.', 'danger')
+    # Retrato do relatório pronto, lido pelas páginas do mês fechado
+    relatorio.gravar_relatorio(novo_fechamento)
+
+    db.session.commit()
+    return {'mensagem': f'Mês {mes}/{ano} fechado com sucesso!', 'categoria': 'success',
+            'destino': 'financas.ver_relatorio', 'destino_parametros': {'fechamento_id': novo_fechamento.id}}
+
+
+# --- ROTA DE FECHAMENTO ---
+@financas_bp.route('/fechar_mes', methods=['POST'])
+@login_required
+def fechar_mes():
+    if not current_user.is_gerenciador():
+        abort(403)
+
+    hoje = datetime.utcnow()
+    if FechamentoMensal.query.filter_by(mes=hoje.month, ano=hoje.year, status='fechado').first():
+        flash('Este mês já foi fechado.', 'warning')
         return redirect(url_for('financas.dashboard'))
 
+    # O cálculo roda em segundo plano; a página de progresso mostra o
+    # resultado (flash + redirecionamento) quando terminar
+    processamento = processamentos.enfileirar('fechar_mes', current_user.id, ano=hoje.year, mes=hoje.month)
+    return resposta_enfileirado(processamento)
+
 
 # --- ROTAS REABRIR, RELATÓRIO, HISTÓRICO, QUITAR (CORRIGIDAS) ---
 @financas_bp.route('/reabrir_mes/<int:fechamento_id>', methods=['POST'])
@@ -158,11 +188,12 @@ def reabrir_mes(fechamento_id):
                 CaixinhaMovimentacao.user_id == None
             ).order_by(CaixinhaMovimentacao.id.desc()).first()
             if entrada_caixinha_associada:
-                db.session.delete(entrada_caixinha_associada)
+                caixinha.remover_movimentacao(entrada_caixinha_associada)
             else:
                  flash(f'Atenção: Não foi encontrada a entrada automática no caixinha para o fechamento {fechamento.mes}/{fechamento.ano}. Saldo pode precisar de ajuste manual.', 'warning')
         
         # Deleta o fechamento (o cascade="all, delete-orphan" deve deletar os SaldoMensal)
+        series.remover_fechamento(fechamento)
         db.session.delete(fechamento)
         db.session.commit()
         flash(f'Mês {fechamento.mes}/{fechamento.ano} foi reaberto.', 'success')
@@ -178,13 +209,74 @@ def reabrir_mes(fechamento_id):
 @login_required
 def ver_relatorio(fechamento_id):
     fechamento = FechamentoMensal.query.get_or_404(fechamento_id)
-    saldos = SaldoMensal.query.filter_by(fechamento_id=fechamento.id).join(User).order_by(User.username).all()
-
-    # Não precisamos mais do 'ValorAluguel' aqui
+    # Mensagens flash pendentes precisam ser renderizadas: sem GET condicional
+    if fechamento.status != 'fechado' or '_flashes' in session:
+        return _render_relatorio(fechamento)
+
+    # Relatório fechado só muda via quitar_saldo (ou some no reabrir_mes), então
+    # o navegador/PWA pode reaproveitar a cópia dele revalidando pela ETag
+    etag = etag_relatorio(fechamento)
+    if is_resource_modified(request.environ, etag=etag, last_modified=fechamento.atualizado_em):
+        resposta = make_response(pagina_em_cache('ver_relatorio', fechamento.id,
+                                                 gerar=lambda: _render_relatorio(fechamento)))
+    else:
+        resposta = make_response('', 304)
+    resposta.set_etag(etag)
+    resposta.last_modified = fechamento.atualizado_em
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    resposta.vary.add('Cookie')
+    return resposta
+
+
+def etag_relatorio(fechamento):
+    """
+    ETag forte do relatório: fechamento, carimbo de versão e o usuário logado
+    (o menu e os botões de gerenciador fazem parte do HTML). 'atualizado_em'
+    entra na tag para que um mês reaberto e fechado de novo com o mesmo id
+    não reaproveite a tag antiga.
+    """
+    atualizado_em = fechamento.atualizado_em.isoformat() if fechamento.atualizado_em else ''
+    base = f'{fechamento.id}:{fechamento.versao}:{atualizado_em}:{current_user.id}:{current_user.cargo}'
+    return hashlib.sha1(base.encode()).hexdigest()
+
+
+# Quantas vezes o quitar_saldo relê e tenta de novo quando outro pedido
+# alterou o mesmo fechamento entre a leitura e o UPDATE
+TENTATIVAS_QUITAR = 3
+
+
+def _alternar_pagamento(saldo_id):
+    """
+    Alterna o status do saldo e grava o retrato corrigido com a versão nova do
+    relatório (invalida as cópias dos navegadores). O fechamento só é alterado
+    por um UPDATE condicional à versão lida, que funciona em qualquer banco
+    (o SQLite padrão ignora FOR UPDATE): se outro pedido o alterou antes, nada
+    muda e retorna None. Não faz commit. Retorna o saldo alterado.
+    """
+    saldo = SaldoMensal.query.filter_by(id=saldo_id).populate_existing().one()
+    fechamento = FechamentoMensal.query.filter_by(id=saldo.fechamento_id).populate_existing().one()
+    novo_status = 'quitado' if saldo.status_pagamento == 'pendente' else 'pendente'
+    alterado = db.session.execute(
+        update(FechamentoMensal)
+        .where(FechamentoMensal.id == fechamento.id, FechamentoMensal.versao == fechamento.versao)
+        .values(versao=(fechamento.versao or 1) + 1, atualizado_em=datetime.utcnow(),
+                relatorio=relatorio.relatorio_com_status(fechamento.relatorio, saldo.id, novo_status))
+    ).rowcount
+    if not alterado:
+        return None
+    saldo.status_pagamento = novo_status
+    return saldo
+
+
+def _render_relatorio(fechamento):
+    # Totais e saldos vêm do retrato gravado no fechamento (nenhuma outra consulta)
+    dados = relatorio.relatorio_do_fechamento(fechamento)
 
     return render_template('relatorio.html',
                            fechamento=fechamento,
-                           saldos=saldos,
+                           relatorio=dados,
+                           saldos=dados['saldos'],
                            # Passando None ou um dict vazio, já que o template antigo pode esperar
                            valores_aluguel=None)
 
@@ -192,9 +284,18 @@ def ver_relatorio(fechamento_id):
 @financas_bp.route('/historico')
 @login_required
 def historico_financeiro():
-    fechamentos = FechamentoMensal.query.filter_by(status='fechado') \
-                                 .order_by(FechamentoMensal.ano.desc(), FechamentoMensal.mes.desc()).all()
-    return render_template('historico_financeiro.html', fechamentos=fechamentos)
+    # Paginado por cursor (ano, mês): cada página lê só os seus meses pelo índice
+    cursor = ler_cursor(request.args.get('antes'), 2)
+    query = FechamentoMensal.query.filter_by(status='fechado')
+    if cursor:
+        query = query.filter(antes_de((FechamentoMensal.ano, FechamentoMensal.mes), cursor))
+    fechamentos = query.order_by(FechamentoMensal.ano.desc(), FechamentoMensal.mes.desc()) \
+                       .limit(MESES_POR_PAGINA_HISTORICO + 1).all()
+    tem_mais = len(fechamentos) > MESES_POR_PAGINA_HISTORICO
+    fechamentos = fechamentos[:MESES_POR_PAGINA_HISTORICO]
+    proximo_cursor = montar_cursor((fechamentos[-1].ano, fechamentos[-1].mes)) if tem_mais else None
+    return render_template('historico_financeiro.html', fechamentos=fechamentos,
+                           proximo_cursor=proximo_cursor, cursor=request.args.get('antes'))
 
 @financas_bp.route('/quitar_saldo/<int:saldo_id>', methods=['POST'])
 @login_required
@@ -202,59 +303,20 @@ def quitar_saldo(saldo_id):
     if not current_user.is_gerenciador(): abort(403)
     saldo = SaldoMensal.query.get_or_404(saldo_id)
     try:
-        if saldo.status_pagamento == 'pendente':
-            saldo.status_pagamento = 'quitado'
-            flash(f'Saldo de {saldo.usuario.username} marcado como quitado!', 'success')
+        for _ in range(TENTATIVAS_QUITAR):
+            alterado = _alternar_pagamento(saldo_id)
+            if alterado:
+                break
+            db.session.rollback()  # Outro clique mudou o fechamento: relê e tenta de novo
+        if not alterado:
+            flash('O relatório foi alterado ao mesmo tempo por outro pedido. Tente de novo.', 'warning')
         else:
-            saldo.status_pagamento = 'pendente'
-            flash(f'Saldo de {saldo.usuario.username} marcado como pendente!', 'warning')
-        db.session.commit()
+            db.session.commit()
+            if alterado.status_pagamento == 'quitado':
+                flash(f'Saldo de {alterado.usuario.username} marcado como quitado!', 'success')
+            else:
+                flash(f'Saldo de {alterado.usuario.username} marcado como pendente!', 'warning')
     except Exception as e:
         db.session.rollback()
         flash(f'Erro ao atualizar status do saldo: {e}', 'danger')
     return redirect(url_for('financas.ver_relatorio', fechamento_id=saldo.fechamento_id))
-
-# --- ROTAS DE GRÁFICOS ---
-@financas_bp.route('/graficos')
-@login_required
-def dashboard_graficos():
-    hoje = datetime.utcnow()
-    # Pega mês/ano do request ou usa o atual
-    mes_filtro = request.args.get('mes', default=hoje.month, type=int)
-    ano_filtro = request.args.get('ano', default=hoje.year, type=int)
-
-    # Gráfico de Pizza: Gastos Variáveis por Categoria no mês filtrado
-    gastos_variaveis_categoria = db.session.query(
-        Lancamento.categoria, func.sum(Lancamento.valor)
-    ).filter(
-        Lancamento.mes_referencia == mes_filtro,
-        Lancamento.ano_referencia == ano_filtro,
-    ).group_by(Lancamento.categoria).all()
-
-    dados_categoria_variavel = {
-        'labels': [c[0] if c[0] else 'Sem Categoria' for c in gastos_variaveis_categoria],
-        'data': [float(c[1]) if c[1] else 0.0 for c in gastos_variaveis_categoria]
-    }
-
-    # Gráfico de Barras: Gasto Total Real (Fixo Outros + Variável Casa + Aluguel Pago) por Mês (Histórico)
-    gasto_total_real_mes = db.session.query(
-        FechamentoMensal.ano, FechamentoMensal.mes,
-        (FechamentoMensal.total_fixo + FechamentoMensal.total_variavel + FechamentoMensal.total_aluguel_mes).label('gasto_real')
-    ).filter_by(status='fechado').order_by(FechamentoMensal.ano, FechamentoMensal.mes).all()
-
-    dados_historico_total = {
-        'labels': [f"{m[1]:02d}/{m[0]}" for m in gasto_total_real_mes],
-        'data': [float(m[2]) if m[2] else 0.0 for m in gasto_total_real_mes]
-    }
-
-    # Pega meses/anos que têm dados fechados para o dropdown do filtro
-    meses_com_dados_fechados = db.session.query(
-        FechamentoMensal.ano, FechamentoMensal.mes
-    ).filter_by(status='fechado').distinct().order_by(FechamentoMensal.ano.desc(), FechamentoMensal.mes.desc()).all()
-
-    return render_template('dashboard_graficos.html',
-                           dados_categoria=dados_categoria_variavel,
-                           dados_historico=dados_historico_total,
-                           mes_filtro=mes_filtro,
-                           ano_filtro=ano_filtro,
-                           meses_com_dados=meses_com_dados_fechados)
\ No newline at end of file
@@ -0,0 +1,138 @@
+# app/financas/routes_graficos.py
+# Relatórios de gastos (gráficos).
+#
+# A página é só o formulário e as tabelas vazias; os dados vêm depois, por
+# fetch, dos endpoints JSON abaixo. Eles leem a série mensal pré-agregada
+# (ver series.py) e ficam no mesmo cache (por versão dos dados) dos painéis.
+#
+# Intervalo: 'de' e 'ate' no formato AAAA-MM, inclusivos. Sem o parâmetro,
+# valem os últimos MESES_PADRAO meses; vazio, o intervalo fica sem limite.
+
+from datetime import datetime
+
+from flask import render_template, request, abort, jsonify
+from flask_login import login_required, current_user
+
+from . import financas_bp, series
+from .cache import pagina_em_cache
+from ..models import User
+from ..paginacao import ler_cursor
+
+MESES_PADRAO = 12
+
+
+# --- INTERVALO ---
+def _somar_meses(ano_mes, meses):
+    indice = ano_mes[0] * 12 + ano_mes[1] - 1 + meses
+    return indice // 12, indice % 12 + 1
+
+
+def _ler_mes(nome, padrao):
+    if nome not in request.args:
+        return padrao
+    valor = request.args[nome]
+    if not valor:
+        return None
+    ano_mes = ler_cursor(valor, 2)
+    if ano_mes is None or not 1 <= ano_mes[1] <= 12:
+        abort(400)
+    return ano_mes
+
+
+def intervalo_pedido():
+    """(de, ate) do request: tuplas (ano, mês) ou None (sem limite)."""
+    hoje = datetime.utcnow()
+    ate = _ler_mes('ate', (hoje.year, hoje.month))
+    de = _ler_mes('de', _somar_meses(ate or (hoje.year, hoje.month), -(MESES_PADRAO - 1)))
+    return de, ate
+
+
+def _rotulo(ano, mes):
+    return f'{mes:02d}/{ano}'
+
+
+def _formatar_mes(ano_mes):
+    return f'{ano_mes[0]:04d}-{ano_mes[1]:02d}' if ano_mes else ''
+
+
+def _resposta_json(dados):
+    resposta = jsonify(dados)
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    return resposta
+
+
+# --- PÁGINA ---
+@financas_bp.route('/graficos')
+@login_required
+def dashboard_graficos():
+    de, ate = intervalo_pedido()
+    return render_template('dashboard_graficos.html',
+                           de=_formatar_mes(de), ate=_formatar_mes(ate),
+                           comparar=bool(request.args.get('comparar')))
+
+
+# --- DADOS (JSON) ---
+@financas_bp.route('/graficos/categorias.json')
+@login_required
+def grafico_categorias():
+    """Gastos variáveis por categoria no intervalo."""
+    de, ate = intervalo_pedido()
+
+    def gerar():
+        linhas = series.consulta_por_categoria(de, ate).all()
+        return {'de': _formatar_mes(de), 'ate': _formatar_mes(ate),
+                'labels': [categoria for categoria, _ in linhas],
+                'data': [round(total or 0.0, 2) for _, total in linhas]}
+
+    return _resposta_json(pagina_em_cache('grafico_categorias', de, ate, gerar=gerar))
+
+
+@financas_bp.route('/graficos/historico.json')
+@login_required
+def grafico_historico():
+    """
+    Gasto total (despesas fixas + aluguel + lançamentos) de cada mês fechado
+    no intervalo. Com comparar=1, inclui o mesmo mês do ano anterior.
+    """
+    de, ate = intervalo_pedido()
+    comparar = bool(request.args.get('comparar'))
+
+    def gerar():
+        inicio = _somar_meses(de, -12) if comparar and de else de
+        totais = {(ano, mes): round(total or 0.0, 2)
+                  for ano, mes, total in series.consulta_por_mes_fechado(inicio, ate).all()}
+        meses = [ano_mes for ano_mes in sorted(totais) if not de or ano_mes >= de]
+        dados = {'de': _formatar_mes(de), 'ate': _formatar_mes(ate),
+                 'labels': [_rotulo(*ano_mes) for ano_mes in meses],
+                 'data': [totais[ano_mes] for ano_mes in meses]}
+        if comparar:
+            dados['ano_anterior'] = [totais.get(_somar_meses(ano_mes, -12)) for ano_mes in meses]
+        return dados
+
+    return _resposta_json(pagina_em_cache('grafico_historico', de, ate, comparar, gerar=gerar))
+
+
+@financas_bp.route('/graficos/moradores.json')
+@login_required
+def grafico_moradores():
+    """Total lançado por morador em cada mês do intervalo (morador comum: só a própria série)."""
+    de, ate = intervalo_pedido()
+
+    def gerar():
+        user_id = None if current_user.is_gerenciador() else current_user.id
+        linhas = series.consulta_por_morador(de, ate, user_id=user_id).all()
+        meses = sorted({(ano, mes) for _, ano, mes, _ in linhas})
+        posicao = {ano_mes: i for i, ano_mes in enumerate(meses)}
+        valores = {}
+        for morador_id, ano, mes, total in linhas:
+            valores.setdefault(morador_id, [0.0] * len(meses))[posicao[(ano, mes)]] = round(total or 0.0, 2)
+        nomes = dict(User.query.with_entities(User.id, User.username)
+                     .filter(User.id.in_(list(valores))).all()) if valores else {}
+        return {'de': _formatar_mes(de), 'ate': _formatar_mes(ate),
+                'labels': [_rotulo(*ano_mes) for ano_mes in meses],
+                'series': [{'user_id': morador_id, 'username': nomes.get(morador_id, f'#{morador_id}'),
+                            'data': valores[morador_id]}
+                           for morador_id in sorted(valores, key=lambda i: nomes.get(i, ''))]}
+
+    return _resposta_json(pagina_em_cache('grafico_moradores', de, ate, gerar=gerar))
@@ -0,0 +1,103 @@
+# app/financas/routes_importacao.py
+
+import io
+
+from flask import render_template, redirect, url_for, request, flash, abort
+from flask_login import login_required, current_user
+
+from . import financas_bp
+from . import importacao
+from ..models import db, User, RegraCategoria
+
+ENCODINGS_VALIDOS = ['utf-8-sig', 'latin-1']
+
+
+# --- IMPORTAÇÃO DE EXTRATO (CSV / OFX) ---
+@financas_bp.route('/importar', methods=['GET', 'POST'])
+@login_required
+def importar_extrato():
+    if not current_user.is_gerenciador(): abort(403)
+    categorias_validas = ['Mercado', 'Contas', 'Lazer', 'Manutenção', 'Parcelado', 'Outros']
+    usuarios_moradores = User.query.filter(User.cargo != 'admin').order_by(User.username).all()
+
+    if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if not arquivo or not arquivo.filename:
+            flash('Selecione um arquivo CSV ou OFX.', 'danger')
+            return redirect(url_for('financas.importar_extrato'))
+
+        encoding = request.form.get('encoding', 'utf-8-sig')
+        if encoding not in ENCODINGS_VALIDOS:
+            encoding = 'utf-8-sig'
+        pagador = request.form.get('pagador', 'casa')
+        user_id = None
+        if pagador != 'casa':
+            try:
+                user_id = int(pagador)
+            except ValueError:
+                user_id = 0
+            user_destino = User.query.get(user_id)
+            if not user_destino or user_destino.cargo == 'admin':
+                flash('Pagador selecionado é inválido.', 'danger')
+                return redirect(url_for('financas.importar_extrato'))
+        despesas_negativas = request.form.get('sinal', 'negativo') == 'negativo'
+
+        # O upload é lido direto do stream (sem carregar o arquivo na memória)
+        texto = io.TextIOWrapper(arquivo.stream, encoding=encoding, errors='replace', newline='')
+        leitor = importacao.leitor_por_nome(arquivo.filename)
+        try:
+            resumo = importacao.importar_extrato(leitor(texto), user_id=user_id,
+                                                 despesas_negativas=despesas_negativas)
+        except ValueError as e:
+            db.session.rollback()
+            flash(f'Não foi possível ler o arquivo: {e}', 'danger')
+            return redirect(url_for('financas.importar_extrato'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Erro ao importar (os lotes anteriores ao erro foram salvos; reimportar é seguro): {e}', 'danger')
+            return redirect(url_for('financas.importar_extrato'))
+
+        flash(f"Importação concluída: {resumo['importadas']} lançamento(s) novo(s), "
+              f"{resumo['duplicadas']} já existente(s), {resumo['ignoradas']} crédito(s) ignorado(s), "
+              f"{resumo['mes_fechado']} de mês fechado, {resumo['invalidas']} linha(s) inválida(s).",
+              'success' if resumo['importadas'] else 'info')
+        return redirect(url_for('financas.importar_extrato'))
+
+    regras = RegraCategoria.query.order_by(RegraCategoria.prioridade, RegraCategoria.id).all()
+    return render_template('importar_extrato.html',
+                           regras=regras,
+                           categorias=categorias_validas,
+                           usuarios_moradores=usuarios_moradores)
+
+
+# --- REGRAS DE CATEGORIA ---
+@financas_bp.route('/importar/regras/adicionar', methods=['POST'])
+@login_required
+def adicionar_regra_categoria():
+    if not current_user.is_gerenciador(): abort(403)
+    padrao = (request.form.get('padrao') or '').strip()
+    categoria = (request.form.get('categoria') or '').strip()
+    if not padrao or not categoria:
+        flash('Texto e Categoria são obrigatórios.', 'danger')
+        return redirect(url_for('financas.importar_extrato'))
+    try:
+        prioridade = int(request.form.get('prioridade') or 100)
+    except ValueError:
+        flash('Prioridade inválida.', 'danger')
+        return redirect(url_for('financas.importar_extrato'))
+
+    db.session.add(RegraCategoria(padrao=padrao[:100], categoria=categoria[:50], prioridade=prioridade))
+    db.session.commit()
+    flash(f'Regra "{padrao}" -> {categoria} adicionada.', 'success')
+    return redirect(url_for('financas.importar_extrato'))
+
+
+@financas_bp.route('/importar/regras/deletar/<int:regra_id>', methods=['POST'])
+@login_required
+def deletar_regra_categoria(regra_id):
+    if not current_user.is_gerenciador(): abort(403)
+    regra = RegraCategoria.query.get_or_404(regra_id)
+    db.session.delete(regra)
+    db.session.commit()
+    flash(f'Regra "{regra.padrao}" removida.', 'success')
+    return redirect(url_for('financas.importar_extrato'))
@@ -1,16 +1,146 @@
 # app/financas/routes_lancamentos.py
 
+import math
 import uuid
 from dateutil.relativedelta import relativedelta
-from flask import render_template, redirect, url_for, request, flash, abort
+from flask import render_template, redirect, url_for, request, flash, abort, jsonify
 from flask_login import login_required, current_user
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.exc import IntegrityError
 
 # 1. Importa o Blueprint do __init__.py desta pasta
 from . import financas_bp
 
 # 2. Importa os modelos e o db subindo um nível
-from ..models import db, User, Lancamento, FechamentoMensal
+from ..models import db, User, Lancamento, FechamentoMensal, GastoIdempotencia
+from ..paginacao import ler_cursor, montar_cursor, antes_de, depois_de
+
+LANCAMENTOS_POR_PAGINA = 50
+
+# Máximo de gastos aceitos numa sincronização da fila offline
+MAX_GASTOS_POR_LOTE = 100
+
+# Máximo de parcelas de um gasto (formulário ou fila offline)
+MAX_PARCELAS = 48
+
+# Quanto tempo um gasto pode ficar na fila offline: datas mais antigas (ou
+# no futuro, relógio do aparelho errado) são trazidas para dentro da janela
+MAX_DIAS_FILA_OFFLINE = 45
+
+# --- VALIDAÇÃO E CRIAÇÃO DE GASTOS (FORMULÁRIO E FILA OFFLINE) ---
+def validar_gasto(dados, usuario):
+    """
+    Valida os campos de um gasto (formulário ou item da fila offline).
+    Retorna (descricao, valor_total, categoria, num_parcelas, user_id do pagador)
+    ou lança ValueError com a mensagem para o usuário.
+    """
+    descricao = dados.get('descricao')
+    valor_total_str = dados.get('valor')
+    categoria = dados.get('categoria', 'Outros')
+    num_parcelas_str = dados.get('num_parcelas', '1')
+
+    if not descricao or not valor_total_str:
+        raise ValueError('Descrição e Valor são obrigatórios.')
+    # Itens da fila offline chegam como JSON: só texto vai para o banco
+    if not isinstance(descricao, str) or not isinstance(categoria, str):
+        raise ValueError('Descrição ou Categoria inválida.')
+    try:
+        valor_total = float(str(valor_total_str).replace(',', '.'))
+        num_parcelas = int(num_parcelas_str) if num_parcelas_str else 1
+    except (TypeError, ValueError):
+        raise ValueError('Valor ou Número de Parcelas inválido.')
+    if not math.isfinite(valor_total): # float() aceita 'nan', 'inf' e '1e309'
+        raise ValueError('Valor inválido.')
+    if valor_total <= 0:
+        raise ValueError('O valor do gasto deve ser positivo.')
+    if num_parcelas < 1:
+        num_parcelas = 1 # Corrige se for menor que 1
+    if num_parcelas > MAX_PARCELAS:
+        raise ValueError(f'O gasto pode ter no máximo {MAX_PARCELAS} parcelas.')
+
+    # Lógica do Pagador (quem recebe o crédito)
+    if not usuario.is_gerenciador(): # Usuário normal só lança em nome próprio
+        return descricao, valor_total, categoria, num_parcelas, usuario.id
+    pagador_selecionado = str(dados.get('pagador', 'casa'))
+    if pagador_selecionado == 'casa':
+        return descricao, valor_total, categoria, num_parcelas, None
+    try:
+        lancamento_user_id = int(pagador_selecionado)
+    except (TypeError, ValueError):
+        raise ValueError('Seleção de pagador inválida.')
+    user_destino = User.query.get(lancamento_user_id)
+    if not user_destino or user_destino.cargo == 'admin':
+        raise ValueError('Pagador selecionado é inválido.')
+    return descricao, valor_total, categoria, num_parcelas, lancamento_user_id
+
+
+def montar_lancamentos(descricao, valor_total, categoria, num_parcelas, lancamento_user_id, hoje):
+    """Um Lancamento por parcela (não adiciona à sessão)."""
+    valor_parcela_base = round(valor_total / num_parcelas, 2)
+    diferenca_total = round(valor_total - (valor_parcela_base * num_parcelas), 2)
+    parcelamento_uuid = str(uuid.uuid4()) if num_parcelas > 1 else None
+    lancamentos = []
+    for i in range(num_parcelas):
+        parcela_num = i + 1
+        data_referencia = hoje + relativedelta(months=i)
+        valor_desta_parcela = valor_parcela_base
+        # Ajusta a última parcela para compensar arredondamento
+        if parcela_num == num_parcelas:
+            valor_desta_parcela = round(valor_parcela_base + diferenca_total, 2)
+
+        desc_parcela = descricao
+        if num_parcelas > 1:
+            desc_parcela = f"{descricao} ({parcela_num}/{num_parcelas})"
+
+        lancamentos.append(Lancamento(
+            descricao=desc_parcela,
+            valor=valor_desta_parcela,
+            categoria=categoria,
+            data=hoje,
+            mes_referencia=data_referencia.month,
+            ano_referencia=data_referencia.year,
+            user_id=lancamento_user_id, # ID do pagador
+            parcelamento_id=parcelamento_uuid,
+            parcela_atual=parcela_num if num_parcelas > 1 else None,
+            parcela_total=num_parcelas if num_parcelas > 1 else None,
+            valor_total_compra=valor_total if num_parcelas > 1 else None
+        ))
+    return lancamentos
+
+
+def data_do_gasto_offline(valor, agora):
+    """
+    Data (UTC, sem fuso) em que o gasto foi guardado no aparelho, a partir do
+    ISO 8601 enviado pela fila. Sem data ou inválida: 'agora'. Fica sempre
+    entre MAX_DIAS_FILA_OFFLINE dias atrás e 'agora'.
+    """
+    try:
+        data = datetime.fromisoformat(str(valor))
+    except ValueError:
+        return agora
+    if data.tzinfo is not None:
+        data = data.astimezone(timezone.utc).replace(tzinfo=None)
+    return max(agora - timedelta(days=MAX_DIAS_FILA_OFFLINE), min(data, agora))
+
+
+def _meses_fechados_desde(data):
+    """{(ano, mes)} dos meses fechados a partir do mês de 'data' (uma consulta)."""
+    colunas = (FechamentoMensal.ano, FechamentoMensal.mes)
+    return set(db.session.query(*colunas).filter(
+        FechamentoMensal.status == 'fechado', depois_de(colunas, (data.year, data.month), inclusive=True)
+    ))
+
+
+def _chaves_registradas(user_id, chaves):
+    """Quais das 'chaves' já foram usadas por este usuário (uma consulta pelo índice)."""
+    if not chaves:
+        return set()
+    linhas = db.session.query(GastoIdempotencia.chave).filter(
+        GastoIdempotencia.user_id == user_id,
+        GastoIdempotencia.chave.in_(chaves)
+    ).all()
+    return {chave for (chave,) in linhas}
+
 
 # --- ROTA PARA ADICIONAR GASTO ---
 @financas_bp.route('/adicionar_gasto', methods=['GET', 'POST'])
@@ -36,93 +166,44 @@ def adicionar_gasto():
         # Pega os dados do formulário
         descricao = request.form.get('descricao')
         valor_total_str = request.form.get('valor')
-        categoria = request.form.get('categoria', 'Outros')
         num_parcelas_str = request.form.get('num_parcelas', '1')
         pagador_selecionado = request.form.get('pagador', 'casa')
+        # Gerada pela página ao abrir o formulário (ver static/fila_offline.js)
+        chave = (request.form.get('chave_idempotencia') or '').strip()[:64]
 
-        # Validação: Descrição e Valor
-        if not descricao or not valor_total_str:
-            print("!!! Erro de Validação: Descrição ou Valor ausentes.")
-            flash('Descrição e Valor são obrigatórios.', 'danger')
-            return render_template('adicionar_gasto.html', categorias=categorias_validas, usuarios_moradores=usuarios_moradores, descricao=descricao, valor=valor_total_str, num_parcelas=num_parcelas_str, pagador_selecionado=pagador_selecionado)
-
-        # Validação: Conversão de Valor e Parcelas
+        # Validação: Descrição, Valor, Parcelas e Pagador
         try:
-            valor_total = float(valor_total_str.replace(',', '.'))
-            num_parcelas = int(num_parcelas_str) if num_parcelas_str else 1
-            if valor_total <= 0:
-                  print("!!! Erro de Validação: Valor não positivo.")
-                  flash('O valor do gasto deve ser positivo.', 'danger')
-                  return render_template('adicionar_gasto.html', categorias=categorias_validas, usuarios_moradores=usuarios_moradores, descricao=descricao, valor=valor_total_str, num_parcelas=num_parcelas_str, pagador_selecionado=pagador_selecionado)
-            if num_parcelas < 1:
-                  num_parcelas = 1 # Corrige se for menor que 1
-        except ValueError:
-            print("!!! Erro de Validação: ValueError ao converter valor/parcelas.")
-            flash('Valor ou Número de Parcelas inválido.', 'danger')
+            descricao, valor_total, categoria, num_parcelas, lancamento_user_id = \
+                validar_gasto(request.form, current_user)
+        except ValueError as e:
+            print(f"!!! Erro de Validação: {e}")
+            flash(str(e), 'danger')
             return render_template('adicionar_gasto.html', categorias=categorias_validas, usuarios_moradores=usuarios_moradores, descricao=descricao, valor=valor_total_str, num_parcelas=num_parcelas_str, pagador_selecionado=pagador_selecionado)
 
-        # Lógica do Pagador (quem recebe o crédito)
-        lancamento_user_id = None
-        if current_user.is_gerenciador():
-            if pagador_selecionado == 'casa':
-                lancamento_user_id = None
-            else:
-                try:
-                    lancamento_user_id = int(pagador_selecionado)
-                    user_destino = User.query.get(lancamento_user_id)
-                    if not user_destino or user_destino.cargo == 'admin':
-                        print("!!! Erro de Validação: Pagador selecionado inválido (não encontrado ou admin).")
-                        flash('Pagador selecionado é inválido.', 'danger')
-                        return render_template('adicionar_gasto.html', categorias=categorias_validas, usuarios_moradores=usuarios_moradores, descricao=descricao, valor=valor_total_str, num_parcelas=num_parcelas_str, pagador_selecionado=pagador_selecionado)
-                except ValueError:
-                    print("!!! Erro de Validação: ValueError ao converter ID do pagador.")
-                    flash('Seleção de pagador inválida.', 'danger')
-                    return render_template('adicionar_gasto.html', categorias=categorias_validas, usuarios_moradores=usuarios_moradores, descricao=descricao, valor=valor_total_str, num_parcelas=num_parcelas_str, pagador_selecionado=pagador_selecionado)
-        else: # Usuário normal só lança em nome próprio
-            lancamento_user_id = current_user.id
-
-        # Lógica de Parcelamento e Criação dos Lançamentos
-        hoje = datetime.utcnow()
-        valor_parcela_base = round(valor_total / num_parcelas, 2)
-        diferenca_total = round(valor_total - (valor_parcela_base * num_parcelas), 2)
-        parcelamento_uuid = str(uuid.uuid4()) if num_parcelas > 1 else None
-        lancamentos_a_criar = []
+        # Reenvio do mesmo formulário (clique duplo, rede instável): não duplica o gasto
+        if chave and _chaves_registradas(current_user.id, [chave]):
+            flash('Este gasto já havia sido registrado.', 'info')
+            if current_user.is_gerenciador():
+                return redirect(url_for('financas.dashboard_tesoureiro'))
+            return redirect(url_for('financas.dashboard_usuario'))
 
         try:
-            for i in range(num_parcelas):
-                parcela_num = i + 1
-                data_referencia = hoje + relativedelta(months=i)
-                valor_desta_parcela = valor_parcela_base
-                # Ajusta a última parcela para compensar arredondamento
-                if parcela_num == num_parcelas:
-                    valor_desta_parcela = round(valor_parcela_base + diferenca_total, 2)
-
-                desc_parcela = descricao
-                if num_parcelas > 1:
-                    desc_parcela = f"{descricao} ({parcela_num}/{num_parcelas})"
-
-                novo_lancamento = Lancamento(
-                    descricao=desc_parcela,
-                    valor=valor_desta_parcela,
-                    categoria=categoria,
-                    data=hoje,
-                    mes_referencia=data_referencia.month,
-                    ano_referencia=data_referencia.year,
-                    user_id=lancamento_user_id, # ID do pagador
-                    parcelamento_id=parcelamento_uuid,
-                    parcela_atual=parcela_num if num_parcelas > 1 else None,
-                    parcela_total=num_parcelas if num_parcelas > 1 else None,
-                    valor_total_compra=valor_total if num_parcelas > 1 else None
-                )
-                lancamentos_a_criar.append(novo_lancamento)
+            lancamentos_a_criar = montar_lancamentos(descricao, valor_total, categoria, num_parcelas,
+                                                     lancamento_user_id, datetime.utcnow())
 
             # Salva no Banco de Dados
             print("--- Preparando para salvar no banco ---")
             db.session.add_all(lancamentos_a_criar)
+            if chave:
+                db.session.add(GastoIdempotencia(user_id=current_user.id, chave=chave))
             db.session.commit()
             print("--- Salvo no banco com sucesso! ---")
             flash(f'Gasto {"parcelado " if num_parcelas > 1 else ""}adicionado com sucesso!', 'success')
 
+        except IntegrityError:
+            # Um envio concorrente com a mesma chave foi salvo primeiro
+            db.session.rollback()
+            flash('Este gasto já havia sido registrado.', 'info')
         except Exception as e:
             db.session.rollback()
             print(f"!!! Erro ao salvar no banco: {e}")
@@ -148,6 +229,76 @@ def adicionar_gasto():
     return render_template('adicionar_gasto.html',
                            categorias=categorias_validas,
                            usuarios_moradores=usuarios_moradores)
+
+
+# --- SINCRONIZAÇÃO DA FILA OFFLINE DO PWA ---
+@financas_bp.route('/adicionar_gasto/lote', methods=['POST'])
+@login_required
+def adicionar_gastos_em_lote():
+    """
+    Recebe de uma vez os gastos guardados offline pelo service worker:
+    {"gastos": [{"chave": ..., "usuario_id": ..., "descricao": ..., "valor": ...,
+                 "categoria": ..., "num_parcelas": ..., "pagador": ...,
+                 "registrado_em": ...}, ...]}
+    O gasto fica com a data em que foi guardado no aparelho (registrado_em,
+    ver data_do_gasto_offline), não com a da sincronização. Gastos guardados
+    por outro usuário no mesmo aparelho (usuario_id diferente) são recusados.
+    Uma consulta para as chaves já usadas, uma para os meses fechados e um
+    único commit para o lote. Cada item volta como 'criado', 'duplicado' ou
+    'erro' (dados inválidos ou mês já fechado).
+    """
+    dados = request.get_json(silent=True)
+    gastos = dados.get('gastos') if isinstance(dados, dict) else None
+    if not isinstance(gastos, list) or len(gastos) > MAX_GASTOS_POR_LOTE:
+        return jsonify({'erro': f'Envie uma lista "gastos" com até {MAX_GASTOS_POR_LOTE} itens.'}), 400
+
+    def _chave(gasto):
+        return str(gasto.get('chave') or '').strip()[:64] if isinstance(gasto, dict) else ''
+
+    ja_registradas = _chaves_registradas(current_user.id, [c for c in map(_chave, gastos) if c])
+    agora = datetime.utcnow()
+    meses_fechados = _meses_fechados_desde(agora - timedelta(days=MAX_DIAS_FILA_OFFLINE))
+    resultados = []
+    for gasto in gastos:
+        chave = _chave(gasto)
+        if not chave:
+            resultados.append({'chave': None, 'status': 'erro', 'mensagem': 'Gasto sem chave de idempotência.'})
+            continue
+        if str(gasto.get('usuario_id')) != str(current_user.id):
+            resultados.append({'chave': chave, 'status': 'erro',
+                               'mensagem': 'Gasto guardado por outro usuário neste aparelho.'})
+            continue
+        if chave in ja_registradas:
+            resultados.append({'chave': chave, 'status': 'duplicado'})
+            continue
+        try:
+            campos = validar_gasto(gasto, current_user)
+        except ValueError as e:
+            resultados.append({'chave': chave, 'status': 'erro', 'mensagem': str(e)})
+            continue
+        lancamentos = montar_lancamentos(*campos, data_do_gasto_offline(gasto.get('registrado_em'), agora))
+        fechado = next(((l.ano_referencia, l.mes_referencia) for l in lancamentos
+                        if (l.ano_referencia, l.mes_referencia) in meses_fechados), None)
+        if fechado:
+            # A chave não é gravada: o gasto pode ser lançado de novo no mês aberto
+            resultados.append({'chave': chave, 'status': 'erro',
+                               'mensagem': f'"{campos[0]}": o mês {fechado[1]:02d}/{fechado[0]} já foi fechado. '
+                                           'Lance o gasto de novo no mês atual.'})
+            continue
+        db.session.add_all(lancamentos)
+        db.session.add(GastoIdempotencia(user_id=current_user.id, chave=chave))
+        ja_registradas.add(chave)
+        resultados.append({'chave': chave, 'status': 'criado'})
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Outra sincronização com as mesmas chaves terminou antes; o cliente reenvia
+        db.session.rollback()
+        return jsonify({'erro': 'Conflito com outra sincronização. Tente novamente.'}), 409
+    return jsonify({'resultados': resultados})
+
+
 # --- ROTAS EDITAR/DELETAR LANCAMENTOS (ADICIONADAS) ---
 
 @financas_bp.route('/lancamento/editar/<int:lancamento_id>', methods=['GET', 'POST'])
@@ -266,4 +417,85 @@ def deletar_lancamento(lancamento_id):
     if current_user.is_gerenciador():
          return redirect(url_for('financas.dashboard_tesoureiro'))
     else:
-         return redirect(url_for('financas.dashboard_usuario'))
\ No newline at end of file
+         return redirect(url_for('financas.dashboard_usuario'))
+
+
+# --- NAVEGADOR DE LANÇAMENTOS (TODOS OS MESES) ---
+_CHAVE_LANCAMENTO = (Lancamento.ano_referencia, Lancamento.mes_referencia, Lancamento.id)
+
+def filtros_lancamentos(args):
+    """
+    Filtros do navegador de lançamentos (também usados na exportação).
+    Retorna (condições SQL, filtros preenchidos para repetir nos links).
+    """
+    de = args.get('de', '').strip()
+    ate = args.get('ate', '').strip()
+    categoria = args.get('categoria', '').strip()
+    pagador = args.get('pagador', '').strip()
+    parcelado = args.get('parcelado', '').strip()
+    categorias_validas = ['Mercado', 'Contas', 'Lazer', 'Manutenção', 'Parcelado', 'Outros']
+
+    filtros = []
+    if current_user.is_gerenciador():
+        if pagador == 'casa':
+            filtros.append(Lancamento.user_id.is_(None))
+        elif pagador.isdigit():
+            filtros.append(Lancamento.user_id == int(pagador))
+    else:
+        # Morador só vê os próprios lançamentos
+        filtros.append(Lancamento.user_id == current_user.id)
+
+    mes_inicial = ler_cursor(de, 2)
+    if mes_inicial:
+        filtros.append(depois_de(_CHAVE_LANCAMENTO[:2], mes_inicial, inclusive=True))
+    mes_final = ler_cursor(ate, 2)
+    if mes_final:
+        filtros.append(antes_de(_CHAVE_LANCAMENTO[:2], mes_final, inclusive=True))
+    if categoria in categorias_validas:
+        filtros.append(Lancamento.categoria == categoria)
+    if parcelado == 'sim':
+        filtros.append(Lancamento.parcelamento_id.isnot(None))
+    elif parcelado == 'nao':
+        filtros.append(Lancamento.parcelamento_id.is_(None))
+
+    filtros_url = {chave: valor for chave, valor in
+                   (('de', de), ('ate', ate), ('categoria', categoria),
+                    ('pagador', pagador), ('parcelado', parcelado)) if valor}
+    return filtros, filtros_url
+
+
+@financas_bp.route('/lancamentos')
+@login_required
+def navegar_lancamentos():
+    """
+    Lançamentos de qualquer mês, do mais recente para o mais antigo, paginados
+    por cursor (ano, mês, id). Os filtros de período e pagador entram na busca
+    pelo índice; cada página lê no máximo LANCAMENTOS_POR_PAGINA + 1 linhas.
+    """
+    categorias_validas = ['Mercado', 'Contas', 'Lazer', 'Manutenção', 'Parcelado', 'Outros']
+    filtros, filtros_url = filtros_lancamentos(request.args)
+    cursor = ler_cursor(request.args.get('antes'), 3)
+    usuarios_moradores = []
+    if current_user.is_gerenciador():
+        usuarios_moradores = User.query.filter(User.cargo != 'admin').order_by(User.username).all()
+    if cursor:
+        filtros.append(antes_de(_CHAVE_LANCAMENTO, cursor))
+
+    lancamentos = Lancamento.query.filter(*filtros) \
+        .order_by(Lancamento.ano_referencia.desc(), Lancamento.mes_referencia.desc(), Lancamento.id.desc()) \
+        .limit(LANCAMENTOS_POR_PAGINA + 1).all()
+    tem_mais = len(lancamentos) > LANCAMENTOS_POR_PAGINA
+    lancamentos = lancamentos[:LANCAMENTOS_POR_PAGINA]
+
+    proximo_cursor = None
+    if tem_mais:
+        ultimo = lancamentos[-1]
+        proximo_cursor = montar_cursor((ultimo.ano_referencia, ultimo.mes_referencia, ultimo.id))
+
+    return render_template('lancamentos.html',
+                           lancamentos=lancamentos,
+                           categorias=categorias_validas,
+                           usuarios_moradores=usuarios_moradores,
+                           filtros=filtros_url,
+                           proximo_cursor=proximo_cursor,
+                           cursor=request.args.get('antes'))
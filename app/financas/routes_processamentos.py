@@ -0,0 +1,64 @@
+# app/financas/routes_processamentos.py
+# Acompanhamento dos processamentos em segundo plano (fechar_mes, recálculo
+# do aluguel): página de progresso, status em JSON para o polling e, no fim,
+# a mensagem flash e o redirecionamento que a rota original faria.
+
+from flask import render_template, redirect, url_for, request, flash, abort, jsonify
+from flask_login import login_required, current_user
+
+from . import financas_bp, db
+from .. import processamentos
+from ..models import Processamento
+
+
+def resposta_enfileirado(processamento):
+    """202 com o id para quem pede JSON (fetch/PWA); senão, redireciona para a página de progresso."""
+    url = url_for('financas.acompanhar_processamento', processamento_id=processamento.id)
+    if request.accept_mimetypes.best == 'application/json':
+        resposta = jsonify({'id': processamento.id, 'status': processamento.status, 'acompanhar_url': url,
+                            'status_url': url_for('financas.status_processamento',
+                                                  processamento_id=processamento.id)})
+        resposta.status_code = 202
+        return resposta
+    return redirect(url)
+
+
+def _processamento_visivel(processamento_id):
+    processamento = Processamento.query.get_or_404(processamento_id)
+    if processamento.user_id != current_user.id and not current_user.is_gerenciador():
+        abort(403)
+    processamentos.expirar_se_abandonado(processamento)
+    return processamento
+
+
+@financas_bp.route('/processamentos/<int:processamento_id>')
+@login_required
+def acompanhar_processamento(processamento_id):
+    processamento = _processamento_visivel(processamento_id)
+    if processamento.status in processamentos.STATUS_ATIVOS:
+        return render_template('processamento.html', processamento=processamento)
+
+    resultado = processamentos.resultado(processamento)
+    if not processamento.notificado:
+        flash(resultado.get('mensagem') or 'Processamento concluído.', resultado.get('categoria', 'success'))
+        processamento.notificado = True
+        db.session.commit()
+    return redirect(url_for(resultado.get('destino') or 'financas.dashboard',
+                            **resultado.get('destino_parametros', {})))
+
+
+@financas_bp.route('/processamentos/<int:processamento_id>.json')
+@login_required
+def status_processamento(processamento_id):
+    processamento = _processamento_visivel(processamento_id)
+    resposta = jsonify({
+        'id': processamento.id,
+        'tipo': processamento.tipo,
+        'status': processamento.status,
+        'progresso': processamento.progresso,
+        'etapa': processamento.etapa,
+        'concluido': processamento.status not in processamentos.STATUS_ATIVOS,
+        'acompanhar_url': url_for('financas.acompanhar_processamento', processamento_id=processamento.id),
+    })
+    resposta.cache_control.no_store = True
+    return resposta
@@ -0,0 +1,183 @@
+# app/financas/series.py
+# Séries mensais dos gráficos (tabela 'gasto_mensal_categoria').
+#
+# Uma linha por (ano, mês, tipo, categoria):
+#   - 'variavel': lançamentos do mês por categoria, sem o pagador. Atualizada
+#     junto com os agregados (mesma transação do lançamento), então o mês
+#     aberto está sempre em dia;
+#   - 'fixo': aluguel e demais despesas fixas do mês, gravadas no fechamento
+#     e apagadas no reabrir_mes. Só os meses fechados têm essas linhas.
+#
+# Os gráficos leem só esta tabela (e os agregados, para a série por
+# morador): o custo de uma consulta depende de quantos meses o intervalo
+# tem, não de quantos lançamentos existem.
+
+from collections import defaultdict
+
+from sqlalchemy import case, func, insert, update
+
+from . import CHAVE_ALUGUEL
+from ..banco import insert_com_conflito
+from ..models import db, FechamentoMensal, GastoMensalCategoria, LancamentoAgregado
+from ..paginacao import antes_de, depois_de
+
+TIPO_VARIAVEL = 'variavel'
+TIPO_FIXO = 'fixo'
+
+# Categorias das linhas 'fixo' de um mês fechado
+CATEGORIA_ALUGUEL = CHAVE_ALUGUEL
+CATEGORIA_DESPESAS_FIXAS = 'Despesas fixas'
+
+# Colunas do índice único uq_gasto_mensal_categoria_chave (alvo do ON CONFLICT)
+_CHAVE_UNICA = [GastoMensalCategoria.ano, GastoMensalCategoria.mes,
+                GastoMensalCategoria.tipo, GastoMensalCategoria.categoria]
+
+
+# --- 1. MANUTENÇÃO ---
+def aplicar_deltas_variaveis(connection, deltas):
+    """
+    Soma na série os deltas dos agregados {(ano, mes, user_id, categoria):
+    [valor, quantidade]}, juntando os pagadores. Mesma conexão (e transação)
+    de agregados.aplicar_deltas.
+    """
+    por_categoria = defaultdict(lambda: [0.0, 0])
+    for (ano, mes, _, categoria), (valor, quantidade) in deltas.items():
+        delta = por_categoria[(ano, mes, categoria)]
+        delta[0] += valor
+        delta[1] += quantidade
+
+    for (ano, mes, categoria), (valor, quantidade) in por_categoria.items():
+        if not valor and not quantidade:
+            continue
+        insercao = insert_com_conflito(connection, GastoMensalCategoria)
+        if insercao is not None:
+            insercao = insercao.values(ano=ano, mes=mes, tipo=TIPO_VARIAVEL, categoria=categoria,
+                                       total=valor, quantidade=quantidade)
+            connection.execute(insercao.on_conflict_do_update(
+                index_elements=_CHAVE_UNICA,
+                set_={'total': GastoMensalCategoria.total + insercao.excluded.total,
+                      'quantidade': GastoMensalCategoria.quantidade + insercao.excluded.quantidade}
+            ))
+            continue
+        resultado = connection.execute(
+            update(GastoMensalCategoria)
+            .where(GastoMensalCategoria.ano == ano, GastoMensalCategoria.mes == mes,
+                   GastoMensalCategoria.tipo == TIPO_VARIAVEL, GastoMensalCategoria.categoria == categoria)
+            .values(total=GastoMensalCategoria.total + valor,
+                    quantidade=GastoMensalCategoria.quantidade + quantidade)
+        )
+        if resultado.rowcount == 0:
+            connection.execute(insert(GastoMensalCategoria).values(
+                ano=ano, mes=mes, tipo=TIPO_VARIAVEL, categoria=categoria, total=valor, quantidade=quantidade
+            ))
+
+
+def _linhas_fixas(fechamento):
+    # As duas linhas são gravadas mesmo com valor zero: marcam o mês como fechado
+    return [
+        {'ano': fechamento.ano, 'mes': fechamento.mes, 'tipo': TIPO_FIXO, 'categoria': CATEGORIA_ALUGUEL,
+         'total': fechamento.total_aluguel_mes, 'quantidade': 1},
+        {'ano': fechamento.ano, 'mes': fechamento.mes, 'tipo': TIPO_FIXO, 'categoria': CATEGORIA_DESPESAS_FIXAS,
+         'total': fechamento.total_fixo, 'quantidade': 1},
+    ]
+
+
+def registrar_fechamento(fechamento):
+    """Grava as linhas 'fixo' do mês fechado. Não faz commit."""
+    db.session.execute(insert(GastoMensalCategoria), _linhas_fixas(fechamento))
+
+
+def remover_fechamento(fechamento):
+    """Apaga as linhas 'fixo' do mês reaberto. Não faz commit."""
+    db.session.query(GastoMensalCategoria).filter(
+        GastoMensalCategoria.ano == fechamento.ano,
+        GastoMensalCategoria.mes == fechamento.mes,
+        GastoMensalCategoria.tipo == TIPO_FIXO,
+    ).delete(synchronize_session=False)
+
+
+# --- 2. RECONSTRUÇÃO E VERIFICAÇÃO DE DRIFT ---
+def _series_calculadas():
+    """A série recalculada dos agregados e dos fechamentos: {(ano, mes, tipo, categoria): (total, quantidade)}."""
+    variaveis = db.session.query(
+        LancamentoAgregado.ano_referencia, LancamentoAgregado.mes_referencia, LancamentoAgregado.categoria,
+        func.sum(LancamentoAgregado.total), func.sum(LancamentoAgregado.quantidade)
+    ).group_by(LancamentoAgregado.ano_referencia, LancamentoAgregado.mes_referencia,
+               LancamentoAgregado.categoria).all()
+    calculadas = {(a, m, TIPO_VARIAVEL, c): (t or 0.0, q) for a, m, c, t, q in variaveis if q}
+    for fechamento in FechamentoMensal.query.filter_by(status='fechado'):
+        for linha in _linhas_fixas(fechamento):
+            calculadas[(linha['ano'], linha['mes'], TIPO_FIXO, linha['categoria'])] = \
+                (linha['total'], linha['quantidade'])
+    return calculadas
+
+
+def verificar_drift(tolerancia):
+    """Compara a série armazenada com a recalculada. Retorna [(chave, armazenado, calculado)]."""
+    calculadas = _series_calculadas()
+    armazenadas = {(g.ano, g.mes, g.tipo, g.categoria): (g.total, g.quantidade)
+                   for g in GastoMensalCategoria.query.filter(GastoMensalCategoria.quantidade != 0)}
+
+    divergencias = []
+    for chave in set(calculadas) | set(armazenadas):
+        total_arm, qtd_arm = armazenadas.get(chave, (0.0, 0))
+        total_calc, qtd_calc = calculadas.get(chave, (0.0, 0))
+        if qtd_arm != qtd_calc or abs(total_arm - total_calc) > tolerancia:
+            divergencias.append((chave, (total_arm, qtd_arm), (total_calc, qtd_calc)))
+    return sorted(divergencias, key=lambda d: tuple(str(x) for x in d[0]))
+
+
+def reconstruir_series():
+    """Apaga e recria a série a partir dos agregados e dos fechamentos. Não faz commit."""
+    calculadas = _series_calculadas()
+    db.session.query(GastoMensalCategoria).delete(synchronize_session=False)
+    if calculadas:
+        db.session.execute(insert(GastoMensalCategoria), [
+            {'ano': a, 'mes': m, 'tipo': tipo, 'categoria': c, 'total': total, 'quantidade': quantidade}
+            for (a, m, tipo, c), (total, quantidade) in calculadas.items()
+        ])
+    return len(calculadas)
+
+
+# --- 3. CONSULTAS DOS GRÁFICOS ---
+# 'de' e 'ate' são tuplas (ano, mês), inclusivas; None = sem limite
+def _no_intervalo(colunas, de, ate):
+    filtros = []
+    if de:
+        filtros.append(depois_de(colunas, de, inclusive=True))
+    if ate:
+        filtros.append(antes_de(colunas, ate, inclusive=True))
+    return filtros
+
+
+def consulta_por_categoria(de, ate):
+    """Query de (categoria, total) dos lançamentos no intervalo, do maior para o menor."""
+    total = func.sum(GastoMensalCategoria.total)
+    return db.session.query(GastoMensalCategoria.categoria, total) \
+        .filter(GastoMensalCategoria.tipo == TIPO_VARIAVEL, GastoMensalCategoria.quantidade > 0,
+                *_no_intervalo((GastoMensalCategoria.ano, GastoMensalCategoria.mes), de, ate)) \
+        .group_by(GastoMensalCategoria.categoria) \
+        .order_by(total.desc())
+
+
+def consulta_por_mes_fechado(de, ate):
+    """Query de (ano, mes, total) dos meses fechados no intervalo: despesas fixas, aluguel e lançamentos."""
+    fechado = func.sum(case((GastoMensalCategoria.tipo == TIPO_FIXO, 1), else_=0)) > 0
+    return db.session.query(GastoMensalCategoria.ano, GastoMensalCategoria.mes,
+                            func.sum(GastoMensalCategoria.total)) \
+        .filter(*_no_intervalo((GastoMensalCategoria.ano, GastoMensalCategoria.mes), de, ate)) \
+        .group_by(GastoMensalCategoria.ano, GastoMensalCategoria.mes) \
+        .having(fechado) \
+        .order_by(GastoMensalCategoria.ano, GastoMensalCategoria.mes)
+
+
+def consulta_por_morador(de, ate, user_id=None):
+    """Query de (user_id, ano, mes, total) lançado por cada morador no intervalo (só de um, se 'user_id')."""
+    colunas_mes = (LancamentoAgregado.ano_referencia, LancamentoAgregado.mes_referencia)
+    query = db.session.query(LancamentoAgregado.user_id, *colunas_mes, func.sum(LancamentoAgregado.total)) \
+        .filter(LancamentoAgregado.user_id != None, LancamentoAgregado.quantidade > 0,
+                *_no_intervalo(colunas_mes, de, ate))
+    if user_id is not None:
+        query = query.filter(LancamentoAgregado.user_id == user_id)
+    return query.group_by(LancamentoAgregado.user_id, *colunas_mes) \
+        .order_by(LancamentoAgregado.user_id, *colunas_mes)
@@ -0,0 +1,225 @@
+# app/metricas.py
+# Métricas por requisição: latência por endpoint (histograma), quantidade e
+# tempo das consultas SQL e tempo de renderização dos templates.
+#
+# As consultas são medidas pelos eventos before/after_cursor_execute do
+# SQLAlchemy e os templates pelos sinais do Flask. Os números ficam na
+# memória deste processo (cada worker tem os seus) e são expostos em
+# /admin/metrics no formato texto do Prometheus. Requisições acima de
+# METRICAS_LENTA_MS vão para o log com o detalhamento.
+
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Limites (em segundos) dos baldes do histograma de latência
+BALDES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Limites dos baldes do histograma de consultas SQL por requisição
+BALDES_CONSULTAS = (1, 2, 5, 10, 20, 50, 100)
+
+PREFIXO = 'republica'
+
+
+class Histograma:
+    def __init__(self, baldes):
+        self.baldes = baldes
+        self.contagens = [0] * len(baldes)  # não cumulativas; acumuladas na exportação
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.baldes):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+        self.soma += valor
+        self.total += 1
+
+
+class RegistroMetricas:
+    """Contadores e histogramas por endpoint, seguros entre threads."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.limpar()
+
+    def limpar(self):
+        with self._trava:
+            self.latencia = defaultdict(lambda: Histograma(BALDES_LATENCIA))
+            self.consultas = defaultdict(lambda: Histograma(BALDES_CONSULTAS))
+            self.requisicoes = defaultdict(int)     # (endpoint, método, status) -> n
+            self.sql_segundos = defaultdict(float)  # endpoint -> s
+            self.template_segundos = defaultdict(float)
+            self.lentas = defaultdict(int)
+
+    def registrar(self, endpoint, metodo, status, duracao, n_sql, tempo_sql, tempo_templates, lenta):
+        with self._trava:
+            self.latencia[endpoint].observar(duracao)
+            self.consultas[endpoint].observar(n_sql)
+            self.requisicoes[(endpoint, metodo, status)] += 1
+            self.sql_segundos[endpoint] += tempo_sql
+            self.template_segundos[endpoint] += tempo_templates
+            if lenta:
+                self.lentas[endpoint] += 1
+
+    def copia(self):
+        with self._trava:
+            return {
+                'latencia': {e: (h.baldes, list(h.contagens), h.soma, h.total) for e, h in self.latencia.items()},
+                'consultas': {e: (h.baldes, list(h.contagens), h.soma, h.total) for e, h in self.consultas.items()},
+                'requisicoes': dict(self.requisicoes),
+                'sql_segundos': dict(self.sql_segundos),
+                'template_segundos': dict(self.template_segundos),
+                'lentas': dict(self.lentas),
+            }
+
+
+_registro = RegistroMetricas()
+
+
+# --- 1. COLETA ---
+def _medicao():
+    """Medição da requisição atual, ou None (CLI, requisições fora do app...)."""
+    if has_request_context():
+        return g.get('metricas')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metricas_inicio', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get('metricas_inicio')
+    if not inicios:
+        return
+    duracao = time.perf_counter() - inicios.pop()
+    medicao = _medicao()
+    if medicao is not None:
+        medicao['sql_n'] += 1
+        medicao['sql_t'] += duracao
+
+
+def _antes_template(app, template, context, **extra):
+    medicao = _medicao()
+    if medicao is not None:
+        medicao['templates'].append(time.perf_counter())
+
+
+def _depois_template(app, template, context, **extra):
+    medicao = _medicao()
+    if medicao is not None and medicao['templates']:
+        inicio = medicao['templates'].pop()
+        # Só o template mais externo soma (render_template dentro de render_template)
+        if not medicao['templates']:
+            medicao['tpl_t'] += time.perf_counter() - inicio
+
+
+def init_app(app):
+    if not app.config.get('METRICAS_ATIVAS', True):
+        return
+
+    before_render_template.connect(_antes_template, app)
+    template_rendered.connect(_depois_template, app)
+
+    @app.before_request
+    def _iniciar_medicao():
+        g.metricas = {'inicio': time.perf_counter(), 'sql_n': 0, 'sql_t': 0.0,
+                      'tpl_t': 0.0, 'templates': []}
+
+    @app.after_request
+    def _guardar_status(resposta):
+        g.metricas_status = resposta.status_code
+        return resposta
+
+    @app.teardown_request
+    def _registrar_medicao(exc):
+        medicao = g.pop('metricas', None)
+        if medicao is None:
+            return
+        duracao = time.perf_counter() - medicao['inicio']
+        endpoint = request.endpoint or 'sem_endpoint'
+        status = g.pop('metricas_status', 500)
+        limite = app.config['METRICAS_LENTA_MS'] / 1000
+        lenta = limite > 0 and duracao >= limite
+        _registro.registrar(endpoint, request.method, status, duracao,
+                            medicao['sql_n'], medicao['sql_t'], medicao['tpl_t'], lenta)
+        if lenta:
+            app.logger.warning(
+                'Requisição lenta: %s %s (%s) %d em %.0f ms; SQL: %d consulta(s) em %.0f ms; '
+                'templates: %.0f ms', request.method, request.full_path.rstrip('?'), endpoint, status,
+                duracao * 1000, medicao['sql_n'], medicao['sql_t'] * 1000, medicao['tpl_t'] * 1000)
+
+
+# --- 2. EXPORTAÇÃO (PROMETHEUS) ---
+def _rotulos(**rotulos):
+    if not rotulos:
+        return ''
+    partes = []
+    for nome, valor in rotulos.items():
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{nome}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _histograma(linhas, nome, ajuda, dados):
+    linhas.append(f'# HELP {nome} {ajuda}')
+    linhas.append(f'# TYPE {nome} histogram')
+    for endpoint in sorted(dados):
+        baldes, contagens, soma, total = dados[endpoint]
+        acumulado = 0
+        for limite, n in zip(baldes, contagens):
+            acumulado += n
+            linhas.append(f'{nome}_bucket{_rotulos(endpoint=endpoint, le=limite)} {acumulado}')
+        linhas.append(f'{nome}_bucket{_rotulos(endpoint=endpoint, le="+Inf")} {total}')
+        linhas.append(f'{nome}_sum{_rotulos(endpoint=endpoint)} {_numero(soma)}')
+        linhas.append(f'{nome}_count{_rotulos(endpoint=endpoint)} {total}')
+
+
+def _contador(linhas, nome, ajuda, valores, tipo='counter'):
+    """valores: lista de (dict de rótulos, valor)."""
+    linhas.append(f'# HELP {nome} {ajuda}')
+    linhas.append(f'# TYPE {nome} {tipo}')
+    for rotulos, valor in valores:
+        linhas.append(f'{nome}{_rotulos(**rotulos)} {_numero(valor)}')
+
+
+def exportar_prometheus(caches=None):
+    """
+    Texto no formato de exposição do Prometheus. 'caches' é um dict
+    {nome: estatisticas()} dos caches locais, exportados como contadores.
+    """
+    dados = _registro.copia()
+    linhas = []
+    _histograma(linhas, f'{PREFIXO}_requisicao_segundos',
+                'Latência das requisições por endpoint.', dados['latencia'])
+    _histograma(linhas, f'{PREFIXO}_sql_consultas_por_requisicao',
+                'Consultas SQL executadas por requisição.', dados['consultas'])
+    _contador(linhas, f'{PREFIXO}_requisicoes_total', 'Requisições por endpoint, método e status.',
+              [({'endpoint': e, 'metodo': m, 'status': s}, n)
+               for (e, m, s), n in sorted(dados['requisicoes'].items())])
+    _contador(linhas, f'{PREFIXO}_sql_segundos_total', 'Tempo total em consultas SQL por endpoint.',
+              [({'endpoint': e}, t) for e, t in sorted(dados['sql_segundos'].items())])
+    _contador(linhas, f'{PREFIXO}_template_segundos_total', 'Tempo total renderizando templates por endpoint.',
+              [({'endpoint': e}, t) for e, t in sorted(dados['template_segundos'].items())])
+    _contador(linhas, f'{PREFIXO}_requisicoes_lentas_total', 'Requisições acima de METRICAS_LENTA_MS.',
+              [({'endpoint': e}, n) for e, n in sorted(dados['lentas'].items())])
+
+    for nome, estatisticas in sorted((caches or {}).items()):
+        _contador(linhas, f'{PREFIXO}_cache_{nome}_acertos_total', f'Acertos do cache de {nome}.',
+                  [({}, estatisticas['acertos'])])
+        _contador(linhas, f'{PREFIXO}_cache_{nome}_falhas_total', f'Falhas do cache de {nome}.',
+                  [({}, estatisticas['falhas'])])
+        _contador(linhas, f'{PREFIXO}_cache_{nome}_itens', f'Itens no cache de {nome}.',
+                  [({}, estatisticas['itens'])], tipo='gauge')
+    return '\n'.join(linhas) + '\n'
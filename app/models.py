@@ -2,11 +2,12 @@
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import uuid # Para gerar IDs de parcelamento
+from . import senhas # Hash de senha configurável (SENHA_HASH_METODO)
+from .banco import SessaoRoteada # Leituras no motor somente leitura (perfil de produção do SQLite)
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 
 class User(UserMixin, db.Model):
     __tablename__ = 'usuarios'
@@ -20,6 +21,11 @@ class User(UserMixin, db.Model):
     # A lógica em financas.py espera 'individual' ou 'compartilhado' (lowercase)
     tipo_quarto = db.Column(db.String(50), nullable=False, default='compartilhado')
 
+    # --- POSIÇÃO NA ROTAÇÃO DA ESCALA ---
+    # Nulo = não participa da escala. Ver app/rotacao.py
+    ordem_original = db.Column(db.Integer, nullable=True)
+    ordem_invertido = db.Column(db.Integer, nullable=True)
+
     # --- RELACIONAMENTOS FINANCEIROS (ATUALIZADOS) ---
     # Um usuário faz vários lançamentos (quem pagou)
     lancamentos = db.relationship('Lancamento', backref='autor', lazy=True, foreign_keys='Lancamento.user_id')
@@ -35,10 +41,14 @@ class User(UserMixin, db.Model):
 
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = senhas.gerar_hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return senhas.verificar(self.password_hash, password)
+
+    def senha_desatualizada(self):
+        # Hash gerado com método/custo diferentes do configurado (regravado no login)
+        return senhas.precisa_rehash(self.password_hash)
 
     def is_admin(self):
         return self.cargo == 'admin'
@@ -70,8 +80,22 @@ class Lancamento(db.Model):
     parcela_total = db.Column(db.Integer, nullable=True)
     valor_total_compra = db.Column(db.Float, nullable=True)
 
+    # Hash do conteúdo (data, valor, descrição) de lançamentos importados de
+    # extrato bancário (ver app/financas/importacao.py). Nulo nos manuais.
+    hash_conteudo = db.Column(db.String(64), nullable=True)
+
     # --- (REMOVIDO 'atribuido_a_user_id') ---
 
+    # Filtro usado pelos painéis e pelo fechamento: mês de referência + pagador
+    __table_args__ = (
+        db.Index('ix_lancamentos_ano_mes_user', 'ano_referencia', 'mes_referencia', 'user_id'),
+        # Navegador de lançamentos: paginação por cursor (ano, mês, id), geral e por pagador
+        db.Index('ix_lancamentos_ano_mes_id', 'ano_referencia', 'mes_referencia', 'id'),
+        db.Index('ix_lancamentos_user_ano_mes_id', 'user_id', 'ano_referencia', 'mes_referencia', 'id'),
+        # Deduplicação da importação: reimportar o mesmo extrato não duplica linhas
+        db.Index('uq_lancamentos_hash_conteudo', 'hash_conteudo', unique=True),
+    )
+
     def is_parcelado(self):
         return self.parcelamento_id is not None
 
@@ -79,6 +103,72 @@ class Lancamento(db.Model):
         # Um gasto é da casa se NINGUÉM pagou por ele (user_id=None)
         return self.user_id is None
 
+# --- MODELO AGREGADO DE LANCAMENTOS ---
+# Soma dos lançamentos por (ano, mês, pagador, categoria). É mantido no
+# mesmo flush de cada insert/edição/remoção de Lancamento
+# (ver app/financas/agregados.py), então os painéis não precisam mais
+# somar as linhas brutas do mês. A tabela vem do 'flask init-db' ou, em bancos
+# já existentes, da migração 3f1a9c2d7b10, que também a popula.
+class LancamentoAgregado(db.Model):
+    __tablename__ = 'lancamento_agregado'
+    id = db.Column(db.Integer, primary_key=True)
+    ano_referencia = db.Column(db.Integer, nullable=False)
+    mes_referencia = db.Column(db.Integer, nullable=False)
+    # Mesmo significado de Lancamento.user_id: nulo = pago pela "Casa"
+    user_id = db.Column(db.Integer, nullable=True)
+    categoria = db.Column(db.String(50), nullable=False)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+    # COALESCE para que a "Casa" (user_id nulo) também tenha uma única linha por chave
+    __table_args__ = (
+        db.Index('uq_lancamento_agregado_chave', 'ano_referencia', 'mes_referencia',
+                 db.func.coalesce(user_id, 0), 'categoria', unique=True),
+    )
+
+# Série mensal dos gráficos: total gasto por (ano, mês, tipo, categoria).
+# tipo 'variavel' = lançamentos (mantido junto com LancamentoAgregado, sem o
+# pagador); tipo 'fixo' = aluguel e despesas fixas, gravados no fechamento.
+# Ver financas/series.py.
+class GastoMensalCategoria(db.Model):
+    __tablename__ = 'gasto_mensal_categoria'
+    id = db.Column(db.Integer, primary_key=True)
+    ano = db.Column(db.Integer, nullable=False)
+    mes = db.Column(db.Integer, nullable=False)
+    tipo = db.Column(db.String(20), nullable=False)
+    categoria = db.Column(db.String(50), nullable=False)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+    # A chave também atende as consultas por intervalo de meses
+    __table_args__ = (
+        db.Index('uq_gasto_mensal_categoria_chave', 'ano', 'mes', 'tipo', 'categoria', unique=True),
+    )
+
+# Regra de categoria da importação de extratos: se a descrição da linha
+# contém 'padrao' (sem diferenciar maiúsculas), o lançamento recebe 'categoria'.
+# Vale a primeira regra por ordem de prioridade (menor primeiro).
+class RegraCategoria(db.Model):
+    __tablename__ = 'regras_categoria'
+    id = db.Column(db.Integer, primary_key=True)
+    padrao = db.Column(db.String(100), nullable=False)
+    categoria = db.Column(db.String(50), nullable=False)
+    prioridade = db.Column(db.Integer, nullable=False, default=100)
+
+# Chave de idempotência de cada gasto enviado (formulário ou fila offline do
+# PWA). Reenviar a mesma chave não cria o gasto (nem as parcelas) de novo.
+# user_id = quem enviou; sem FK para não bloquear a remoção de usuários.
+class GastoIdempotencia(db.Model):
+    __tablename__ = 'gasto_idempotencia'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    chave = db.Column(db.String(64), nullable=False)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('uq_gasto_idempotencia_user_chave', 'user_id', 'chave', unique=True),
+    )
+
 # --- MODELO FECHAMENTO MENSAL (Mantido como estava) ---
 class FechamentoMensal(db.Model):
     __tablename__ = 'fechamento_mensal'
@@ -93,14 +183,28 @@ class FechamentoMensal(db.Model):
     total_aluguel_mes = db.Column(db.Float, nullable=False, default=0.0) 
     valor_caixinha_arrecadado = db.Column(db.Float, nullable=False, default=0.0)
     status = db.Column(db.String(20), nullable=False, default='aberto')
+    # Carimbo de versão do relatório (ETag / Last-Modified em ver_relatorio).
+    # Muda a cada alteração do relatório fechado, p.ex. quitar um saldo.
+    versao = db.Column(db.Integer, nullable=False, default=1)
+    atualizado_em = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    # Retrato em JSON do relatório pronto, gravado no fechamento (ver financas/relatorio.py)
+    relatorio = db.Column(db.Text, nullable=True)
     # Relacionamento com cascade (mantido)
     saldos = db.relationship('SaldoMensal', backref='fechamento', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_fechamento_mensal_ano_mes_status', 'ano', 'mes', 'status'),
+        # Só pode existir UM fechamento 'fechado' por mês
+        db.Index('uq_fechamento_mensal_fechado', 'ano', 'mes', unique=True,
+                 sqlite_where=db.text("status = 'fechado'"),
+                 postgresql_where=db.text("status = 'fechado'")),
+    )
+
 # --- MODELO SALDO MENSAL (Mantido como estava) ---
 class SaldoMensal(db.Model):
     __tablename__ = 'saldo_mensal'
     id = db.Column(db.Integer, primary_key=True)
-    fechamento_id = db.Column(db.Integer, db.ForeignKey('fechamento_mensal.id'), nullable=False)
+    fechamento_id = db.Column(db.Integer, db.ForeignKey('fechamento_mensal.id'), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     
     # O que o usuário LANÇOU no mês (crédito)
@@ -135,17 +239,68 @@ class DespesaFixa(db.Model):
     #    para guardar a diferença de valor.
     diferenca_individual = db.Column(db.Float, nullable=True, default=0.0)
 
+    # Busca do aluguel de cada morador (descricao='Aluguel', morador_id, ativa)
+    __table_args__ = (
+        db.Index('ix_despesas_fixas_descricao_morador_ativa', 'descricao', 'morador_id', 'ativa'),
+    )
+
 
 # --- Outros Modelos (Mantidos) ---
 
 class CaixinhaMovimentacao(db.Model):
     __tablename__ = 'caixinha_movimentacao'
     id = db.Column(db.Integer, primary_key=True)
-    data = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    data = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     descricao = db.Column(db.String(200), nullable=False)
     valor = db.Column(db.Float, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
 
+# Saldo corrente do caixinha (linha única). Atualizado na mesma transação de
+# cada movimentação (ver app/financas/caixinha.py), para que ler o saldo seja
+# uma busca pela chave primária em vez de um SUM sobre todo o histórico.
+# A tabela vem do 'flask init-db' ou, em bancos já existentes, da migração
+# 3f1a9c2d7b10; a linha do saldo é semeada pela a3c9e5d7f214.
+class CaixinhaSaldo(db.Model):
+    __tablename__ = 'caixinha_saldo'
+    id = db.Column(db.Integer, primary_key=True)
+    saldo = db.Column(db.Float, nullable=False, default=0.0)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Versão do cache local dos painéis (linha 1), incrementada logo depois do
+# commit das escritas que a afetam (ver app/financas/cache.py). Cada worker
+# compara com a versão do seu cache local para saber se está velho. A linha 2
+# (usuários) ficou de uma versão anterior e não é mais lida.
+class CacheVersao(db.Model):
+    __tablename__ = 'cache_versao'
+    id = db.Column(db.Integer, primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+# Processamento em segundo plano (fechar_mes, recálculo do aluguel). A linha
+# guarda o andamento, lido pela página de progresso em qualquer worker, e o
+# resultado que vira a mensagem flash no fim (ver app/processamentos.py).
+# user_id = quem pediu; sem FK para não bloquear a remoção de usuários.
+class Processamento(db.Model):
+    __tablename__ = 'processamentos'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    # 'pendente', 'executando', 'concluido' ou 'erro'
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    progresso = db.Column(db.Integer, nullable=False, default=0)  # 0 a 100
+    etapa = db.Column(db.String(200), nullable=True)
+    parametros = db.Column(db.Text, nullable=True)  # JSON
+    # JSON com a mensagem, a categoria e o destino do flash/redirect
+    resultado = db.Column(db.Text, nullable=True)
+    erro = db.Column(db.Text, nullable=True)
+    notificado = db.Column(db.Boolean, nullable=False, default=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    concluido_em = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_processamentos_tipo_status', 'tipo', 'status'),
+    )
+
 class EscalaSemanal(db.Model):
     __tablename__ = 'escala_semanal'
     id = db.Column(db.Integer, primary_key=True)
@@ -155,6 +310,19 @@ class EscalaSemanal(db.Model):
     responsavel = db.Column(db.String(80), nullable=False)
     status = db.Column(db.String(20), nullable=False, default='pendente')
     tipo = db.Column(db.String(20), nullable=False, default='recorrente')
+    # Posição da tarefa recorrente na semana (0..N-1). Nulo para tarefas avulsas.
+    # Usada no lugar da descrição porque a escala tem tarefas repetidas ("Folga").
+    ordem = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_escala_semanal_ano_semana', 'ano', 'semana'),
+        # Histórico filtrado por responsável
+        db.Index('ix_escala_semanal_responsavel_ano_semana', 'responsavel', 'ano', 'semana'),
+        # Cada posição recorrente de uma semana só pode ser gerada uma vez
+        db.Index('uq_escala_semanal_recorrente', 'ano', 'semana', 'ordem', unique=True,
+                 sqlite_where=db.text("tipo = 'recorrente'"),
+                 postgresql_where=db.text("tipo = 'recorrente'")),
+    )
 
 class Tarefa(db.Model):
     __tablename__ = 'tarefas'
@@ -0,0 +1,309 @@
+# app/orcamento_consultas.py
+# Orçamento de consultas SQL por rota ('flask query-budget').
+#
+# Monta duas casas em bancos SQLite temporários, uma pequena e outra grande
+# (10 e 1.000 moradores por padrão), roda as mesmas requisições nas duas e
+# conta os comandos SQL de cada uma. Uma rota passa se a casa grande não
+# executa mais comandos do que a pequena: a quantidade de consultas não pode
+# crescer com os dados (N+1). Para cada rota que estoura, lista os comandos
+# que passaram a se repetir. Os mesmos casos rodam no pytest
+# (tests/test_orcamento_consultas.py), com os bancos em memória.
+
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import event, insert
+
+# Blueprints cobertos (as rotas GET deles são descobertas pelo url_map)
+BLUEPRINTS = ('routes', 'escala', 'admin', 'tarefas', 'financas', 'api')
+
+# GETs que não entram na varredura automática (têm efeito colateral)
+_GET_IGNORADOS = {'routes.logout'}
+
+# Valores dos parâmetros de URL nas rotas GET (ids criados por semear_casa)
+_VALORES_URL = {'user_id': 3, 'fechamento_id': 1, 'lancamento_id': 1, 'id_tarefa': 1,
+                'tarefa_id': 1, 'despesa_id': 1, 'saldo_id': 1, 'regra_id': 1, 'formato': 'csv'}
+
+_LISTA_IN = re.compile(r'\((?:\?, )+\?\)|\((?:%\(\w+\)s, )+%\(\w+\)s\)')
+
+
+def _normalizar(comando):
+    """Uma lista 'IN (?, ?, ...)' de qualquer tamanho conta como o mesmo comando."""
+    return _LISTA_IN.sub('(?...)', ' '.join(comando.split()))
+
+
+# --- 1. DADOS ---
+def semear_casa(n_moradores, hoje):
+    """
+    Casa com 'n_moradores': aluguel e despesas fixas, lançamentos (com um
+    parcelado) no mês atual, o mês anterior fechado com os saldos, caixinha,
+    escala da semana e uma regra de importação. Insere em lote; todos os
+    moradores compartilham o mesmo hash de senha ('x').
+    """
+    from . import TAREFAS_RECORRENTES
+    from .escala import gerar_escala, semana_atual
+    from .financas import CHAVE_ALUGUEL, CHAVE_CAIXINHA, agregados, caixinha, relatorio, series
+    from .models import (db, User, Tarefa, DespesaFixa, Lancamento, FechamentoMensal,
+                         SaldoMensal, RegraCategoria)
+    from .senhas import gerar_hash
+
+    hash_senha = gerar_hash('x')
+    usuarios = [{'username': 'admin', 'cargo': 'admin', 'password_hash': hash_senha,
+                 'tipo_quarto': 'compartilhado'}]
+    for i in range(n_moradores):
+        usuarios.append({'username': f'morador{i:04d}', 'password_hash': hash_senha,
+                         'cargo': 'gerenciador' if i == 0 else 'usuario',
+                         'tipo_quarto': 'individual' if i % 3 == 0 else 'compartilhado',
+                         'ordem_original': i, 'ordem_invertido': n_moradores - 1 - i})
+    db.session.execute(insert(User), usuarios)
+    ids_moradores = list(range(2, n_moradores + 2))  # ids 2..N+1 (1 = admin)
+
+    db.session.execute(insert(Tarefa), [{'descricao': d, 'recorrente': True} for d in TAREFAS_RECORRENTES])
+
+    aluguel_total = 1000.0 * n_moradores
+    despesas = [{'descricao': 'Internet', 'valor': 120.0, 'ativa': True},
+                {'descricao': CHAVE_CAIXINHA, 'valor': 80.0, 'ativa': True},
+                {'descricao': CHAVE_ALUGUEL, 'valor': aluguel_total, 'ativa': False,
+                 'diferenca_individual': 100.0}]
+    despesas += [{'descricao': CHAVE_ALUGUEL, 'valor': 1000.0, 'ativa': True, 'morador_id': user_id}
+                 for user_id in ids_moradores]
+    db.session.execute(insert(DespesaFixa), despesas)
+
+    anterior = hoje - relativedelta(months=1)
+    lancamentos = []
+    for mes_ref in (hoje, anterior):  # o mês aberto primeiro: ids 1 e 2 são editáveis
+        for user_id in ids_moradores:
+            lancamentos.append({'descricao': 'Mercado', 'valor': 50.0, 'categoria': 'Mercado',
+                                'data': mes_ref, 'mes_referencia': mes_ref.month,
+                                'ano_referencia': mes_ref.year, 'user_id': user_id})
+        lancamentos.append({'descricao': 'Gás', 'valor': 90.0, 'categoria': 'Contas', 'data': mes_ref,
+                            'mes_referencia': mes_ref.month, 'ano_referencia': mes_ref.year,
+                            'user_id': None})
+    for parcela in range(1, 4):
+        data = hoje + relativedelta(months=parcela - 1)
+        lancamentos.append({'descricao': f'TV ({parcela}/3)', 'valor': 300.0, 'categoria': 'Parcelado',
+                            'data': data, 'mes_referencia': data.month, 'ano_referencia': data.year,
+                            'user_id': ids_moradores[0], 'parcelamento_id': 'semente-tv',
+                            'parcela_atual': parcela, 'parcela_total': 3,
+                            'valor_total_compra': 900.0})
+    db.session.execute(insert(Lancamento), lancamentos)
+    agregados.reconstruir_agregados()
+
+    fechamento = FechamentoMensal(mes=anterior.month, ano=anterior.year, total_fixo=120.0,
+                                  total_variavel=90.0, total_aluguel_mes=aluguel_total,
+                                  valor_caixinha_arrecadado=80.0, status='fechado')
+    db.session.add(fechamento)
+    db.session.flush()
+    db.session.execute(insert(SaldoMensal), [
+        {'fechamento_id': fechamento.id, 'user_id': user_id, 'total_gasto': 50.0,
+         'valor_devido': 1100.0, 'valor_devido_aluguel': 1000.0, 'valor_devido_outros': 100.0,
+         'saldo_final': -1050.0, 'status_pagamento': 'pendente'}
+        for user_id in ids_moradores])
+    series.registrar_fechamento(fechamento)
+    relatorio.gravar_relatorio(fechamento)
+    caixinha.registrar_movimentacao(descricao=f'Depósito do fechamento {anterior.month}/{anterior.year}',
+                                    valor=80.0, user_id=None, data=anterior)
+
+    db.session.add(RegraCategoria(padrao='mercado', categoria='Mercado', prioridade=10))
+    gerar_escala(*semana_atual())
+    db.session.commit()
+
+
+# --- 2. REQUISIÇÕES ---
+def _rotas_get(app):
+    """(nome, url) de cada rota GET dos blueprints cobertos; os parâmetros vêm de _VALORES_URL."""
+    from .escala import semana_atual
+
+    valores = dict(_VALORES_URL)
+    valores['ano'], valores['semana'] = semana_atual()
+    casos = []
+    with app.test_request_context():
+        from flask import url_for
+        for regra in sorted(app.url_map.iter_rules(), key=lambda r: (r.endpoint, r.rule)):
+            if regra.endpoint.split('.')[0] not in BLUEPRINTS or regra.endpoint in _GET_IGNORADOS:
+                continue
+            if 'GET' not in regra.methods or not all(arg in valores for arg in regra.arguments):
+                continue
+            url = url_for(regra.endpoint, **{arg: valores[arg] for arg in regra.arguments})
+            casos.append((f'GET {regra.rule}', 'get', url, None))
+    return casos
+
+
+def _casos_post(hoje):
+    """Escritas, na ordem em que rodam (cada uma depende do estado deixado pelas anteriores)."""
+    from . import TAREFAS_RECORRENTES
+
+    ano, semana = hoje.isocalendar()[:2]  # semana ISO, como a escala
+    return [
+        ('POST adicionar_gasto', 'post', '/financas/adicionar_gasto',
+         {'descricao': 'Pão', 'valor': '10', 'categoria': 'Mercado', 'num_parcelas': '3', 'pagador': 'casa'}),
+        ('POST adicionar_gasto/lote', 'json', '/financas/adicionar_gasto/lote',
+         {'gastos': [{'chave': 'k1', 'usuario_id': 1, 'descricao': 'Leite', 'valor': '5',
+                     'pagador': 'casa'}]}),
+        ('POST editar_lancamento', 'post', '/financas/lancamento/editar/1',
+         {'descricao': 'Mercado 2', 'valor': '55', 'categoria': 'Mercado', 'pagador': '2'}),
+        ('POST deletar_lancamento', 'post', '/financas/lancamento/deletar/2', {}),
+        ('POST gerenciar_aluguel', 'post', '/financas/gerenciar_aluguel',
+         {'aluguel_total': '5000', 'diferenca_individual': '100'}),
+        ('GET processamento (recalcular_alugueis)', 'get', '/financas/processamentos/1', None),
+        ('POST gerenciar_fixas/adicionar', 'post', '/financas/gerenciar_fixas/adicionar',
+         {'descricao': 'Luz', 'valor': '200'}),
+        ('POST gerenciar_fixas/editar', 'post', '/financas/gerenciar_fixas/editar/1',
+         {'descricao-1': 'Internet', 'valor-1': '130'}),
+        ('POST gerenciar_fixas/alternar_status', 'post', '/financas/gerenciar_fixas/alternar_status/1', {}),
+        ('POST caixinha/retirar', 'post', '/financas/caixinha/retirar',
+         {'descricao_retirada': 'Vassoura', 'valor_retirada': '10'}),
+        ('POST admin/caixinha/adicionar_saldo', 'post', '/admin/caixinha/adicionar_saldo',
+         {'descricao': 'Saldo inicial', 'valor': '100'}),
+        ('POST quitar_saldo', 'post', '/financas/quitar_saldo/1', {}),
+        ('POST fechar_mes', 'post', '/financas/fechar_mes', {}),
+        ('GET processamento.json (fechar_mes)', 'get', '/financas/processamentos/2.json', None),
+        ('GET processamento (fechar_mes)', 'get', '/financas/processamentos/2', None),
+        ('GET relatorio (mês recém-fechado)', 'get', '/financas/relatorio/2', None),
+        ('POST reabrir_mes', 'post', '/financas/reabrir_mes/2', {}),
+        ('POST escala/adicionar-avulsa', 'post', f'/escala/adicionar-avulsa/{ano}/{semana}',
+         {'descricao': 'Limpar calha', 'responsavel': 'morador0001'}),
+        ('POST escala/editar', 'post', '/escala/editar/1', {'descricao': 'Cozinha', 'responsavel': 'morador0002'}),
+        ('POST escala/deletar', 'post', f'/escala/deletar/{len(TAREFAS_RECORRENTES) + 1}', {}),
+        ('POST tarefas/criar', 'post', '/tarefas/criar', {'descricao': 'Regar plantas'}),
+        ('POST tarefas/editar', 'post', '/tarefas/editar/1', {'descricao': 'Cozinha de cima'}),
+        ('POST tarefas/deletar', 'post', f'/tarefas/deletar/{len(TAREFAS_RECORRENTES) + 1}', {}),
+        ('POST admin/usuarios/criar', 'post', '/admin/usuarios/criar',
+         {'username': 'novato', 'password': 'x', 'cargo': 'usuario', 'tipo_quarto': 'individual'}),
+        ('POST admin/usuarios/editar', 'post', '/admin/usuarios/editar/3',
+         {'username': 'morador0001', 'cargo': 'usuario', 'tipo_quarto': 'individual'}),
+        ('POST importar/regras/adicionar', 'post', '/financas/importar/regras/adicionar',
+         {'padrao': 'padaria', 'categoria': 'Mercado'}),
+        ('POST importar/regras/deletar', 'post', '/financas/importar/regras/deletar/1', {}),
+        ('POST login', 'login', '/login', {'username': 'morador0000', 'password': 'x'}),
+        ('GET logout', 'get', '/logout', None),
+    ]
+
+
+def _medir(app, cliente, tipo, url, dados):
+    """(status, Counter de comandos SQL normalizados) de uma requisição."""
+    from . import banco
+
+    comandos = []
+
+    def _contar(conn, cursor, statement, *args):
+        comandos.append(_normalizar(statement))
+
+    with app.app_context():
+        motores = banco.motores()  # no perfil de produção do SQLite, leitura e escrita
+    for motor in motores:
+        event.listen(motor, 'before_cursor_execute', _contar)
+    try:
+        if tipo == 'get':
+            resposta = cliente.get(url)
+        elif tipo == 'json':
+            resposta = cliente.post(url, json=dados)
+        else:
+            resposta = cliente.post(url, data=dados)
+        resposta.get_data()  # respostas em streaming consultam enquanto são lidas
+        resposta.close()
+    finally:
+        for motor in motores:
+            event.remove(motor, 'before_cursor_execute', _contar)
+    return resposta.status_code, Counter(comandos)
+
+
+# Variáveis do create_app nas casas medidas
+CONFIG_MEDICAO = {
+    # Mede o caminho sem cache: é ele que não pode crescer com os dados
+    'PAINEL_CACHE_TTL': '0', 'USUARIO_CACHE_TTL': '0', 'METRICAS_ATIVAS': '0',
+    # fechar_mes e o recálculo do aluguel rodam dentro da requisição medida
+    'PROCESSAMENTO_SINCRONO': '1',
+}
+
+
+def criar_app_medicao(database_url):
+    """App com CONFIG_MEDICAO no banco 'database_url' (também usado pelos testes, em memória)."""
+    from . import create_app
+
+    variaveis = {'DATABASE_URL': database_url, **CONFIG_MEDICAO}
+    anteriores = {chave: os.environ.get(chave) for chave in variaveis}
+    os.environ.update(variaveis)
+    try:
+        app = create_app()
+    finally:
+        for chave, valor in anteriores.items():
+            if valor is None:
+                os.environ.pop(chave, None)
+            else:
+                os.environ[chave] = valor
+    app.config['TESTING'] = True
+    return app
+
+
+def casos(app, hoje):
+    """(nome, tipo, url, dados) de todos os casos, na ordem em que rodam."""
+    return _rotas_get(app) + _casos_post(hoje)
+
+
+def medir_casa(app, n_moradores, hoje):
+    """Cria e semeia a casa no banco de 'app' e mede todos os casos: {nome: (status, Counter)}."""
+    from .models import db
+
+    with app.app_context():
+        db.create_all()
+        semear_casa(n_moradores, hoje)
+
+    cliente = app.test_client()
+    cliente.post('/login', data={'username': 'admin', 'password': 'x'})
+    resultados = {}
+    for nome, tipo, url, dados in casos(app, hoje):
+        if tipo == 'login':
+            cliente.get('/logout')
+            tipo = 'post'
+        resultados[nome] = _medir(app, cliente, tipo, url, dados)
+    return resultados
+
+
+def comandos_que_cresceram(comandos_pequena, comandos_grande):
+    """[(comando, vezes na pequena, vezes na grande)] dos comandos que a casa grande repete mais."""
+    return [(comando, comandos_pequena[comando], vezes)
+            for comando, vezes in comandos_grande.most_common()
+            if vezes > comandos_pequena[comando]]
+
+
+def _rodar_casa(n_moradores, pasta, hoje):
+    """Resultados {nome: (status, Counter)} de todos os casos numa casa nova."""
+    from . import banco
+    from .models import db
+
+    app = criar_app_medicao('sqlite:///' + os.path.join(pasta, f'casa_{n_moradores}.db'))
+    try:
+        return medir_casa(app, n_moradores, hoje)
+    finally:
+        with app.app_context():
+            db.session.remove()
+            for motor in banco.motores():
+                motor.dispose()
+
+
+def verificar_orcamento(pequena=10, grande=1000):
+    """
+    Roda os casos nas duas casas. Retorna [(nome, status, n pequena, n grande,
+    [(comando, vezes na pequena, vezes na grande)] dos que cresceram)].
+    """
+    hoje = datetime.utcnow()
+    pasta = tempfile.mkdtemp(prefix='query-budget-')
+    try:
+        resultados_pequena = _rodar_casa(pequena, pasta, hoje)
+        resultados_grande = _rodar_casa(grande, pasta, hoje)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    relatorio = []
+    for nome, (status, comandos_pequena) in resultados_pequena.items():
+        status_grande, comandos_grande = resultados_grande[nome]
+        relatorio.append((nome, (status, status_grande), sum(comandos_pequena.values()),
+                          sum(comandos_grande.values()),
+                          comandos_que_cresceram(comandos_pequena, comandos_grande)))
+    return relatorio
@@ -0,0 +1,38 @@
+# app/paginacao.py
+# Helpers de paginação por cursor (keyset) usados pelos históricos.
+# Cada página continua do último registro da anterior, então o banco lê
+# só o intervalo da página pelo índice, sem OFFSET.
+
+from sqlalchemy import and_, or_
+
+
+def ler_cursor(valor, partes):
+    """Cursor no formato 'a-b-c' com 'partes' inteiros. Retorna a tupla ou None se inválido."""
+    try:
+        numeros = tuple(int(parte) for parte in (valor or '').split('-'))
+    except ValueError:
+        return None
+    return numeros if len(numeros) == partes else None
+
+
+def montar_cursor(valores):
+    return '-'.join(str(v) for v in valores)
+
+
+def antes_de(colunas, valores, inclusive=False):
+    """
+    (colunas) < (valores) em ordem lexicográfica, escrito como
+    c1 <= v1 AND (c1 < v1 OR (c2 ...)) para o banco usar o índice em c1.
+    """
+    coluna, valor = colunas[0], valores[0]
+    if len(colunas) == 1:
+        return coluna <= valor if inclusive else coluna < valor
+    return and_(coluna <= valor, or_(coluna < valor, antes_de(colunas[1:], valores[1:], inclusive)))
+
+
+def depois_de(colunas, valores, inclusive=False):
+    """(colunas) > (valores) em ordem lexicográfica. Ver antes_de."""
+    coluna, valor = colunas[0], valores[0]
+    if len(colunas) == 1:
+        return coluna >= valor if inclusive else coluna > valor
+    return and_(coluna >= valor, or_(coluna > valor, depois_de(colunas[1:], valores[1:], inclusive)))
@@ -0,0 +1,215 @@
+# app/processamentos.py
+# Processamentos em segundo plano, sem broker externo.
+#
+# A rota cria uma linha em 'processamentos' e devolve a resposta na hora; um
+# pool de threads do próprio processo executa a função registrada para o
+# tipo. O andamento é gravado na linha (por uma conexão à parte, fora da
+# transação do trabalho), então a página de progresso pode ser atendida por
+# qualquer worker. No fim, o resultado (mensagem, categoria e destino) vira a
+# mensagem flash e o redirecionamento de sempre.
+#
+# Se o worker morrer no meio, a linha para de ser atualizada; depois de
+# PROCESSAMENTO_TIMEOUT segundos ela é dada como interrompida na próxima
+# consulta. Com PROCESSAMENTO_SINCRONO o trabalho roda dentro da própria
+# requisição (CLI, query-budget, benchmark).
+#
+# Roda no máximo um processamento de cada tipo por vez. Nos tipos registrados
+# com por_parametros=True, um pedido com parâmetros diferentes dos do que está
+# rodando não é descartado: fica pendente (um só, com os parâmetros mais
+# recentes) e roda assim que o atual termina.
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+
+from flask import current_app
+from sqlalchemy import exists, update
+from sqlalchemy.orm import aliased
+
+from .models import db, Processamento
+
+STATUS_ATIVOS = ('pendente', 'executando')
+
+MENSAGEM_ERRO_INESPERADO = 'Erro inesperado no processamento. Verifique os logs.'
+MENSAGEM_INTERROMPIDO = 'O processamento foi interrompido (o servidor reiniciou?). Tente de novo.'
+
+# tipo -> (função, endpoint de destino em caso de erro, deduplicar por parâmetros)
+_funcoes = {}
+
+
+class FalhaProcessamento(Exception):
+    """Erro esperado: 'mensagem' vai para o usuário; 'destino' é o endpoint para onde voltar."""
+
+    def __init__(self, mensagem, destino=None, categoria='danger'):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        self.destino = destino
+        self.categoria = categoria
+
+
+def registrar(tipo, destino_erro, por_parametros=False):
+    """
+    Registra a função de um tipo de processamento. Ela recebe progresso(pct,
+    etapa) e os parâmetros do enfileirar(), faz o próprio commit e retorna
+    {'mensagem', 'categoria', 'destino', 'destino_parametros'}.
+
+    Com por_parametros, o enfileirar() só reaproveita um processamento ativo
+    com os mesmos parâmetros (ver enfileirar).
+    """
+    def decorador(funcao):
+        _funcoes[tipo] = (funcao, destino_erro, por_parametros)
+        return funcao
+    return decorador
+
+
+# --- 1. POOL ---
+_trava_pool = threading.Lock()
+_pool = None
+
+
+def _obter_pool(app):
+    global _pool
+    with _trava_pool:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=app.config['PROCESSAMENTO_WORKERS'],
+                                       thread_name_prefix='processamentos')
+        return _pool
+
+
+# --- 2. EXECUÇÃO ---
+def _atualizar(processamento_id, **valores):
+    valores['atualizado_em'] = datetime.utcnow()
+    db.session.execute(update(Processamento).where(Processamento.id == processamento_id).values(**valores))
+    db.session.commit()
+
+
+def _informar_progresso(processamento_id, progresso, etapa):
+    # Conexão à parte: não pode fazer commit da transação do trabalho. Chamar
+    # antes das escritas do trabalho (no SQLite, uma escrita pendente na
+    # sessão travaria esta conexão).
+    with db.engine.begin() as conexao:
+        conexao.execute(update(Processamento).where(Processamento.id == processamento_id).values(
+            progresso=max(0, min(100, int(progresso))), etapa=etapa, atualizado_em=datetime.utcnow()))
+
+
+def _executar(app, processamento_id):
+    # Ao terminar, o mesmo worker já roda o próximo pendente do tipo, se houver
+    while processamento_id is not None:
+        processamento_id = _executar_um(app, processamento_id)
+
+
+def _executar_um(app, processamento_id):
+    with app.app_context():
+        # Só quem muda 'pendente' -> 'executando' executa (vários workers,
+        # reenvios), e só se nenhum outro do mesmo tipo estiver executando
+        outro = aliased(Processamento)
+        resultado = db.session.execute(
+            update(Processamento)
+            .where(Processamento.id == processamento_id, Processamento.status == 'pendente',
+                   ~exists().where(outro.tipo == Processamento.tipo, outro.status == 'executando'))
+            .values(status='executando', atualizado_em=datetime.utcnow())
+        )
+        db.session.commit()
+        if resultado.rowcount != 1:
+            return None
+
+        processamento = db.session.get(Processamento, processamento_id)
+        tipo = processamento.tipo
+        funcao, destino_erro, _ = _funcoes[tipo]
+        parametros = json.loads(processamento.parametros or '{}')
+        try:
+            retorno = funcao(partial(_informar_progresso, processamento_id), **parametros)
+        except FalhaProcessamento as e:
+            db.session.rollback()
+            _atualizar(processamento_id, status='erro', erro=e.mensagem, concluido_em=datetime.utcnow(),
+                       resultado=json.dumps({'mensagem': e.mensagem, 'categoria': e.categoria,
+                                             'destino': e.destino or destino_erro}))
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('Erro no processamento %s (%s)', processamento_id, processamento.tipo)
+            _atualizar(processamento_id, status='erro', erro=repr(e), concluido_em=datetime.utcnow(),
+                       resultado=json.dumps({'mensagem': MENSAGEM_ERRO_INESPERADO, 'categoria': 'danger',
+                                             'destino': destino_erro}))
+        else:
+            _atualizar(processamento_id, status='concluido', progresso=100, etapa=None,
+                       concluido_em=datetime.utcnow(), resultado=json.dumps(retorno))
+
+        # Só depois de sair de 'executando': um pendente criado antes disso
+        # não conseguiu começar e fica por conta deste worker
+        proximo = Processamento.query.with_entities(Processamento.id) \
+            .filter(Processamento.tipo == tipo, Processamento.status == 'pendente') \
+            .order_by(Processamento.id).first()
+        return proximo.id if proximo else None
+
+
+# --- 3. API ---
+def enfileirar(tipo, user_id, **parametros):
+    """
+    Cria o processamento e agenda a execução. Faz commit.
+
+    Se já há um ativo do mesmo tipo, devolve esse em vez de criar outro. Nos
+    tipos por_parametros, só se os parâmetros forem os mesmos; senão, um
+    pendente que ainda não começou passa a usar os parâmetros novos, ou é
+    criado um que roda depois do atual.
+    """
+    _, _, por_parametros = _funcoes[tipo]
+    parametros_json = json.dumps(parametros, sort_keys=True)
+    ativos = [p for p in Processamento.query
+              .filter(Processamento.tipo == tipo, Processamento.status.in_(STATUS_ATIVOS))
+              .order_by(Processamento.id.desc())
+              if not expirar_se_abandonado(p)]
+    for ativo in ativos:
+        if not por_parametros or ativo.parametros == parametros_json:
+            return _agendar(ativo)
+
+    for pendente in (p for p in ativos if p.status == 'pendente'):
+        # Condicional: se o worker já o pegou, os parâmetros lidos seriam os antigos
+        resultado = db.session.execute(
+            update(Processamento)
+            .where(Processamento.id == pendente.id, Processamento.status == 'pendente')
+            .values(parametros=parametros_json, user_id=user_id, atualizado_em=datetime.utcnow())
+        )
+        db.session.commit()
+        if resultado.rowcount == 1:
+            db.session.refresh(pendente)
+            return _agendar(pendente)
+
+    processamento = Processamento(tipo=tipo, user_id=user_id, parametros=parametros_json)
+    db.session.add(processamento)
+    db.session.commit()
+    return _agendar(processamento)
+
+
+def _agendar(processamento):
+    # Agendar de novo um pendente é inofensivo: só um worker consegue pegá-lo
+    if processamento.status != 'pendente':
+        return processamento
+    app = current_app._get_current_object()
+    if app.config['PROCESSAMENTO_SINCRONO']:
+        _executar(app, processamento.id)
+        db.session.refresh(processamento)
+    else:
+        _obter_pool(app).submit(_executar, app, processamento.id)
+    return processamento
+
+
+def expirar_se_abandonado(processamento):
+    """Marca como erro um processamento ativo sem notícias há PROCESSAMENTO_TIMEOUT segundos. Retorna True se marcou."""
+    limite = datetime.utcnow() - timedelta(seconds=current_app.config['PROCESSAMENTO_TIMEOUT'])
+    if processamento.status not in STATUS_ATIVOS or processamento.atualizado_em >= limite:
+        return False
+    _, destino_erro, _ = _funcoes.get(processamento.tipo, (None, None, False))
+    processamento.status = 'erro'
+    processamento.erro = MENSAGEM_INTERROMPIDO
+    processamento.concluido_em = datetime.utcnow()
+    processamento.resultado = json.dumps({'mensagem': MENSAGEM_INTERROMPIDO, 'categoria': 'danger',
+                                          'destino': destino_erro})
+    db.session.commit()
+    return True
+
+
+def resultado(processamento):
+    """Dict do resultado gravado (mensagem, categoria, destino...), ou {} se ainda não terminou."""
+    return json.loads(processamento.resultado) if processamento.resultado else {}
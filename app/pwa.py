@@ -0,0 +1,79 @@
+# app/pwa.py
+# Service worker do PWA e impressão digital (fingerprint) dos arquivos estáticos.
+#
+# Na inicialização calculamos um hash curto de cada arquivo em app/static.
+# Todo url_for('static', ...) ganha '?v=<hash>', então a URL muda quando o
+# arquivo muda e pode ser guardada sem prazo pelo navegador e pelo service
+# worker. A lista dessas URLs é o manifesto de pré-cache embutido no /sw.js.
+
+import hashlib
+import os
+
+from flask import Blueprint, current_app, make_response, render_template, request, url_for
+
+pwa_bp = Blueprint('pwa', __name__)
+
+# Não entram no manifesto (sw.js antigo em /static só limpa o registro legado)
+_IGNORADOS = {'sw.js'}
+
+# Um ano: URLs com '?v=' nunca mudam de conteúdo
+_MAX_AGE_FINGERPRINT = 365 * 24 * 3600
+
+
+def _calcular_impressoes(pasta):
+    """{caminho relativo: hash curto} de cada arquivo estático."""
+    impressoes = {}
+    for raiz, _, arquivos in os.walk(pasta):
+        for nome in sorted(arquivos):
+            caminho = os.path.join(raiz, nome)
+            relativo = os.path.relpath(caminho, pasta).replace(os.sep, '/')
+            if relativo in _IGNORADOS:
+                continue
+            with open(caminho, 'rb') as f:
+                impressoes[relativo] = hashlib.sha256(f.read()).hexdigest()[:12]
+    return impressoes
+
+
+def init_app(app):
+    impressoes = _calcular_impressoes(app.static_folder)
+    versao = hashlib.sha256(
+        ''.join(f'{c}:{h};' for c, h in sorted(impressoes.items())).encode()
+    ).hexdigest()[:12]
+    app.extensions['pwa'] = {'impressoes': impressoes, 'versao': versao}
+
+    @app.url_defaults
+    def _adicionar_impressao(endpoint, values):
+        if endpoint == 'static' and 'v' not in values:
+            impressao = impressoes.get(values.get('filename'))
+            if impressao:
+                values['v'] = impressao
+
+    @app.after_request
+    def _cache_estaticos(resposta):
+        if request.endpoint == 'static' and 'v' in request.args and resposta.status_code == 200:
+            resposta.cache_control.no_cache = None
+            resposta.cache_control.public = True
+            resposta.cache_control.max_age = _MAX_AGE_FINGERPRINT
+            resposta.cache_control.immutable = True
+        return resposta
+
+    app.register_blueprint(pwa_bp)
+
+
+def manifesto_precache():
+    """URLs (com fingerprint) de todos os arquivos estáticos."""
+    impressoes = current_app.extensions['pwa']['impressoes']
+    return [url_for('static', filename=caminho) for caminho in sorted(impressoes)]
+
+
+@pwa_bp.route('/sw.js')
+def service_worker():
+    # Servido na raiz para que o escopo do service worker seja o site inteiro
+    corpo = render_template('sw.js',
+                            versao=current_app.extensions['pwa']['versao'],
+                            precache=manifesto_precache())
+    resposta = make_response(corpo)
+    resposta.mimetype = 'application/javascript'
+    # O navegador precisa sempre revalidar o sw.js para detectar versões novas
+    resposta.cache_control.no_cache = True
+    return resposta
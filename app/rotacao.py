@@ -0,0 +1,74 @@
+# app/rotacao.py
+# Motor de rotação da escala: funções puras, sem acesso ao banco.
+# A base da rotação (moradores nas duas ordens + tarefas recorrentes) é
+# carregada uma vez por quem chama (ver escala.carregar_base_rotacao) e usada
+# como chave do cache, então mudar o quadro de moradores ou de tarefas
+# invalida o cache naturalmente.
+
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+
+# Segunda-feira da semana ISO 1/2024, início da contagem da rotação
+SEMANA_REFERENCIA = date(2024, 1, 1)
+
+# A cada SEMANAS_POR_CICLO semanas a ordem dos moradores é invertida
+SEMANAS_POR_CICLO = 5
+
+# Quantas posições a rotação avança por semana
+PASSO_POR_SEMANA = 2
+
+BaseRotacao = namedtuple('BaseRotacao', ['original', 'invertido', 'tarefas'])
+
+
+def indice_semana(ano, semana):
+    """
+    Número da semana contado a partir de 1/2024 (1 = primeira semana).
+    Usa o calendário ISO, então anos com 53 semanas são contados corretamente.
+    """
+    segunda = date.fromisocalendar(ano, semana, 1)
+    return (segunda - SEMANA_REFERENCIA).days // 7 + 1
+
+
+@lru_cache(maxsize=4096)
+def atribuicao(base, ano, semana):
+    """
+    Tupla de (tarefa, responsável) da semana, na ordem das tarefas recorrentes.
+    Custo constante por semana (não depende de quantas semanas já passaram).
+    """
+    ciclo = (indice_semana(ano, semana) - 1) // SEMANAS_POR_CICLO
+    moradores = base.original if ciclo % 2 == 0 else base.invertido
+    if not moradores or not base.tarefas:
+        return ()
+
+    rotacao = (semana * -PASSO_POR_SEMANA) % len(moradores)
+    ordem_da_semana = moradores[rotacao:] + moradores[:rotacao]
+
+    quantidade = len(base.tarefas)
+    responsaveis = (ordem_da_semana * (quantidade // len(ordem_da_semana) + 1))[:quantidade]
+    return tuple(zip(base.tarefas, responsaveis))
+
+
+def semanas_a_partir(ano, semana, quantidade):
+    """Lista de (ano, semana) ISO começando em (ano, semana)."""
+    inicio = date.fromisocalendar(ano, semana, 1)
+    semanas = []
+    for i in range(quantidade):
+        iso = (inicio + timedelta(weeks=i)).isocalendar()
+        semanas.append((iso[0], iso[1]))
+    return semanas
+
+
+def escala_do_periodo(base, ano, semana, quantidade):
+    """Lista de (ano, semana, atribuição) para 'quantidade' semanas."""
+    return [(a, s, atribuicao(base, a, s)) for a, s in semanas_a_partir(ano, semana, quantidade)]
+
+
+def tarefas_do_morador(base, username, ano, semana, quantidade=52):
+    """Lista de (ano, semana, tarefa) de um morador nas próximas 'quantidade' semanas."""
+    resultado = []
+    for a, s, tarefas_semana in escala_do_periodo(base, ano, semana, quantidade):
+        for tarefa, responsavel in tarefas_semana:
+            if responsavel == username:
+                resultado.append((a, s, tarefa))
+    return resultado
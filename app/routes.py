@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_user, logout_user, login_required, current_user
 from .models import db, User
+from .senhas import SistemaOcupado, MENSAGEM_OCUPADO
 
 bp = Blueprint('routes', __name__)
 
@@ -22,9 +23,22 @@ def login():
         user = User.query.filter_by(username=username_lower).first()
         # --- FIM DA CORREÇÃO ---
 
-        if not user or not user.check_password(password):
+        try:
+            senha_ok = user is not None and user.check_password(password)
+        except SistemaOcupado:
+            flash(MENSAGEM_OCUPADO)
+            return render_template('login.html'), 503
+        if not senha_ok:
             flash('Usuário ou senha inválidos.')
             return redirect(url_for('routes.login'))
+
+        # Regrava o hash se o método/custo configurado mudou desde que foi gerado
+        if user.senha_desatualizada():
+            try:
+                user.set_password(password)
+                db.session.commit()
+            except SistemaOcupado:
+                pass  # Fica para o próximo login
         
         login_user(user)
         return redirect(url_for('routes.index'))
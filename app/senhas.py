@@ -0,0 +1,97 @@
+# app/senhas.py
+# Hash de senhas com método e custo configuráveis.
+#
+# SENHA_HASH_METODO usa a sintaxe do Werkzeug ('scrypt:32768:8:1',
+# 'pbkdf2:sha256:600000'...). Hashes gravados com outros parâmetros continuam
+# válidos e são regravados no próximo login bem-sucedido (precisa_rehash).
+#
+# Os hashes custam dezenas de ms de CPU cada. Cada processo calcula no máximo
+# SENHA_POOL_TAMANHO ao mesmo tempo (padrão: núcleos, até 4), na própria
+# thread da requisição (o hashlib libera o GIL durante o cálculo). Quem não
+# consegue vaga em SENHA_POOL_ESPERA_MS recebe SistemaOcupado e a mensagem
+# de "tente de novo", liberando a thread em vez de esperar a rajada passar.
+# Isso só recusa logins em servidores com mais threads por processo que
+# vagas (gthread, servidor de desenvolvimento); com workers síncronos, de uma
+# thread cada, o limite de logins simultâneos é o próprio número de workers.
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+METODO_PADRAO = 'scrypt:32768:8:1'
+POOL_PADRAO = min(4, os.cpu_count() or 1)
+ESPERA_PADRAO_MS = 250
+
+
+class SistemaOcupado(Exception):
+    """Todas as vagas de hash do processo estão ocupadas; tente de novo em instantes."""
+
+
+# Mensagem para o usuário quando o hash da senha recebe SistemaOcupado
+MENSAGEM_OCUPADO = 'Muitos logins ao mesmo tempo. Tente de novo em alguns segundos.'
+
+
+def _config(chave, padrao):
+    if has_app_context():
+        return current_app.config.get(chave, padrao)
+    return padrao
+
+
+def metodo_configurado():
+    return _config('SENHA_HASH_METODO', METODO_PADRAO)
+
+
+# --- VAGAS POR PROCESSO ---
+_trava_vagas = threading.Lock()
+_vagas = None
+
+
+def _obter_vagas():
+    global _vagas
+    with _trava_vagas:
+        if _vagas is None:
+            _vagas = threading.BoundedSemaphore(_config('SENHA_POOL_TAMANHO', POOL_PADRAO))
+        return _vagas
+
+
+def _com_vaga(funcao, *args):
+    vagas = _obter_vagas()
+    if not vagas.acquire(timeout=_config('SENHA_POOL_ESPERA_MS', ESPERA_PADRAO_MS) / 1000):
+        raise SistemaOcupado()
+    try:
+        return funcao(*args)
+    finally:
+        vagas.release()
+
+
+# --- API ---
+def gerar_hash(senha):
+    return _com_vaga(generate_password_hash, senha, metodo_configurado())
+
+
+def gerar_hashes(senhas):
+    """Vários hashes em paralelo (p.ex. usuários padrão do 'flask init-db')."""
+    metodo = metodo_configurado()
+    with ThreadPoolExecutor(max_workers=_config('SENHA_POOL_TAMANHO', POOL_PADRAO),
+                            thread_name_prefix='senhas') as pool:
+        return list(pool.map(lambda senha: generate_password_hash(senha, metodo), senhas))
+
+
+def verificar(hash_senha, senha):
+    return _com_vaga(check_password_hash, hash_senha, senha)
+
+
+@lru_cache(maxsize=8)
+def _prefixo(metodo):
+    # 'scrypt' sozinho vira 'scrypt:32768:8:1' no hash: pergunta ao Werkzeug
+    # (uma vez por método) em vez de repetir os padrões dele aqui
+    return generate_password_hash('', metodo).split('$', 1)[0]
+
+
+def precisa_rehash(hash_senha):
+    """True se o hash foi gerado com método ou custo diferentes do configurado."""
+    return hash_senha.split('$', 1)[0] != _prefixo(metodo_configurado())
@@ -0,0 +1,49 @@
+// Fila offline de gastos: gera a chave de idempotência dos formulários e pede
+// ao service worker (ver templates/sw.js) para reenviar o que ficou guardado.
+(function () {
+    function novaChave() {
+        if (window.crypto && window.crypto.randomUUID) {
+            return window.crypto.randomUUID();
+        }
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    }
+
+    document.querySelectorAll('input[name="chave_idempotencia"]').forEach(function (campo) {
+        if (!campo.value) {
+            campo.value = novaChave();
+        }
+    });
+
+    if (!('serviceWorker' in navigator)) {
+        return;
+    }
+
+    function pedirSincronizacao() {
+        navigator.serviceWorker.ready.then(function (registro) {
+            if (registro.active) {
+                registro.active.postMessage({tipo: 'sincronizar-gastos'});
+            }
+        });
+    }
+
+    navigator.serviceWorker.addEventListener('message', function (event) {
+        var dados = event.data || {};
+        if (dados.tipo !== 'gastos-sincronizados') {
+            return;
+        }
+        var aviso = document.createElement('div');
+        aviso.className = 'alert alert-' + (dados.erros.length ? 'warning' : 'success') + ' alert-dismissible fade show m-3';
+        aviso.setAttribute('role', 'alert');
+        aviso.textContent = dados.criados + ' gasto(s) guardado(s) offline foram enviados.' +
+            (dados.erros.length ? ' Não enviados: ' + dados.erros.join('; ') : '');
+        var fechar = document.createElement('button');
+        fechar.type = 'button';
+        fechar.className = 'btn-close';
+        fechar.setAttribute('data-bs-dismiss', 'alert');
+        aviso.appendChild(fechar);
+        document.body.insertBefore(aviso, document.body.firstChild);
+    });
+
+    window.addEventListener('online', pedirSincronizacao);
+    pedirSincronizacao();
+})();
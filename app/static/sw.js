@@ -1,28 +1,11 @@
-const CACHE_NAME = 'republica-manager-v1';
-const urlsToCache = [
-    '/',
-    '/escala',
-    // Adicione aqui outras URLs importantes que você quer que funcionem offline
-];
+// Service worker antigo (escopo /static/). O worker do site agora é servido
+// em /sw.js (ver app/pwa.py); este arquivo só remove o registro legado e o
+// cache 'republica-manager-v1' dos aparelhos que ainda o tinham instalado.
+self.addEventListener('install', () => self.skipWaiting());
 
-// Instala o Service Worker e adiciona os arquivos ao cache
-self.addEventListener('install', event => {
+self.addEventListener('activate', event => {
     event.waitUntil(
-        caches.open(CACHE_NAME)
-        .then(cache => {
-            console.log('Cache aberto');
-            return cache.addAll(urlsToCache);
-        })
-    );
-});
-
-// Intercepta as requisições e serve do cache se disponível
-self.addEventListener('fetch', event => {
-    event.respondWith(
-        caches.match(event.request)
-        .then(response => {
-            // Se encontrar no cache, retorna o cache. Senão, faz a requisição normal.
-            return response || fetch(event.request);
-        })
+        caches.delete('republica-manager-v1')
+            .then(() => self.registration.unregister())
     );
 });
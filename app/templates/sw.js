@@ -0,0 +1,246 @@
+// Service worker do República Manager (gerado por app/pwa.py).
+// A versão muda a cada deploy que altera algum arquivo estático, o que
+// faz o navegador instalar este worker de novo e descartar os caches antigos.
+const VERSAO = {{ versao|tojson }};
+const CACHE_ESTATICOS = `estaticos-${VERSAO}`;
+const CACHE_PAGINAS = `paginas-${VERSAO}`;
+const CACHES_ATUAIS = [CACHE_ESTATICOS, CACHE_PAGINAS];
+
+// Arquivos de /static com fingerprint (?v=hash): conteúdo imutável por URL
+const PRECACHE = {{ precache|tojson }};
+
+// Tempo máximo esperando a rede antes de cair para a cópia em cache (páginas)
+const TIMEOUT_REDE_MS = 4000;
+
+// Rotas que nunca passam pelo cache: downloads (CSV/XLSX) e o andamento dos processamentos
+const ROTAS_SEM_CACHE = ['/financas/exportar/', '/financas/processamentos/', '/escala/historico/exportar.'];
+
+// --- INSTALAÇÃO: pré-cache dos estáticos ---
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE_ESTATICOS)
+            .then(cache => cache.addAll(PRECACHE))
+            .then(() => self.skipWaiting())
+    );
+});
+
+// --- ATIVAÇÃO: remove caches de versões anteriores (inclusive 'republica-manager-v1') ---
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(nomes => Promise.all(
+                nomes.filter(nome => !CACHES_ATUAIS.includes(nome))
+                     .map(nome => caches.delete(nome))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+// --- ESTRATÉGIAS ---
+
+// Stale-while-revalidate: responde do cache na hora e atualiza em segundo plano
+function staleWhileRevalidate(event) {
+    return caches.open(CACHE_ESTATICOS).then(cache =>
+        cache.match(event.request).then(emCache => {
+            const daRede = fetch(event.request)
+                .then(resposta => {
+                    // Respostas 'opaque' (CDN sem CORS) também podem ser guardadas
+                    if (resposta.ok || resposta.type === 'opaque') {
+                        cache.put(event.request, resposta.clone());
+                    }
+                    return resposta;
+                });
+            if (emCache) {
+                event.waitUntil(daRede.catch(() => undefined));
+                return emCache;
+            }
+            return daRede;
+        })
+    );
+}
+
+// Respostas que o servidor não quer guardadas (no-store) ou que são downloads
+function podeGuardar(resposta) {
+    const cacheControl = resposta.headers.get('Cache-Control') || '';
+    const disposicao = resposta.headers.get('Content-Disposition') || '';
+    return !/no-store/i.test(cacheControl) && !/^\s*attachment/i.test(disposicao);
+}
+
+// Network-first: tenta a rede (com limite de tempo) e cai para a última cópia
+function networkFirst(event) {
+    const daRede = fetch(event.request).then(resposta => {
+        // Não guarda redirecionamentos (p.ex. para o login), erros nem downloads
+        if (resposta.ok && !resposta.redirected && podeGuardar(resposta)) {
+            const copia = resposta.clone();
+            caches.open(CACHE_PAGINAS).then(cache => cache.put(event.request, copia));
+        }
+        return resposta;
+    });
+
+    const limite = new Promise(resolve => setTimeout(resolve, TIMEOUT_REDE_MS));
+    const daRedeOuCache = Promise.race([daRede, limite.then(() => caches.match(event.request))])
+        .then(resposta => resposta || daRede);
+
+    return daRedeOuCache.catch(() =>
+        caches.match(event.request).then(emCache => emCache || respostaOffline(event.request))
+    );
+}
+
+function respostaOffline(request) {
+    if (request.mode === 'navigate') {
+        return new Response(
+            '<!DOCTYPE html><meta charset="utf-8"><meta name="viewport" content="width=device-width">' +
+            '<title>Sem conexão</title><p style="font-family:sans-serif;padding:2rem">' +
+            'Sem conexão e esta página ainda não foi aberta neste aparelho.</p>',
+            {status: 503, headers: {'Content-Type': 'text/html; charset=utf-8'}}
+        );
+    }
+    return Response.error();
+}
+
+// --- FILA OFFLINE DE GASTOS (IndexedDB) ---
+// Um POST de /financas/adicionar_gasto que falha por falta de rede fica
+// guardado aqui e é reenviado em lotes para /financas/adicionar_gasto/lote.
+// A chave de idempotência de cada gasto impede duplicatas no servidor, e o
+// usuario_id do formulário faz o servidor recusar gastos de outra sessão.
+const BANCO_FILA = 'republica-fila';
+const LOJA_GASTOS = 'gastos';
+const TAG_SYNC = 'fila-gastos';
+const TAMANHO_LOTE = 50;
+
+function abrirFila() {
+    return new Promise((resolve, reject) => {
+        const pedido = indexedDB.open(BANCO_FILA, 1);
+        pedido.onupgradeneeded = () => pedido.result.createObjectStore(LOJA_GASTOS, {keyPath: 'chave'});
+        pedido.onsuccess = () => resolve(pedido.result);
+        pedido.onerror = () => reject(pedido.error);
+    });
+}
+
+function naFila(modo, operacao) {
+    return abrirFila().then(banco => new Promise((resolve, reject) => {
+        const tx = banco.transaction(LOJA_GASTOS, modo);
+        const pedido = operacao(tx.objectStore(LOJA_GASTOS));
+        tx.oncomplete = () => resolve(pedido ? pedido.result : undefined);
+        tx.onerror = () => reject(tx.error);
+    }));
+}
+
+const guardarGasto = gasto => naFila('readwrite', loja => loja.put(gasto));
+const lerGastos = () => naFila('readonly', loja => loja.getAll());
+const removerGastos = chaves => naFila('readwrite', loja => { chaves.forEach(chave => loja.delete(chave)); });
+const limparGastos = () => naFila('readwrite', loja => loja.clear());
+
+async function enviarOuGuardarGasto(event) {
+    const copia = event.request.clone();
+    try {
+        return await fetch(event.request);
+    } catch (erro) {
+        const gasto = Object.fromEntries((await copia.formData()).entries());
+        gasto.chave = gasto.chave_idempotencia || self.crypto.randomUUID();
+        delete gasto.chave_idempotencia;
+        // O servidor data o gasto por aqui, não pela hora da sincronização
+        gasto.registrado_em = new Date().toISOString();
+        await guardarGasto(gasto);
+        if (self.registration.sync) {
+            self.registration.sync.register(TAG_SYNC).catch(() => undefined);
+        }
+        return new Response(
+            '<!DOCTYPE html><meta charset="utf-8"><meta name="viewport" content="width=device-width">' +
+            '<title>Gasto guardado</title><div style="font-family:sans-serif;padding:2rem">' +
+            '<p>Sem conexão: o gasto foi guardado neste aparelho e será enviado quando a internet voltar.</p>' +
+            '<p><a href="/financas/dashboard">Voltar ao painel</a></p></div>',
+            {status: 202, headers: {'Content-Type': 'text/html; charset=utf-8'}}
+        );
+    }
+}
+
+async function enviarFila() {
+    const resumo = {criados: 0, erros: []};
+    let pendentes = await lerGastos();
+    while (pendentes.length) {
+        const lote = pendentes.slice(0, TAMANHO_LOTE);
+        const resposta = await fetch('/financas/adicionar_gasto/lote', {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({gastos: lote})
+        });
+        // Sessão expirada (redireciona para o login) ou erro no servidor: tenta mais tarde
+        if (!resposta.ok || resposta.redirected) {
+            break;
+        }
+        const {resultados} = await resposta.json();
+        await removerGastos(resultados.map(r => r.chave).filter(Boolean));
+        resultados.forEach(r => {
+            if (r.status === 'criado') resumo.criados += 1;
+            if (r.status === 'erro') resumo.erros.push(r.mensagem);
+        });
+        pendentes = pendentes.slice(TAMANHO_LOTE);
+    }
+    if (resumo.criados || resumo.erros.length) {
+        const janelas = await self.clients.matchAll({type: 'window'});
+        janelas.forEach(janela => janela.postMessage({tipo: 'gastos-sincronizados', ...resumo}));
+    }
+}
+
+// Uma sincronização por vez, mesmo com vários avisos seguidos
+let sincronizacaoAtual = null;
+function sincronizarFila() {
+    if (!sincronizacaoAtual) {
+        sincronizacaoAtual = enviarFila().finally(() => { sincronizacaoAtual = null; });
+    }
+    return sincronizacaoAtual;
+}
+
+self.addEventListener('sync', event => {
+    if (event.tag === TAG_SYNC) {
+        event.waitUntil(sincronizarFila());
+    }
+});
+
+// As páginas avisam ao abrir e quando a conexão volta (ver static/fila_offline.js)
+self.addEventListener('message', event => {
+    if (event.data && event.data.tipo === 'sincronizar-gastos') {
+        event.waitUntil(sincronizarFila().catch(() => undefined));
+    }
+});
+
+// --- ROTEAMENTO POR CLASSE DE REQUISIÇÃO ---
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    const mesmaOrigem = url.origin === self.location.origin;
+
+    // POSTs (formulários) vão direto para o servidor; só o novo gasto tem fila offline
+    if (request.method !== 'GET') {
+        if (mesmaOrigem && request.method === 'POST' && url.pathname === '/financas/adicionar_gasto') {
+            event.respondWith(enviarOuGuardarGasto(event));
+        }
+        return;
+    }
+
+    // Sair: apaga as páginas guardadas e a fila de gastos, que são do usuário logado
+    if (mesmaOrigem && url.pathname === '/logout') {
+        event.waitUntil(Promise.all([caches.delete(CACHE_PAGINAS), limparGastos()]));
+        return;
+    }
+
+    // Estáticos próprios e bibliotecas de CDN (Bootstrap, Font Awesome)
+    if ((mesmaOrigem && url.pathname.startsWith('/static/')) ||
+        (!mesmaOrigem && ['style', 'script', 'font', 'image'].includes(request.destination))) {
+        event.respondWith(staleWhileRevalidate(event));
+        return;
+    }
+
+    // Downloads e polling vão direto para o servidor, sem cópia offline
+    if (mesmaOrigem && ROTAS_SEM_CACHE.some(prefixo => url.pathname.startsWith(prefixo))) {
+        return;
+    }
+
+    // Páginas HTML, dados das finanças e a API: sempre a versão mais nova quando houver rede
+    if (mesmaOrigem && (request.mode === 'navigate' || url.pathname.startsWith('/financas/') ||
+                        url.pathname.startsWith('/api/'))) {
+        event.respondWith(networkFirst(event));
+    }
+});
@@ -0,0 +1,36 @@
+"""chaves de idempotência dos gastos (fila offline do PWA)
+
+Revision ID: 1e6c8d4f0a73
+Revises: d4b7e1a9c352
+Create Date: 2026-10-18 19:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1e6c8d4f0a73'
+down_revision = 'd4b7e1a9c352'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'gasto_idempotencia' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'gasto_idempotencia',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('chave', sa.String(length=64), nullable=False),
+        sa.Column('criado_em', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_gasto_idempotencia_user_chave', 'gasto_idempotencia',
+                    ['user_id', 'chave'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_gasto_idempotencia_user_chave', table_name='gasto_idempotencia')
+    op.drop_table('gasto_idempotencia')
@@ -0,0 +1,107 @@
+"""indices de desempenho e tabelas de agregados
+
+Cria os índices compostos usados pelos filtros mais frequentes, a unicidade
+de um fechamento 'fechado' por mês e as tabelas 'lancamento_agregado' e
+'caixinha_saldo' (já populadas a partir dos dados existentes).
+
+Bancos criados com 'flask init-db' (db.create_all) já têm tudo isso; por isso
+cada passo só é aplicado se o objeto ainda não existir.
+
+Revision ID: 3f1a9c2d7b10
+Revises:
+Create Date: 2026-10-18 16:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9c2d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDICES = [
+    # (nome, tabela, colunas, unique, where)
+    ('ix_lancamentos_ano_mes_user', 'lancamentos',
+     ['ano_referencia', 'mes_referencia', 'user_id'], False, None),
+    ('ix_escala_semanal_ano_semana', 'escala_semanal', ['ano', 'semana'], False, None),
+    ('ix_fechamento_mensal_ano_mes_status', 'fechamento_mensal', ['ano', 'mes', 'status'], False, None),
+    ('uq_fechamento_mensal_fechado', 'fechamento_mensal', ['ano', 'mes'], True, "status = 'fechado'"),
+    ('ix_despesas_fixas_descricao_morador_ativa', 'despesas_fixas',
+     ['descricao', 'morador_id', 'ativa'], False, None),
+    ('ix_caixinha_movimentacao_data', 'caixinha_movimentacao', ['data'], False, None),
+    ('ix_saldo_mensal_fechamento_id', 'saldo_mensal', ['fechamento_id'], False, None),
+]
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def _indices_existentes(tabela):
+    return {i['name'] for i in _inspector().get_indexes(tabela)}
+
+
+def upgrade():
+    tabelas = set(_inspector().get_table_names())
+
+    if 'lancamento_agregado' not in tabelas:
+        op.create_table(
+            'lancamento_agregado',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('ano_referencia', sa.Integer(), nullable=False),
+            sa.Column('mes_referencia', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('categoria', sa.String(length=50), nullable=False),
+            sa.Column('total', sa.Float(), nullable=False),
+            sa.Column('quantidade', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('uq_lancamento_agregado_chave', 'lancamento_agregado',
+                        ['ano_referencia', 'mes_referencia',
+                         sa.text('coalesce(user_id, 0)'), 'categoria'], unique=True)
+        op.execute("""
+            INSERT INTO lancamento_agregado
+                (ano_referencia, mes_referencia, user_id, categoria, total, quantidade)
+            SELECT ano_referencia, mes_referencia, user_id, COALESCE(categoria, 'Outros'),
+                   SUM(valor), COUNT(id)
+            FROM lancamentos
+            GROUP BY ano_referencia, mes_referencia, user_id, COALESCE(categoria, 'Outros')
+        """)
+
+    if 'caixinha_saldo' not in tabelas:
+        op.create_table(
+            'caixinha_saldo',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('saldo', sa.Float(), nullable=False),
+            sa.Column('atualizado_em', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.execute("""
+            INSERT INTO caixinha_saldo (id, saldo, atualizado_em)
+            SELECT 1, COALESCE(SUM(valor), 0), CURRENT_TIMESTAMP FROM caixinha_movimentacao
+        """)
+
+    for nome, tabela, colunas, unique, where in INDICES:
+        if nome in _indices_existentes(tabela):
+            continue
+        kwargs = {}
+        if where:
+            kwargs = {'sqlite_where': sa.text(where), 'postgresql_where': sa.text(where)}
+        op.create_index(nome, tabela, colunas, unique=unique, **kwargs)
+
+
+def downgrade():
+    for nome, tabela, _, _, _ in reversed(INDICES):
+        if nome in _indices_existentes(tabela):
+            op.drop_index(nome, table_name=tabela)
+
+    tabelas = set(_inspector().get_table_names())
+    if 'caixinha_saldo' in tabelas:
+        op.drop_table('caixinha_saldo')
+    if 'lancamento_agregado' in tabelas:
+        op.drop_index('uq_lancamento_agregado_chave', table_name='lancamento_agregado')
+        op.drop_table('lancamento_agregado')
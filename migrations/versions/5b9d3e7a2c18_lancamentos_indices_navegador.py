@@ -0,0 +1,31 @@
+"""índices do navegador de lançamentos
+
+Revision ID: 5b9d3e7a2c18
+Revises: e2a8f9b3c641
+Create Date: 2026-10-18 18:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b9d3e7a2c18'
+down_revision = 'e2a8f9b3c641'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    indices = {i['name'] for i in sa.inspect(op.get_bind()).get_indexes('lancamentos')}
+    if 'ix_lancamentos_ano_mes_id' not in indices:
+        op.create_index('ix_lancamentos_ano_mes_id', 'lancamentos',
+                        ['ano_referencia', 'mes_referencia', 'id'])
+    if 'ix_lancamentos_user_ano_mes_id' not in indices:
+        op.create_index('ix_lancamentos_user_ano_mes_id', 'lancamentos',
+                        ['user_id', 'ano_referencia', 'mes_referencia', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_lancamentos_user_ano_mes_id', table_name='lancamentos')
+    op.drop_index('ix_lancamentos_ano_mes_id', table_name='lancamentos')
@@ -0,0 +1,42 @@
+"""importação de extratos: hash de conteúdo e regras de categoria
+
+Revision ID: 6f2c8a5d9e41
+Revises: 1e6c8d4f0a73
+Create Date: 2026-10-18 20:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f2c8a5d9e41'
+down_revision = '1e6c8d4f0a73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspetor = sa.inspect(op.get_bind())
+    colunas = {c['name'] for c in inspetor.get_columns('lancamentos')}
+    if 'hash_conteudo' not in colunas:
+        op.add_column('lancamentos', sa.Column('hash_conteudo', sa.String(length=64), nullable=True))
+        # Único, mas lançamentos manuais (hash NULL) não entram em conflito
+        op.create_index('uq_lancamentos_hash_conteudo', 'lancamentos', ['hash_conteudo'], unique=True)
+
+    if 'regras_categoria' not in inspetor.get_table_names():
+        op.create_table(
+            'regras_categoria',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('padrao', sa.String(length=100), nullable=False),
+            sa.Column('categoria', sa.String(length=50), nullable=False),
+            sa.Column('prioridade', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('regras_categoria')
+    op.drop_index('uq_lancamentos_hash_conteudo', table_name='lancamentos')
+    with op.batch_alter_table('lancamentos') as batch_op:
+        batch_op.drop_column('hash_conteudo')
@@ -0,0 +1,73 @@
+"""posição única das tarefas recorrentes da escala
+
+Adiciona 'escala_semanal.ordem' e o índice único parcial
+(ano, semana, ordem) WHERE tipo = 'recorrente', que torna a geração da
+escala idempotente. Antes disso, remove as cópias criadas quando dois
+acessos simultâneos geravam a mesma semana.
+
+Revision ID: 8c4e2b6a1d93
+Revises: 3f1a9c2d7b10
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e2b6a1d93'
+down_revision = '3f1a9c2d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    colunas = {c['name'] for c in inspector.get_columns('escala_semanal')}
+    indices = {i['name'] for i in inspector.get_indexes('escala_semanal')}
+    if 'uq_escala_semanal_recorrente' in indices:
+        # Banco criado por 'flask init-db' já com o esquema atual
+        return
+
+    if 'ordem' not in colunas:
+        op.add_column('escala_semanal', sa.Column('ordem', sa.Integer(), nullable=True))
+
+    # Cópias da geração concorrente: mesma semana, tarefa e responsável.
+    # Mantém a de menor id, preservando o status 'feita' de qualquer cópia.
+    op.execute("""
+        UPDATE escala_semanal SET status = 'feita'
+        WHERE tipo = 'recorrente' AND status <> 'feita'
+          AND EXISTS (SELECT 1 FROM escala_semanal e2
+                      WHERE e2.tipo = 'recorrente' AND e2.status = 'feita'
+                        AND e2.ano = escala_semanal.ano AND e2.semana = escala_semanal.semana
+                        AND e2.tarefa = escala_semanal.tarefa
+                        AND e2.responsavel = escala_semanal.responsavel)
+    """)
+    op.execute("""
+        DELETE FROM escala_semanal
+        WHERE tipo = 'recorrente'
+          AND id NOT IN (SELECT MIN(id) FROM escala_semanal
+                         WHERE tipo = 'recorrente'
+                         GROUP BY ano, semana, tarefa, responsavel)
+    """)
+
+    # Posição de cada tarefa recorrente na semana, na ordem em que foi criada
+    op.execute("""
+        UPDATE escala_semanal SET ordem = (
+            SELECT COUNT(*) FROM escala_semanal e2
+            WHERE e2.tipo = 'recorrente'
+              AND e2.ano = escala_semanal.ano AND e2.semana = escala_semanal.semana
+              AND e2.id < escala_semanal.id)
+        WHERE tipo = 'recorrente'
+    """)
+
+    op.create_index('uq_escala_semanal_recorrente', 'escala_semanal', ['ano', 'semana', 'ordem'],
+                    unique=True,
+                    sqlite_where=sa.text("tipo = 'recorrente'"),
+                    postgresql_where=sa.text("tipo = 'recorrente'"))
+
+
+def downgrade():
+    op.drop_index('uq_escala_semanal_recorrente', table_name='escala_semanal')
+    with op.batch_alter_table('escala_semanal') as batch_op:
+        batch_op.drop_column('ordem')
@@ -0,0 +1,32 @@
+"""versão dos dados dos painéis (cache compartilhado entre workers)
+
+Revision ID: 9a4f6c1e8b27
+Revises: 5b9d3e7a2c18
+Create Date: 2026-10-18 18:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4f6c1e8b27'
+down_revision = '5b9d3e7a2c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'cache_versao' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    tabela = op.create_table(
+        'cache_versao',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('versao', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(tabela, [{'id': 1, 'versao': 0}])
+
+
+def downgrade():
+    op.drop_table('cache_versao')
@@ -0,0 +1,34 @@
+"""linha 1 de caixinha_saldo
+
+Garante a linha do saldo (com o saldo do histórico) em bancos em que a
+tabela foi criada pelo db.create_all, para que a primeira movimentação não
+precise criá-la.
+
+Revision ID: a3c9e5d7f214
+Revises: b8e4d2f6a913
+Create Date: 2026-10-21 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e5d7f214'
+down_revision = 'b8e4d2f6a913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conexao = op.get_bind()
+    if conexao.execute(sa.text('SELECT id FROM caixinha_saldo WHERE id = 1')).first() is None:
+        op.execute("""
+            INSERT INTO caixinha_saldo (id, saldo, atualizado_em)
+            SELECT 1, COALESCE(SUM(valor), 0), CURRENT_TIMESTAMP FROM caixinha_movimentacao
+        """)
+
+
+def downgrade():
+    # A linha é recriada pela aplicação se faltar; não há o que desfazer
+    pass
@@ -0,0 +1,30 @@
+"""retrato em JSON do relatório no fechamento
+
+Revision ID: a6e3c9d2f184
+Revises: b3d9f1c7a5e2
+Create Date: 2026-10-19 10:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6e3c9d2f184'
+down_revision = 'b3d9f1c7a5e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Os fechamentos existentes ficam sem retrato (montado na hora) até o
+    # 'flask rebuild-relatorios'
+    colunas = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('fechamento_mensal')}
+    if 'relatorio' in colunas:
+        return
+    op.add_column('fechamento_mensal', sa.Column('relatorio', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('fechamento_mensal') as batch_op:
+        batch_op.drop_column('relatorio')
@@ -0,0 +1,46 @@
+"""processamentos em segundo plano (fechar_mes, recálculo do aluguel)
+
+Revision ID: b3d9f1c7a5e2
+Revises: 6f2c8a5d9e41
+Create Date: 2026-10-18 23:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d9f1c7a5e2'
+down_revision = '6f2c8a5d9e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspetor = sa.inspect(op.get_bind())
+    if 'processamentos' in inspetor.get_table_names():
+        return
+
+    op.create_table(
+        'processamentos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('progresso', sa.Integer(), nullable=False),
+        sa.Column('etapa', sa.String(length=200), nullable=True),
+        sa.Column('parametros', sa.Text(), nullable=True),
+        sa.Column('resultado', sa.Text(), nullable=True),
+        sa.Column('erro', sa.Text(), nullable=True),
+        sa.Column('notificado', sa.Boolean(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=False),
+        sa.Column('atualizado_em', sa.DateTime(), nullable=False),
+        sa.Column('concluido_em', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_processamentos_tipo_status', 'processamentos', ['tipo', 'status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_processamentos_tipo_status', table_name='processamentos')
+    op.drop_table('processamentos')
@@ -0,0 +1,33 @@
+"""linhas de cache_versao: painéis (1) e usuários (2)
+
+Garante as duas linhas, para que nenhuma transação precise criá-las na
+primeira escrita.
+
+Revision ID: b8e4d2f6a913
+Revises: f5c2a8e1b937
+Create Date: 2026-10-20 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e4d2f6a913'
+down_revision = 'f5c2a8e1b937'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conexao = op.get_bind()
+    existentes = {linha[0] for linha in conexao.execute(sa.text('SELECT id FROM cache_versao'))}
+    faltando = [{'id': id_versao, 'versao': 0} for id_versao in (1, 2) if id_versao not in existentes]
+    if faltando:
+        tabela = sa.table('cache_versao', sa.column('id', sa.Integer), sa.column('versao', sa.Integer))
+        op.bulk_insert(tabela, faltando)
+
+
+def downgrade():
+    # A linha 2 é recriada pela aplicação se faltar; não há o que desfazer
+    pass
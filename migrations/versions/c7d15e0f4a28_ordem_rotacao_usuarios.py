@@ -0,0 +1,57 @@
+"""posição dos moradores na rotação da escala
+
+Adiciona 'usuarios.ordem_original' e 'usuarios.ordem_invertido', que
+substituem as listas fixas de responsáveis que ficavam em app/escala.py.
+Os moradores dessas listas recebem as mesmas posições que tinham nelas.
+
+Revision ID: c7d15e0f4a28
+Revises: 8c4e2b6a1d93
+Create Date: 2026-10-18 17:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d15e0f4a28'
+down_revision = '8c4e2b6a1d93'
+branch_labels = None
+depends_on = None
+
+
+# Listas que estavam fixas em app/escala.py
+RESPONSAVEIS_ORIGINAL = [
+    "parabrisa", "falamansa", "jubileu", "duposto",
+    "peçarrara", "vigarista", "macale", "karcaça", "6bomba", "serrote"
+]
+RESPONSAVEIS_INVERTIDO = [
+    "falamansa", "parabrisa", "duposto", "jubileu",
+    "vigarista", "peçarrara", "karcaça", "macale", "serrote", "6bomba"
+]
+
+
+def upgrade():
+    colunas = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('usuarios')}
+    if 'ordem_original' in colunas:
+        # Banco criado por 'flask init-db' já com o esquema atual
+        return
+
+    op.add_column('usuarios', sa.Column('ordem_original', sa.Integer(), nullable=True))
+    op.add_column('usuarios', sa.Column('ordem_invertido', sa.Integer(), nullable=True))
+
+    usuarios = sa.table('usuarios', sa.column('username', sa.String),
+                        sa.column('ordem_original', sa.Integer),
+                        sa.column('ordem_invertido', sa.Integer))
+    for posicao, username in enumerate(RESPONSAVEIS_ORIGINAL):
+        op.execute(usuarios.update().where(usuarios.c.username == username)
+                   .values(ordem_original=posicao))
+    for posicao, username in enumerate(RESPONSAVEIS_INVERTIDO):
+        op.execute(usuarios.update().where(usuarios.c.username == username)
+                   .values(ordem_invertido=posicao))
+
+
+def downgrade():
+    with op.batch_alter_table('usuarios') as batch_op:
+        batch_op.drop_column('ordem_invertido')
+        batch_op.drop_column('ordem_original')
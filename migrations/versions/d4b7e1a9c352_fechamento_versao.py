@@ -0,0 +1,35 @@
+"""carimbo de versão do fechamento (ETag do relatório)
+
+Revision ID: d4b7e1a9c352
+Revises: 9a4f6c1e8b27
+Create Date: 2026-10-18 19:05:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b7e1a9c352'
+down_revision = '9a4f6c1e8b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    colunas = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('fechamento_mensal')}
+    if 'versao' in colunas:
+        return
+    op.add_column('fechamento_mensal',
+                  sa.Column('versao', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('fechamento_mensal', sa.Column('atualizado_em', sa.DateTime(), nullable=True))
+    op.execute(sa.text('UPDATE fechamento_mensal SET atualizado_em = :agora')
+               .bindparams(agora=datetime.utcnow()))
+
+
+def downgrade():
+    with op.batch_alter_table('fechamento_mensal') as batch_op:
+        batch_op.drop_column('atualizado_em')
+        batch_op.drop_column('versao')
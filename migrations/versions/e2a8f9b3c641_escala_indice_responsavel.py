@@ -0,0 +1,27 @@
+"""índice do histórico da escala por responsável
+
+Revision ID: e2a8f9b3c641
+Revises: c7d15e0f4a28
+Create Date: 2026-10-18 17:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a8f9b3c641'
+down_revision = 'c7d15e0f4a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    indices = {i['name'] for i in sa.inspect(op.get_bind()).get_indexes('escala_semanal')}
+    if 'ix_escala_semanal_responsavel_ano_semana' not in indices:
+        op.create_index('ix_escala_semanal_responsavel_ano_semana', 'escala_semanal',
+                        ['responsavel', 'ano', 'semana'])
+
+
+def downgrade():
+    op.drop_index('ix_escala_semanal_responsavel_ano_semana', table_name='escala_semanal')
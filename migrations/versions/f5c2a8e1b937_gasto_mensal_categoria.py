@@ -0,0 +1,63 @@
+"""série mensal dos gráficos (gasto_mensal_categoria)
+
+Cria a tabela já populada: as linhas 'variavel' a partir dos agregados de
+lançamentos e as linhas 'fixo' (aluguel e despesas fixas) a partir dos meses
+fechados.
+
+Revision ID: f5c2a8e1b937
+Revises: a6e3c9d2f184
+Create Date: 2026-10-19 14:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c2a8e1b937'
+down_revision = 'a6e3c9d2f184'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspetor = sa.inspect(op.get_bind())
+    if 'gasto_mensal_categoria' in inspetor.get_table_names():
+        return
+
+    op.create_table(
+        'gasto_mensal_categoria',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('ano', sa.Integer(), nullable=False),
+        sa.Column('mes', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False),
+        sa.Column('categoria', sa.String(length=50), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('quantidade', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_gasto_mensal_categoria_chave', 'gasto_mensal_categoria',
+                    ['ano', 'mes', 'tipo', 'categoria'], unique=True)
+
+    op.execute("""
+        INSERT INTO gasto_mensal_categoria (ano, mes, tipo, categoria, total, quantidade)
+        SELECT ano_referencia, mes_referencia, 'variavel', categoria, SUM(total), SUM(quantidade)
+        FROM lancamento_agregado
+        GROUP BY ano_referencia, mes_referencia, categoria
+        HAVING SUM(quantidade) <> 0
+    """)
+    op.execute("""
+        INSERT INTO gasto_mensal_categoria (ano, mes, tipo, categoria, total, quantidade)
+        SELECT ano, mes, 'fixo', 'Aluguel', total_aluguel_mes, 1
+        FROM fechamento_mensal WHERE status = 'fechado'
+    """)
+    op.execute("""
+        INSERT INTO gasto_mensal_categoria (ano, mes, tipo, categoria, total, quantidade)
+        SELECT ano, mes, 'fixo', 'Despesas fixas', total_fixo, 1
+        FROM fechamento_mensal WHERE status = 'fechado'
+    """)
+
+
+def downgrade():
+    op.drop_index('uq_gasto_mensal_categoria_chave', table_name='gasto_mensal_categoria')
+    op.drop_table('gasto_mensal_categoria')
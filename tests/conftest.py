@@ -0,0 +1,39 @@
+# tests/conftest.py
+# Apps de teste com SQLite em memória, na configuração do 'flask query-budget'
+# (sem caches locais nem métricas; processamentos na própria requisição).
+
+import pytest
+
+from app.models import db as _db
+from app.orcamento_consultas import criar_app_medicao
+
+
+def _nova_app():
+    app = criar_app_medicao('sqlite://')
+    with app.app_context():
+        _db.create_all()
+    return app
+
+
+@pytest.fixture(scope='session')
+def criar_app():
+    """Fábrica de apps, cada uma com o seu banco em memória (tabelas criadas, sem dados)."""
+    return _nova_app
+
+
+@pytest.fixture
+def app():
+    app = _nova_app()
+    with app.app_context():
+        yield app
+        _db.session.remove()
+
+
+@pytest.fixture
+def db(app):
+    return _db
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
@@ -0,0 +1,14 @@
+# tests/test_diagnostico.py
+# Planos das consultas principais: o mesmo que o 'flask explain-check'.
+# Nenhuma pode ler uma tabela inteira, nem um índice inteiro sem LIMIT.
+
+from app.diagnostico import consultas_principais, verificar_planos
+
+
+def test_consultas_principais_sem_leitura_completa(app):
+    resultados, problemas = verificar_planos()
+
+    assert len(resultados) == len(consultas_principais())
+    assert all(plano for _, _, plano in resultados)
+    assert not problemas, '\n'.join(f'FULL SCAN ({detalhe}): {rota} ({descricao})'
+                                    for rota, descricao, detalhe in problemas)
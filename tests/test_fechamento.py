@@ -0,0 +1,50 @@
+# tests/test_fechamento.py
+# Fechamento de casas semeadas pela rota: as linhas gravadas de SaldoMensal
+# têm de ser as do cálculo de referência (o laço antigo, uma consulta de
+# aluguel por morador), como no 'flask saldos-check'.
+
+import random
+from datetime import datetime
+
+import pytest
+
+from app.conferencia_saldos import entradas_do_fechamento, saldos_por_morador_referencia, semear_casa_aleatoria
+from app.models import FechamentoMensal, SaldoMensal
+
+COLUNAS = ('user_id', 'total_gasto', 'valor_devido', 'valor_devido_aluguel', 'valor_devido_outros',
+           'valor_devido_pessoais', 'saldo_final', 'status_pagamento')
+
+
+def _fechar_mes(cliente):
+    # morador0000 é o gerenciador da casa semeada
+    cliente.post('/login', data={'username': 'morador0000', 'password': 'x'})
+    return cliente.post('/financas/fechar_mes')
+
+
+@pytest.mark.parametrize('semente, n_moradores', [(1, 1), (2, 10), (3, 250)])
+def test_saldos_gravados_iguais_a_referencia(app, db, cliente, semente, n_moradores):
+    hoje = datetime.utcnow()
+    semear_casa_aleatoria(random.Random(semente), n_moradores, hoje)
+    _, moradores, gastos_por_usuario, cota = entradas_do_fechamento(hoje)
+    referencia = saldos_por_morador_referencia(moradores, gastos_por_usuario, cota)
+
+    assert _fechar_mes(cliente).status_code < 500
+
+    fechamento = FechamentoMensal.query.filter_by(ano=hoje.year, mes=hoje.month).one()
+    saldos = SaldoMensal.query.filter_by(fechamento_id=fechamento.id).order_by(SaldoMensal.user_id).all()
+    gravadas = [{coluna: getattr(saldo, coluna) for coluna in COLUNAS} for saldo in saldos]
+    assert gravadas == sorted(referencia, key=lambda linha: linha['user_id'])
+
+
+@pytest.mark.parametrize('semente', [4, 5])
+def test_morador_sem_aluguel_nao_fecha_o_mes(app, db, cliente, semente):
+    hoje = datetime.utcnow()
+    semear_casa_aleatoria(random.Random(semente), 10, hoje, sem_aluguel=True)
+    _, moradores, gastos_por_usuario, cota = entradas_do_fechamento(hoje)
+    with pytest.raises(ValueError):
+        saldos_por_morador_referencia(moradores, gastos_por_usuario, cota)
+
+    assert _fechar_mes(cliente).status_code < 500
+
+    assert FechamentoMensal.query.count() == 0
+    assert SaldoMensal.query.count() == 0
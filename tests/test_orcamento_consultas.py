@@ -0,0 +1,32 @@
+# tests/test_orcamento_consultas.py
+# Orçamento de consultas por rota: os casos do 'flask query-budget' numa casa
+# pequena e numa grande. Nenhuma rota pode executar mais comandos SQL na
+# grande do que na pequena (N+1).
+
+from datetime import datetime
+
+import pytest
+
+from app.orcamento_consultas import casos, comandos_que_cresceram, criar_app_medicao, medir_casa
+
+PEQUENA = 10
+GRANDE = 1000
+HOJE = datetime.utcnow()
+
+# Nomes dos casos já na coleta (as rotas GET vêm do url_map de uma app)
+NOMES = [nome for nome, *_ in casos(criar_app_medicao('sqlite://'), HOJE)]
+
+
+@pytest.fixture(scope='module')
+def medicoes(criar_app):
+    return {n_moradores: medir_casa(criar_app(), n_moradores, HOJE) for n_moradores in (PEQUENA, GRANDE)}
+
+
+@pytest.mark.parametrize('nome', NOMES)
+def test_consultas_nao_crescem_com_os_moradores(medicoes, nome):
+    status_pequena, comandos_pequena = medicoes[PEQUENA][nome]
+    status_grande, comandos_grande = medicoes[GRANDE][nome]
+    assert status_pequena == status_grande < 500
+
+    cresceram = comandos_que_cresceram(comandos_pequena, comandos_grande)
+    assert not cresceram, '\n'.join(f'{pequena} -> {grande}x {comando}' for comando, pequena, grande in cresceram)